@@ -3,17 +3,36 @@
 #----------------------------------------------------------------------------#
 import sys
 import json
+import hashlib
+import click
+from collections import Counter
+from itertools import groupby
 import dateutil.parser
-import babel
+from datetime import datetime, timedelta, timezone
 from flask import Flask, render_template, request, Response, flash, redirect, \
-                  url_for, request, jsonify, abort
+                  url_for, request, jsonify, abort, stream_with_context, make_response, \
+                  get_flashed_messages
+from werkzeug.http import is_resource_modified
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import FlaskForm
 from forms import *
+from search import install_search_index, search_ids
+from pagination import keyset_paginate, sort_column
+from cache import make_cache
+from fragments import Fragments
+from importer import BulkImporter, TABLES as IMPORT_TABLES
+from poolstats import PoolStats
+from replicas import RoutingSQLAlchemy, Replicas
+from profiler import RequestProfiler
+from dateformat import DateFormatter
+from assets import Assets, build as build_assets
+from geo import Gazetteer, geohash, cell_ranges, distance_km
+from autocomplete import Autocomplete
+import partitions
+from sqlalchemy.pool import Pool
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -21,17 +40,73 @@ from forms import *
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+
+# connection pool counters and checkout wait times, see poolstats.py
+pool_stats = PoolStats(app.logger, slow_checkout=app.config['POOL_SLOW_CHECKOUT_MS'] / 1000.0,
+                       log_interval=app.config['POOL_LOG_INTERVAL'])
+pool_stats.listen(Pool)
+if 'pool_size' in app.config['SQLALCHEMY_ENGINE_OPTIONS']:
+  app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+                                                 poolclass=pool_stats.pool_class())
+db = RoutingSQLAlchemy(app)
+
+# read-only views on the read replicas, see replicas.py
+replicas = Replicas(app, db)
 
 # connect to a postgresql database
 migrate = Migrate(app, db)
 
+# venue/artist detail page data, see cache.py
+cache = make_cache(app.config)
+
+# rendered show tiles and venue list items, see fragments.py
+fragments = Fragments(make_cache(app.config, prefix='FRAGMENT_CACHE_', key_prefix='fyyur-fragments:'),
+                      app.logger, log_interval=app.config['FRAGMENT_CACHE_LOG_INTERVAL'])
+fragments.init_app(app, enabled=app.config['FRAGMENT_CACHE'])
+
+# fingerprinted, precompressed css/js bundles, see assets.py
+assets = Assets(app)
+
+# city centroids venues are placed at, see geo.py
+gazetteer = Gazetteer()
+
+# opt-in per-request query and render timings, see profiler.py
+if app.config['PROFILE_SQL']:
+  RequestProfiler(app)
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+class Genre(db.Model):
+    __tablename__ = 'genres'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+    def repr(self):
+      return f'<Genre {self.id} {self.name}>'
+
+# The (genre_id, <owner>_id) indexes serve the ?genre= listing filters
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id')
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id')
+)
+
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_state_city', 'state', 'city'),
+        db.Index('ix_venues_geohash', 'geohash'),
+        # names written since the last autocomplete sync, see autocomplete.py
+        db.Index('ix_venues_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -39,65 +114,156 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.Text())
+    # the centroid of the city, see locate_venue(), and its integer geohash
+    # for /venues/nearby (see geo.py); null for cities not in the dataset
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.BigInteger)
+    # maintained by the Show mapper events and `flask roll-show-counters`
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # bumped by every write that changes the venue's page, see page_validators()
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, server_default=db.func.now())
     shows = db.relationship('Show', backref='venue', lazy=True, cascade='all, delete-orphan')
+    genres = db.relationship('Genre', secondary=venue_genres, lazy=True, order_by=Genre.name)
     def repr(self):
       return f'<Venue {self.id} {self.name}>'
 
+# the /venues listing order, see venues_query()
+db.Index('ix_venues_state_city_name_id',
+         *[sort_column(column) for column in (Venue.state, Venue.city, Venue.name, Venue.id)])
+
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(500))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.Text())
+    # maintained by the Show mapper events and `flask roll-show-counters`
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # bumped by every write that changes the artist's page, see page_validators()
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, server_default=db.func.now())
     shows = db.relationship('Show', backref='artist', lazy=True, cascade='all, delete-orphan')
+    genres = db.relationship('Genre', secondary=artist_genres, lazy=True, order_by=Genre.name)
     def repr(self):
       return f'<Artist {self.id} {self.name}>'
 
+# the /artists listing order, see artists_query()
+db.Index('ix_artists_name_id', *[sort_column(column) for column in (Artist.name, Artist.id)])
+
+# On Postgres the table can be range partitioned by start_time month (see
+# partitions.py); the model is the same either way
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+        # the latest change to a venue's/artist's shows, see page_validators()
+        db.Index('ix_shows_venue_id_updated_at', 'venue_id', 'updated_at'),
+        db.Index('ix_shows_artist_id_updated_at', 'artist_id', 'updated_at'),
+        # shows still counted as upcoming, for `flask roll-show-counters`
+        db.Index('ix_shows_start_time_not_past', 'start_time',
+                 postgresql_where=db.text('NOT is_past'), sqlite_where=db.text('NOT is_past')),
+    )
     id = db.Column(db.Integer, primary_key = True)
     start_time = db.Column(db.DateTime())  
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
+    # whether the show is counted in its venue's and artist's past_shows_count
+    is_past = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, server_default=db.func.now())
     def repr(self):
         return f'<Show {self.id} {self.description}, Start Time {self.start_time}>, \
           artist {self.artist_id}>, venue  {self.venue_id} '
 
+# Keep the venue/artist show counters in step with the shows table, in
+# the same transaction as the insert, update or delete, and mark both
+# pages as changed
+
+@db.event.listens_for(Show, 'before_insert')
+def classify_show(mapper, connection, show):
+  show.is_past = show.start_time is not None and show.start_time <= datetime.utcnow()
+
+@db.event.listens_for(Show, 'before_update')
+def reclassify_show(mapper, connection, show):
+  if db.inspect(show).attrs.start_time.history.has_changes():
+    classify_show(mapper, connection, show)
+
+@db.event.listens_for(Show, 'after_insert')
+def count_show(mapper, connection, show):
+  update_show_counters(connection, show.venue_id, show.artist_id, show.is_past, 1)
+
+@db.event.listens_for(Show, 'after_update')
+def recount_show(mapper, connection, show):
+  # A show moved to another venue or artist, or across the present, is
+  # taken off the old counters and put on the new ones
+  attrs = db.inspect(show).attrs
+  old, new = [], []
+  for key in ('venue_id', 'artist_id', 'is_past'):
+    history = attrs[key].history
+    new.append(getattr(show, key))
+    old.append(history.deleted[0] if history.deleted else new[-1])
+  if old != new:
+    update_show_counters(connection, *old, -1)
+    update_show_counters(connection, *new, 1)
+
+@db.event.listens_for(Show, 'after_delete')
+def uncount_show(mapper, connection, show):
+  update_show_counters(connection, show.venue_id, show.artist_id, show.is_past, -1)
+
+def update_show_counters(connection, venue_id, artist_id, is_past, delta):
+  for model, owner_id in ((Venue, venue_id), (Artist, artist_id)):
+    column = model.past_shows_count if is_past else model.upcoming_shows_count
+    connection.execute(model.__table__.update().where(model.id == owner_id) \
+                       .values({column: column + delta, model.updated_at: datetime.utcnow()}))
+
+install_search_index(Venue.__table__)
+install_search_index(Artist.__table__)
+
+# venue and artist names for /api/autocomplete, see autocomplete.py
+autocomplete = Autocomplete(db.session, {'venue': Venue, 'artist': Artist},
+                            sync_interval=app.config['AUTOCOMPLETE_SYNC_INTERVAL'],
+                            rebuild_interval=app.config['AUTOCOMPLETE_REBUILD_INTERVAL'])
+autocomplete.init_app(app)
+
 # DONE Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  # From https://stackoverflow.com/questions/63269150/typeerror-parser-must-be-a-string-or-character-stream-not-datetime
-  # instead of just date = dateutil.parser.parse(value)
-  if isinstance(value, str):
-      date = dateutil.parser.parse(value)
-  else:
-      date = value
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+# Accepts datetimes or date strings, see dateformat.py; parsed Babel
+# patterns and locales are kept, and recent results memoized
+format_datetime = DateFormatter(memo_size=app.config['DATETIME_FILTER_MEMO'])
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+def page_url(**args):
+  # The current page's URL with the given query arguments replaced
+  return url_for(request.endpoint, **dict(request.view_args, **dict(request.args.items(), **args)))
+
+app.jinja_env.globals['page_url'] = page_url
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -111,89 +277,70 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@replicas.read_only
 def venues():
   # Done: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data = list()
-  for state, city in (db.session.query(Venue.state, Venue.city).distinct(Venue.city) \
-                .group_by(Venue.state, Venue.city).all()):
-    location = dict()
-    location["city"] = city
-    location["state"] = state
-    location["venues"] = db.session.query(Venue.id, Venue.name, \
-                          db.func.count(Show.venue_id) \
-                          .filter(Show.start_time > datetime.utcnow()) \
-                          .label("num_upcoming_shows")) \
-                          .filter(Venue.city == city) \
-                          .outerjoin(Show, Venue.id == Show.venue_id) \
-                          .group_by(Venue.id, Venue.name).all()
-    data.append(location)                              
-  return render_template('pages/venues.html', areas=data);
-
-@app.route('/venues/search', methods=['POST'])
+
+  query, columns = venues_query(request.args)
+  page = paginate(query, columns)
+  return render_template('pages/venues.html', areas=venue_areas(page.items), page=page);
+
+@app.route('/venues/search', methods=['GET', 'POST'])
+@replicas.read_only
 def search_venues():
   # Done: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  
-  # As seen in https://stackoverflow.com/questions/3325467/sqlalchemy-equivalent-to-sql-like-statement
-  tag = request.form["search_term"]
-  search = "%{}%".format(tag)
-  venues = db.session.query(Venue.id, Venue.name, db.func.count(Show.venue_id) \
-          .filter(Show.start_time > datetime.utcnow()) \
-          .label("num_upcoming_shows")) \
-          .filter(Venue.name.ilike(search)) \
-          .outerjoin(Show, Venue.id == Show.venue_id) \
-          .group_by(Venue.id, Venue.name).all()
-
-  response={
-    "count": len(venues),
-    "data": venues
-  }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+
+  # Matches name, city or state through the search index (see search.py),
+  # most relevant first, one page at a time.
+  tag = request.values.get('search_term', '')
+  page = max(request.values.get('page', 1, type=int), 1)
+  per_page = app.config['SEARCH_RESULTS_PER_PAGE']
+  ids, total = search_ids(db.session, Venue, tag, page, per_page)
+  venues = search_results(Venue, ids)
+  response = search_response(venues, total, page, per_page)
+  return render_template('pages/search_venues.html', results=response, search_term=tag)
+
+@app.route('/venues/available')
+@replicas.read_only
+def available_venues():
+  # Venues in a city with no show overlapping the ?from= / ?to= window,
+  # for picking a venue before posting a show
+  city = request.args.get('city', '').strip()
+  state = request.args.get('state', '')
+  window = booking_window(request.args)
+  page = None
+  if city and state and window:
+    page = paginate(*available_venues_query(city, state, *window))
+  states = [value for value, _ in VenueForm.state.kwargs['choices']]
+  return render_template('pages/available_venues.html', page=page, city=city, state=state,
+                         window=window, states=states)
+
+@app.route('/venues/nearby')
+@replicas.read_only
+def nearby_venues():
+  # The venues within ?radius= km of ?lat= / ?lon=, nearest first
+  latitude = request.args.get('lat', type=float)
+  longitude = request.args.get('lon', type=float)
+  radius = request.args.get('radius', app.config['NEARBY_RADIUS_KM'], type=float)
+  hits = None
+  if latitude is not None and longitude is not None:
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and
+            0 < radius <= app.config['NEARBY_MAX_RADIUS_KM']):
+      abort(400)
+    hits = venues_near(latitude, longitude, radius, app.config['NEARBY_LIMIT'])
+  return render_template('pages/nearby_venues.html', hits=hits, latitude=latitude,
+                         longitude=longitude, radius=radius)
 
 @app.route('/venues/<int:venue_id>')
+@replicas.read_only
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # Done: replace with real venue data from the venues table, using venue_id
-
-  # from datetime import datetime
-  # from app import db, Venue, Show, Artist
-  check_venue_exist(venue_id)
-  past_shows =  db.session.query(Show.artist_id, Artist.name.label("artist_name"), \
-                    Artist.image_link.label("artist_image_link"), \
-                    Show.start_time) \
-                    .join(Artist, Show.artist_id == Artist.id) \
-                    .join(Venue, Show.venue_id == Venue.id) \
-                    .filter(Show.start_time < datetime.utcnow()) \
-                    .filter(Show.venue_id == venue_id) \
-                    .all()
-
-  upcoming_shows = db.session.query(Show.artist_id, Artist.name.label("artist_name"), \
-                    Artist.image_link.label("artist_image_link"), \
-                    Show.start_time) \
-                    .join(Artist, Show.artist_id == Artist.id) \
-                    .join(Venue, Show.venue_id == Venue.id) \
-                    .filter(Show.start_time >= datetime.utcnow()) \
-                    .filter(Show.venue_id == venue_id) \
-                    .all()
-  
-  past_shows_count = len(past_shows)
-  upcoming_shows_count = len(upcoming_shows)
-
-  data = Venue.query.get(venue_id)
-  
-  # Apparently Python allows you to add fields to 
-  # an object dynamically (at runtime)
-  # https://rosettacode.org/wiki/Add_a_variable_to_a_class_instance_at_runtime#Python
-  data.past_shows = past_shows
-  data.upcoming_shows = upcoming_shows
-  data.upcoming_shows_count = upcoming_shows_count
-  data.past_shows_count = past_shows_count
-
-  data.genres = data.genres[1:-1].split(",")
-  
-  return render_template('pages/show_venue.html', venue=data)
+  page = run_queries(detail_page(Venue, venue_id, request.environ, request.args))
+  return render_detail(page, 'pages/show_venue.html', 'venue')
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -219,7 +366,7 @@ def create_venue_submission():
     city = form.city.data,
     state = form.state.data,
     address = form.address.data,
-    genres = form.genres.data,
+    genres = genres_named(form.genres.data),
     phone = form.phone.data,
     image_link = form.image_link.data,
     facebook_link = form.facebook_link.data,
@@ -227,6 +374,7 @@ def create_venue_submission():
     seeking_talent =  form.seeking_talent.data,
     seeking_description = form.seeking_description.data
   )
+  locate_venue(newVenue)
   
   venue_id = 1
 
@@ -248,6 +396,8 @@ def create_venue_submission():
     flash('An error occurred. Venue ' + form.name.data + ' could not be listed.')
     return render_template('forms/new_venue.html', form=form)
   else:
+    cache.delete('venue:%s' % venue_id)
+    autocomplete.add('venue', venue_id, form.name.data)
     flash('Venue ' + form.name.data + ' was successfully listed!')
   return redirect(url_for('show_venue', venue_id=venue_id))
 
@@ -262,6 +412,8 @@ def delete_venue(venue_id):
   # clicking that button delete it from the db then redirect the user to the homepage
   check_venue_exist(venue_id)
   venue = Venue.query.get(venue_id)
+  # Collected before the delete cascades away the venue's shows
+  cache_keys = venue_cache_keys(venue_id)
   error = False
   try:        
       db.session.delete(venue)
@@ -276,6 +428,8 @@ def delete_venue(venue_id):
   if error:
     abort(422)
 
+  cache.delete(*cache_keys)
+  autocomplete.remove('venue', int(venue_id))
   return jsonify({'status': "success"})
 
 
@@ -287,11 +441,8 @@ def edit_venue(venue_id):
   venue = Venue.query.get(venue_id)
   form = VenueForm(obj=venue) 
 
-  # Since generes are stored with curly braces, 
-  # I remove them and make a list from them 
-  # This is needed to properly display them in edit_artist
-  genres = venue.genres[1:-1].split(",")
-  form.genres.data = genres
+  # The form works with genre names, not Genre rows
+  form.genres.data = [genre.name for genre in venue.genres]
   
   # Done: populate form with fields from artist with ID <artist_id>
   return render_template('forms/edit_venue.html', form=form, venue=venue)
@@ -313,15 +464,19 @@ def edit_venue_submission(venue_id):
   venue.city = form.city.data
   venue.state = form.state.data
   venue.address = form.address.data
-  venue.genres = form.genres.data
+  venue.genres = genres_named(form.genres.data)
   venue.phone = form.phone.data
   venue.image_link = form.image_link.data
   venue.facebook_link = form.facebook_link.data
   venue.website = form.website.data
   venue.seeking_talent =  form.seeking_talent.data
   venue.seeking_description = form.seeking_description.data
+  locate_venue(venue)
+  # set here too, as a change to the genres alone does not update the row
+  venue.updated_at = datetime.utcnow()
   
   try:        
+      touch_partners(Venue, venue_id)
       db.session.commit()
   except:
       db.session.rollback()
@@ -337,6 +492,8 @@ def edit_venue_submission(venue_id):
     flash('An error occurred. Venue ' + form.name.data + ' could not be updated.')
     return render_template('forms/edit_venue.html', form=form, venue=venue)
   else:
+    cache.delete(*venue_cache_keys(venue_id))
+    autocomplete.add('venue', venue_id, form.name.data)
     flash('Venue ' + form.name.data + ' was successfully updated!')
 
   return redirect(url_for('show_venue', venue_id=venue_id))
@@ -344,72 +501,37 @@ def edit_venue_submission(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@replicas.read_only
 def artists():
   # Done: replace with real data returned from querying the database
-  data = db.session.query(Artist.id, Artist.name)
-  return render_template('pages/artists.html', artists=data)
+  query, columns = artists_query(request.args)
+  page = paginate(query, columns)
+  return render_template('pages/artists.html', artists=page.items, page=page)
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
+@replicas.read_only
 def search_artists():
   # Done: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
 
-  # As seen in https://stackoverflow.com/questions/3325467/sqlalchemy-equivalent-to-sql-like-statement
-  tag = request.form["search_term"]
-  search = "%{}%".format(tag)
-  artists = db.session.query(Artist.id, Artist.name, db.func.count(Show.artist_id) \
-          .filter(Show.start_time > datetime.utcnow()) \
-          .label("num_upcoming_shows")) \
-          .filter(Artist.name.ilike(search)) \
-          .outerjoin(Show, Artist.id == Show.artist_id) \
-          .group_by(Artist.id, Artist.name).all()
-
-  response={
-    "count": len(artists),
-    "data": artists
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  # Matches name, city or state through the search index (see search.py),
+  # most relevant first, one page at a time.
+  tag = request.values.get('search_term', '')
+  page = max(request.values.get('page', 1, type=int), 1)
+  per_page = app.config['SEARCH_RESULTS_PER_PAGE']
+  ids, total = search_ids(db.session, Artist, tag, page, per_page)
+  artists = search_results(Artist, ids)
+  response = search_response(artists, total, page, per_page)
+  return render_template('pages/search_artists.html', results=response, search_term=tag)
 
 @app.route('/artists/<int:artist_id>')
+@replicas.read_only
 def show_artist(artist_id):
-  check_artist_exist(artist_id)
   # shows the artist page with the given artist_id
   # Done: replace with real venue data from the venues table, using venue_id
-  past_shows =  db.session.query(Show.venue_id, Venue.name.label("venue_name"), \
-                    Venue.image_link.label("venue_image_link"), \
-                    Show.start_time) \
-                    .join(Venue, Show.venue_id == Venue.id) \
-                    .join(Artist, Show.artist_id == Artist.id) \
-                    .filter(Show.start_time < datetime.utcnow()) \
-                    .filter(Show.artist_id == artist_id) \
-                    .all()
-
-  upcoming_shows = db.session.query(Show.venue_id, Venue.name.label("venue_name"), \
-                    Venue.image_link.label("venue_image_link"), \
-                    Show.start_time) \
-                    .join(Venue, Show.venue_id == Venue.id) \
-                    .join(Artist, Show.artist_id == Artist.id) \
-                    .filter(Show.start_time >= datetime.utcnow()) \
-                    .filter(Show.artist_id == artist_id) \
-                    .all()
-  
-  past_shows_count = len(past_shows)
-  upcoming_shows_count = len(upcoming_shows)
-
-  data = Artist.query.get(artist_id)
-  
-  # Apparently Python allows you to add fields to 
-  # an object dynamically (at runtime)
-  # https://rosettacode.org/wiki/Add_a_variable_to_a_class_instance_at_runtime#Python
-  data.past_shows = past_shows
-  data.upcoming_shows = upcoming_shows
-  data.upcoming_shows_count = upcoming_shows_count
-  data.past_shows_count = past_shows_count
-
-  data.genres = data.genres[1:-1].split(",")
-  
-  return render_template('pages/show_artist.html', artist=data)
+  page = run_queries(detail_page(Artist, artist_id, request.environ, request.args))
+  return render_detail(page, 'pages/show_artist.html', 'artist')
 
 #  Delete Venue
 #  ----------------------------------------------------------------
@@ -422,6 +544,8 @@ def delete_artist(artist_id):
   # BONUS CHALLENGE: Implement a button to delete an Artist on a Artist Page, have it so that
   # clicking that button delete it from the db then redirect the user to the homepage
   artist = Artist.query.get(artist_id)
+  # Collected before the delete cascades away the artist's shows
+  cache_keys = artist_cache_keys(artist_id)
   error = False
   try:        
       db.session.delete(artist)
@@ -436,6 +560,8 @@ def delete_artist(artist_id):
   if error:
     abort(422)
 
+  cache.delete(*cache_keys)
+  autocomplete.remove('artist', artist_id)
   return jsonify({'status': "success"})
 
 #  Update Artist
@@ -446,11 +572,8 @@ def edit_artist(artist_id):
   artist = Artist.query.get(artist_id)
   form = ArtistForm(obj=artist) 
 
-  # Since generes are stored with curly braces, 
-  # I remove them and make a list from them 
-  # This is needed to properly display them in edit_artist
-  genres = artist.genres[1:-1].split(",")
-  form.genres.data = genres
+  # The form works with genre names, not Genre rows
+  form.genres.data = [genre.name for genre in artist.genres]
   
   # Done: populate form with fields from artist with ID <artist_id>
   return render_template('forms/edit_artist.html', form=form, artist=artist)
@@ -473,14 +596,17 @@ def edit_artist_submission(artist_id):
   artist.city = form.city.data
   artist.state = form.state.data
   artist.phone = form.phone.data
-  artist.genres = form.genres.data
+  artist.genres = genres_named(form.genres.data)
   artist.image_link = form.image_link.data
   artist.facebook_link = form.facebook_link.data
   artist.website = form.website.data
   artist.seeking_venue = form.seeking_venue.data
   artist.seeking_description = form.seeking_description.data
+  # set here too, as a change to the genres alone does not update the row
+  artist.updated_at = datetime.utcnow()
 
   try:        
+      touch_partners(Artist, artist_id)
       db.session.commit()
   except:
       db.session.rollback()
@@ -497,6 +623,8 @@ def edit_artist_submission(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist)
   else:
     # on successful db insert, flash success
+    cache.delete(*artist_cache_keys(artist_id))
+    autocomplete.add('artist', artist_id, form.name.data)
     flash('Artist ' + form.name.data + ' was successfully updated!')
   return redirect(url_for('show_artist', artist_id=artist_id))
 
@@ -526,7 +654,7 @@ def create_artist_submission():
     city = form.city.data,
     state = form.state.data,
     phone = form.phone.data,
-    genres = form.genres.data,
+    genres = genres_named(form.genres.data),
     image_link = form.image_link.data,
     facebook_link = form.facebook_link.data,
     website = form.website.data,
@@ -553,6 +681,8 @@ def create_artist_submission():
     return render_template('forms/new_artist.html', form=form)
   else:
     # on successful db insert, flash success
+    cache.delete('artist:%s' % artist_id)
+    autocomplete.add('artist', artist_id, form.name.data)
     flash('Artist ' + form.name.data + ' was successfully listed!')
   return redirect(url_for('show_artist', artist_id=artist_id))
   #return render_template('pages/home.html')
@@ -561,27 +691,22 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@replicas.read_only
 def shows():
   # displays list of shows at /shows
   # Done: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.
 
-  data = db.session.query(Show.venue_id.label("venue_id"), Venue.name.label("venue_name"), \
-                           Show.artist_id.label("artist_id"), Artist.name.label("artist_name"), \
-                           Artist.image_link.label("artist_image_link"),
-                           Show.start_time) \
-                           .join(Venue, Venue.id == Show.venue_id) \
-                           .join(Artist, Artist.id == Show.artist_id) \
-                           .filter(Show.start_time >= datetime.utcnow()) \
-                           .order_by(Show.start_time.asc()).all()
+  query, columns = shows_query()
+  page = paginate(query, columns)
 
-  return render_template('pages/shows.html', shows=data)
+  return render_template('pages/shows.html', shows=page.items, page=page)
 
 @app.route('/shows/create')
 def create_shows():
   # renders form. do not touch.
   form = ShowForm()
-  return render_template('forms/new_show.html', form=form)
+  return show_form(form)
 
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
@@ -591,7 +716,16 @@ def create_show_submission():
   if not form.validate():
     flash('An error occurred. Show could not be listed.')
     print(form.errors)
-    return render_template('forms/new_show.html', form=form)
+    return show_form(form)
+
+  # Both ids in one query, so a bad pick never gets as far as a failed
+  # insert and its rollback
+  venue_exists, artist_exists = show_partners_query(form.venue_id.data, form.artist_id.data).one()
+  if not (venue_exists and artist_exists):
+    missing = [] if venue_exists else ['venue %d' % form.venue_id.data]
+    missing += [] if artist_exists else ['artist %d' % form.artist_id.data]
+    flash('An error occurred. Show could not be listed: there is no %s.' % ' or '.join(missing))
+    return show_form(form)
   
   error = False
 
@@ -616,13 +750,156 @@ def create_show_submission():
     # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
     # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
     flash('An error occurred. Show could not be listed.')
-    return render_template('forms/new_show.html', form=form)
+    return show_form(form)
   else:
     # on successful db insert, flash success
+    cache.delete('venue:%s' % form.venue_id.data, 'artist:%s' % form.artist_id.data)
     flash('Show was successfully listed!')
 
   return redirect(url_for('shows'))
 
+def show_form(form):
+  # The show form again, its pickers showing the names of the ids picked
+  names = {kind: autocomplete.name(kind, field.data) if isinstance(field.data, int) else None
+           for kind, field in (('venue', form.venue_id), ('artist', form.artist_id))}
+  return render_template('forms/new_show.html', form=form, names=names)
+
+#  API
+#  ----------------------------------------------------------------
+
+# Fields each export can return, selectable with ?fields=a,b,c
+API_FIELDS = {
+  'shows': {
+    'id': Show.id,
+    'start_time': Show.start_time,
+    'venue_id': Show.venue_id,
+    'venue_name': Venue.name,
+    'venue_image_link': Venue.image_link,
+    'artist_id': Show.artist_id,
+    'artist_name': Artist.name,
+    'artist_image_link': Artist.image_link,
+  },
+  'venues': {column.name: column for column in Venue.__table__.columns},
+  'artists': {column.name: column for column in Artist.__table__.columns},
+}
+
+@app.route('/api/v1/shows')
+@replicas.read_only
+def api_shows():
+  return api_export('shows')
+
+@app.route('/api/v1/venues')
+@replicas.read_only
+def api_venues():
+  return api_export('venues')
+
+@app.route('/api/v1/artists')
+@replicas.read_only
+def api_artists():
+  return api_export('artists')
+
+@app.route('/api/autocomplete')
+@replicas.read_only
+def api_autocomplete():
+  # Venue or artist names starting with ?q=, or with a later word that
+  # does, for the navbar search boxes; answered from memory
+  kind = request.args.get('type')
+  if kind not in autocomplete.indexes:
+    abort(400)
+  limit = request.args.get('limit', app.config['AUTOCOMPLETE_LIMIT'], type=int)
+  limit = min(max(limit, 1), app.config['AUTOCOMPLETE_MAX_LIMIT'])
+  endpoint = 'show_venue' if kind == 'venue' else 'show_artist'
+  results = [{'id': id, 'name': name, 'url': url_for(endpoint, **{kind + '_id': id})}
+             for id, name in autocomplete.search(kind, request.args.get('q', ''), limit)]
+  response = jsonify(results=results)
+  response.cache_control.public = True
+  response.cache_control.max_age = app.config['AUTOCOMPLETE_MAX_AGE']
+  return response
+
+def api_export(resource):
+  # Streams every row as NDJSON (default) or, with ?format=json, as one
+  # JSON array. Rows come off a server-side cursor in batches, so the
+  # export runs in constant memory however large the table is.
+  fields = API_FIELDS[resource]
+  names = request.args.get('fields', ','.join(fields)).split(',')
+  if any(name not in fields for name in names):
+    abort(400)
+  format = request.args.get('format', 'ndjson')
+  if format not in ('ndjson', 'json'):
+    abort(400)
+  try:
+    since = request.args.get('since') and naive_utc(dateutil.parser.parse(request.args['since']))
+    until = request.args.get('until') and naive_utc(dateutil.parser.parse(request.args['until']))
+  except (ValueError, OverflowError):
+    abort(400)
+
+  query = db.session.query(*[fields[name].label(name) for name in names])
+  if resource == 'shows':
+    query = query.select_from(Show)
+    if any(fields[name].class_ is Venue for name in names):
+      query = query.join(Venue, Venue.id == Show.venue_id)
+    if any(fields[name].class_ is Artist for name in names):
+      query = query.join(Artist, Artist.id == Show.artist_id)
+    if since:
+      query = query.filter(Show.start_time >= since)
+    if until:
+      query = query.filter(Show.start_time < until)
+    query = query.order_by(Show.start_time, Show.id)
+  else:
+    # Venues and artists have no time of their own: since/until keep
+    # the ones with a show in that window
+    model = Venue if resource == 'venues' else Artist
+    query = query.select_from(model)
+    if since or until:
+      fk = Show.venue_id if model is Venue else Show.artist_id
+      shows_in_window = db.session.query(Show.id).filter(fk == model.id)
+      if since:
+        shows_in_window = shows_in_window.filter(Show.start_time >= since)
+      if until:
+        shows_in_window = shows_in_window.filter(Show.start_time < until)
+      query = query.filter(shows_in_window.exists())
+    query = query.order_by(model.id)
+
+  batch_size = app.config['API_BATCH_SIZE']
+  def chunks():
+    chunk = []
+    for row in query.yield_per(batch_size):
+      chunk.append(json.dumps(row._asdict(), default=json_default))
+      if len(chunk) == batch_size:
+        yield chunk
+        chunk = []
+    if chunk:
+      yield chunk
+
+  def generate():
+    if format == 'ndjson':
+      for chunk in chunks():
+        yield ''.join(line + '\n' for line in chunk)
+    else:
+      yield '['
+      for i, chunk in enumerate(chunks()):
+        yield (',' if i else '') + ','.join(chunk)
+      yield ']'
+
+  mimetype = 'application/x-ndjson' if format == 'ndjson' else 'application/json'
+  return Response(stream_with_context(generate()), mimetype=mimetype)
+
+if app.config['DEBUG_ENDPOINTS']:
+  @app.route('/_debug/cache')
+  def cache_stats():
+    # hit/miss counters for tuning CACHE_MAXSIZE / CACHE_TTL
+    return jsonify(cache.stats())
+
+  @app.route('/_debug/fragments')
+  def fragment_stats():
+    # hit rate of the {% cache %} fragments, for FRAGMENT_CACHE_MAXSIZE / _TTL
+    return jsonify(fragments.stats())
+
+  @app.route('/_debug/pool')
+  def pool_stats_view():
+    # connection pool usage for sizing DB_POOL_SIZE / DB_MAX_OVERFLOW per worker
+    return jsonify(pool_stats.snapshot(db.engine.pool))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -655,6 +932,568 @@ def check_artist_exist(artist_id):
   if not artist_exists:
     abort(404)
 
+def detail_page(model, owner_id, environ, args):
+  # A venue or artist detail page, for show_venue/show_artist here and
+  # their async versions in asgi.py: a generator that yields each query
+  # the page needs, is sent back its rows, and returns a 304 response or
+  # the page's (data, validators). The validators come first, so a client
+  # with a current copy costs one query. Otherwise the venue and one page
+  # of each show list come back from one outer join (a venue with nothing
+  # on those pages is one row of NULL show columns, no row at all is a
+  # 404), followed by one query for its genre names. Only the first pages,
+  # which nearly every visit sees, are cached.
+  rows = yield page_validators_query(model, owner_id)
+  validators = page_validators(rows[0] if rows else None)
+  if not is_resource_modified(environ, validators[0], last_modified=validators[1]):
+    return not_modified(*validators)
+  upcoming_page, past_page = detail_pages(args)
+  first_pages = upcoming_page == 1 and past_page == 1
+  key = '%s:%s' % (model.__name__.lower(), owner_id)
+  if first_pages:
+    data = cached_page(key, validators[0])
+    if data is not None:
+      return data, validators
+  if model is Venue:
+    rows = yield venue_detail_query(owner_id, upcoming_page, past_page)
+    fk = venue_genres.c.venue_id
+  else:
+    rows = yield artist_detail_query(owner_id, upcoming_page, past_page)
+    fk = artist_genres.c.artist_id
+  if not rows:
+    abort(404)
+  genres = yield genre_names_query(fk, owner_id)
+  data = detail_data(model, rows, genres, upcoming_page, past_page)
+  if first_pages:
+    cache.set(key, (validators[0], data), ttl=page_ttl(data))
+  return data, validators
+
+def run_queries(steps):
+  # Runs the queries a generator such as detail_page() yields, sending it
+  # their rows, and returns what it returns
+  rows = None
+  while True:
+    try:
+      query = steps.send(rows)
+    except StopIteration as done:
+      return done.value
+    rows = query.all()
+
+def render_detail(page, template, name):
+  # The response for what detail_page() returned
+  if isinstance(page, Response):
+    return page
+  data, validators = page
+  return with_validators(make_response(render_template(template, **{name: data})), *validators)
+
+def venue_detail_query(venue_id, upcoming_page, past_page):
+  shows = db.session.query(Show.venue_id, Show.artist_id, Artist.name.label("artist_name"), \
+                    Artist.image_link.label("artist_image_link"), \
+                    Artist.updated_at.label("artist_updated_at"), \
+                    Show.start_time, *show_window(datetime.utcnow())) \
+                    .join(Artist, Show.artist_id == Artist.id) \
+                    .filter(Show.venue_id == venue_id, Show.start_time.isnot(None)) \
+                    .subquery()
+  return db.session.query(*Venue.__table__.columns, shows.c.artist_id, shows.c.artist_name, \
+                    shows.c.artist_image_link, shows.c.artist_updated_at, shows.c.start_time, \
+                    shows.c.is_past, shows.c.total) \
+                    .outerjoin(shows, db.and_(shows.c.venue_id == Venue.id, \
+                                              on_show_pages(shows, upcoming_page, past_page))) \
+                    .filter(Venue.id == venue_id) \
+                    .order_by(shows.c.start_time)
+
+def artist_detail_query(artist_id, upcoming_page, past_page):
+  shows = db.session.query(Show.artist_id, Show.venue_id, Venue.name.label("venue_name"), \
+                    Venue.image_link.label("venue_image_link"), \
+                    Venue.updated_at.label("venue_updated_at"), \
+                    Show.start_time, *show_window(datetime.utcnow())) \
+                    .join(Venue, Show.venue_id == Venue.id) \
+                    .filter(Show.artist_id == artist_id, Show.start_time.isnot(None)) \
+                    .subquery()
+  return db.session.query(*Artist.__table__.columns, shows.c.venue_id, shows.c.venue_name, \
+                    shows.c.venue_image_link, shows.c.venue_updated_at, shows.c.start_time, \
+                    shows.c.is_past, shows.c.total) \
+                    .outerjoin(shows, db.and_(shows.c.artist_id == Artist.id, \
+                                              on_show_pages(shows, upcoming_page, past_page))) \
+                    .filter(Artist.id == artist_id) \
+                    .order_by(shows.c.start_time)
+
+def genre_names_query(fk, owner_id):
+  # fk is the venue_id/artist_id column of a genre association table
+  return db.session.query(Genre.name) \
+           .join(fk.table, fk.table.c.genre_id == Genre.id) \
+           .filter(fk == owner_id) \
+           .order_by(Genre.name)
+
+def page_validators_query(model, owner_id):
+  # The venue's or artist's updated_at, the latest updated_at of its shows
+  # and the start of its latest show to have started (when the page last
+  # moved a show from upcoming to past): one primary key lookup and two
+  # index lookups
+  fk = Show.venue_id if model is Venue else Show.artist_id
+  shows_updated = db.session.query(db.func.max(Show.updated_at)) \
+                    .filter(fk == owner_id).as_scalar()
+  last_started = db.session.query(db.func.max(Show.start_time)) \
+                   .filter(fk == owner_id, Show.start_time < datetime.utcnow()).as_scalar()
+  return db.session.query(model.updated_at, shows_updated, last_started) \
+           .filter(model.id == owner_id)
+
+def page_validators(row):
+  # (etag, last_modified) of a detail page from its page_validators_query()
+  # row, 404 for a missing venue or artist
+  if row is None:
+    abort(404)
+  stamps = [value for value in row if value is not None]
+  etag = hashlib.sha1('/'.join(stamp.isoformat() for stamp in stamps).encode()).hexdigest()[:20]
+  return etag, max(stamps)
+
+def not_modified(etag, last_modified):
+  return set_validators(Response(status=304), etag, last_modified)
+
+def with_validators(response, etag, last_modified):
+  # For a rendered page; one that showed a flashed message is not for reuse
+  if response.status_code != 200 or get_flashed_messages():
+    return response
+  return set_validators(response, etag, last_modified)
+
+def set_validators(response, etag, last_modified):
+  # no-cache: clients and caches may keep the page but revalidate it
+  response.set_etag(etag, weak=True)
+  response.last_modified = last_modified
+  response.cache_control.no_cache = True
+  return response
+
+def touch_partners(model, owner_id):
+  # A venue's name and image appear on the pages of the artists playing
+  # there, and the other way round, so an edit changes those pages too
+  if model is Venue:
+    partner, ids = Artist, db.session.query(Show.artist_id).filter(Show.venue_id == owner_id)
+  else:
+    partner, ids = Venue, db.session.query(Show.venue_id).filter(Show.artist_id == owner_id)
+  partner.query.filter(partner.id.in_(ids)) \
+    .update({partner.updated_at: datetime.utcnow()}, synchronize_session=False)
+
+def detail_pages(args):
+  # The ?upcoming_page= / ?past_page= of a detail page
+  return max(args.get('upcoming_page', 1, type=int), 1), max(args.get('past_page', 1, type=int), 1)
+
+def show_window(now):
+  # Numbers each show from the present outwards within its list (upcoming
+  # soonest first, past most recent first) and counts the list, so one
+  # query returns a page of each list together with both totals. Each use
+  # of is_past binds now separately, as the async SQLite driver (asgi.py)
+  # cannot bind one parameter twice.
+  is_past = lambda: Show.start_time < now
+  return [
+    is_past().label("is_past"),
+    db.func.row_number().over(partition_by=is_past(), order_by=Show.start_time).label("upcoming_rank"),
+    db.func.row_number().over(partition_by=is_past(), order_by=Show.start_time.desc()).label("past_rank"),
+    db.func.count().over(partition_by=is_past()).label("total"),
+  ]
+
+def on_show_pages(shows, upcoming_page, past_page):
+  per_page = app.config['DETAIL_SHOWS_PER_PAGE']
+  return db.or_(
+    db.and_(db.not_(shows.c.is_past),
+            shows.c.upcoming_rank.between((upcoming_page - 1) * per_page + 1, upcoming_page * per_page)),
+    db.and_(shows.c.is_past,
+            shows.c.past_rank.between((past_page - 1) * per_page + 1, past_page * per_page)))
+
+def detail_data(model, rows, genres, upcoming_page, past_page):
+  # Splits (entity columns..., show columns..., is_past, total) rows into
+  # the detail page data. Plain dicts rather than ORM objects, so it can
+  # be cached
+  width = len(model.__table__.columns)
+  shows = [row for row in rows if row.start_time is not None]
+  upcoming_shows = [row for row in shows if not row.is_past]
+  past_shows = [row for row in reversed(shows) if row.is_past]
+  if (upcoming_page > 1 and not upcoming_shows) or (past_page > 1 and not past_shows):
+    abort(404)
+
+  per_page = app.config['DETAIL_SHOWS_PER_PAGE']
+  data = dict(zip(rows[0].keys()[:width], rows[0][:width]))
+  for name, page, page_shows in (("upcoming", upcoming_page, upcoming_shows), ("past", past_page, past_shows)):
+    total = page_shows[0].total if page_shows else 0
+    data[name + "_shows"] = [dict(zip(row.keys()[width:-2], row[width:-2])) for row in page_shows]
+    data[name + "_shows_count"] = total
+    data[name + "_page"] = page
+    data[name + "_pages"] = max(-(-total // per_page), 1)
+
+  data["genres"] = [genre.name for genre in genres]
+  return data
+
+def genres_named(names):
+  # Genre rows for the given names, adding any the table does not have yet
+  names = list(dict.fromkeys(names))
+  genres = Genre.query.filter(Genre.name.in_(names)).all() if names else []
+  known = {genre.name for genre in genres}
+  return genres + [Genre(name=name) for name in names if name not in known]
+
+def page_ttl(data):
+  # Keep a cached detail page no longer than until its next upcoming
+  # show starts, when that show has to move to the past shows list
+  ttl = app.config['CACHE_TTL']
+  if data["upcoming_shows"]:
+    next_show = min(show["start_time"] for show in data["upcoming_shows"])
+    ttl = min(ttl, max((next_show - datetime.utcnow()).total_seconds(), 1))
+  return ttl
+
+def cached_page(key, etag):
+  # Detail page data is cached with the ETag of the rows it was read from
+  # and only reused for that ETag, so a write that skipped the cache
+  # delete (another process's, a bulk import) or a read from a lagging
+  # replica is never served for a newer page
+  entry = cache.get(key)
+  if entry is not None and entry[0] == etag:
+    return entry[1]
+  return None
+
+def venue_cache_keys(venue_id):
+  # A venue's name and image also appear on the pages of its artists
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  return ['venue:%s' % venue_id] + ['artist:%s' % row.artist_id for row in artist_ids]
+
+def artist_cache_keys(artist_id):
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  return ['artist:%s' % artist_id] + ['venue:%s' % row.venue_id for row in venue_ids]
+
+def json_default(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError('%r is not JSON serializable' % (value,))
+
+def roll_show_counters(batch_size=1000):
+  # Moves shows whose start time has passed from their venue's and
+  # artist's upcoming_shows_count to past_shows_count. Returns how many.
+  now = datetime.utcnow()
+  moved = 0
+  while True:
+    shows = db.session.query(Show.id, Show.venue_id, Show.artist_id) \
+              .filter(db.not_(Show.is_past), Show.start_time <= now) \
+              .order_by(Show.start_time).limit(batch_size) \
+              .with_for_update(skip_locked=True).all()
+    if not shows:
+      return moved
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+      counts = Counter(getattr(show, key) for show in shows)
+      db.session.execute(model.__table__.update() \
+                         .where(model.id == db.bindparam('owner_id')) \
+                         .values(upcoming_shows_count=model.upcoming_shows_count - db.bindparam('moved'),
+                                 past_shows_count=model.past_shows_count + db.bindparam('moved'),
+                                 updated_at=now),
+                         [{'owner_id': owner_id, 'moved': count} for owner_id, count in counts.items()])
+    db.session.query(Show).filter(Show.id.in_([show.id for show in shows])) \
+      .update({Show.is_past: True, Show.updated_at: now}, synchronize_session=False)
+    db.session.commit()
+    moved += len(shows)
+
+def show_counter_drift(model, fk):
+  # Venues or artists whose counters disagree with their shows
+  upcoming = db.func.count(Show.id).filter(db.not_(Show.is_past))
+  past = db.func.count(Show.id).filter(Show.is_past)
+  return db.session.query(model.id, model.upcoming_shows_count, model.past_shows_count, \
+                          upcoming.label("upcoming"), past.label("past")) \
+                          .outerjoin(Show, fk == model.id) \
+                          .group_by(model.id, model.upcoming_shows_count, model.past_shows_count) \
+                          .having(db.or_(model.upcoming_shows_count != upcoming,
+                                         model.past_shows_count != past)) \
+                          .all()
+
+def page_args(args):
+  # The ?after= / ?before= / ?limit= keyset arguments, limit clamped
+  limit = args.get('limit', app.config['PAGE_SIZE'], type=int)
+  limit = min(max(limit, 1), app.config['MAX_PAGE_SIZE'])
+  return args.get('after'), args.get('before'), limit
+
+def paginate(query, columns):
+  # Keyset page of query for the ?after= / ?before= / ?limit= request args
+  after, before, limit = page_args(request.args)
+  try:
+    return keyset_paginate(query, columns, after=after, before=before, limit=limit)
+  except ValueError:
+    abort(400)
+
+def venues_query(args):
+  # One query for the whole area -> venue -> upcoming count tree, reading
+  # the maintained counters, ordered so venue_areas() can assemble the
+  # areas in a single pass, and walked a page at a time with a keyset
+  # cursor on that same order. Returns the query and its key columns.
+  query = db.session.query(Venue.state, Venue.city, Venue.id, Venue.name, Venue.updated_at, \
+                          Venue.upcoming_shows_count.label("num_upcoming_shows"))
+  genre = args.get('genre')
+  if genre:
+    query = query.join(venue_genres, venue_genres.c.venue_id == Venue.id) \
+                 .join(Genre, Genre.id == venue_genres.c.genre_id) \
+                 .filter(Genre.name == genre)
+  return query, [Venue.state, Venue.city, Venue.name, Venue.id]
+
+def venue_areas(rows):
+  data = list()
+  for (state, city), venues_in_area in groupby(rows, key=lambda row: (row.state, row.city)):
+    location = dict()
+    location["city"] = city
+    location["state"] = state
+    location["venues"] = list(venues_in_area)
+    data.append(location)
+  return data
+
+def booking_window(args):
+  # The ?from= / ?to= window, or None until both are given
+  if not args.get('from') or not args.get('to'):
+    return None
+  try:
+    start = naive_utc(dateutil.parser.parse(args['from']))
+    end = naive_utc(dateutil.parser.parse(args['to']))
+    # the earliest start_time available_venues_query looks back to
+    start - timedelta(minutes=app.config['SHOW_DURATION_MINUTES'])
+  except (ValueError, OverflowError):
+    abort(400)
+  if end <= start:
+    abort(400)
+  return start, end
+
+def naive_utc(value):
+  # Naive UTC, like Show.start_time; a value without an offset is taken
+  # to be UTC already
+  if value.tzinfo is None:
+    return value
+  return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def available_venues_query(city, state, start, end):
+  # Every show lasts SHOW_DURATION_MINUTES, so one overlaps [start, end)
+  # exactly when it starts after start - duration and before end. That is
+  # a range on start_time, which ix_shows_venue_id_start_time answers
+  # with one index probe per venue in the area, however many shows the
+  # venues have. Returns the query and its keyset columns.
+  duration = timedelta(minutes=app.config['SHOW_DURATION_MINUTES'])
+  booked = db.session.query(Show.id) \
+    .filter(Show.venue_id == Venue.id) \
+    .filter(Show.start_time > start - duration, Show.start_time < end)
+  query = db.session.query(Venue.id, Venue.name, Venue.address, Venue.image_link) \
+    .filter(Venue.state == state, Venue.city == city) \
+    .filter(~booked.exists())
+  return query, [Venue.name, Venue.id]
+
+def show_partners_query(venue_id, artist_id):
+  # (venue exists, artist exists), in one round trip
+  return db.session.query(db.session.query(Venue.id).filter(Venue.id == venue_id).exists(),
+                          db.session.query(Artist.id).filter(Artist.id == artist_id).exists())
+
+def locate_venue(venue):
+  # Places the venue at its city's centroid, or nowhere if the city is
+  # not in data/city_centroids.csv
+  point = gazetteer.locate(venue.city, venue.state)
+  venue.latitude, venue.longitude = point or (None, None)
+  venue.geohash = geohash(*point) if point else None
+
+def venues_near(latitude, longitude, radius, limit):
+  # Venues in the geohash cells around the point, one index range scan per
+  # cell, then only those within the radius: (distance, row), nearest first
+  ranges = cell_ranges(latitude, longitude, radius)
+  rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.address,
+                          Venue.latitude, Venue.longitude) \
+    .filter(db.or_(*[Venue.geohash.between(low, high) for low, high in ranges]))
+  hits = []
+  for row in rows:
+    distance = distance_km(latitude, longitude, row.latitude, row.longitude)
+    if distance <= radius:
+      hits.append((distance, row))
+  hits.sort(key=lambda hit: (hit[0], hit[1].name, hit[1].id))
+  return hits[:limit]
+
+def geocode_venues(everything=False):
+  # Locates the venues of each city with one UPDATE; returns the number of
+  # venues placed and the (city, state) pairs that are not in the dataset
+  venues = Venue.__table__
+  places = db.session.query(venues.c.city, venues.c.state, db.func.count())
+  if not everything:
+    places = places.filter(venues.c.latitude.is_(None))
+  located, missing = 0, []
+  for city, state, count in places.group_by(venues.c.city, venues.c.state).all():
+    point = gazetteer.locate(city, state)
+    if point is None:
+      missing.append((city, state))
+      continue
+    update = venues.update().where(venues.c.city == city).where(venues.c.state == state) \
+      .values(latitude=point[0], longitude=point[1], geohash=geohash(*point), updated_at=datetime.utcnow())
+    if not everything:
+      update = update.where(venues.c.latitude.is_(None))
+    db.session.execute(update)
+    located += count
+  db.session.commit()
+  return located, missing
+
+def artists_query(args):
+  query = db.session.query(Artist.id, Artist.name)
+  genre = args.get('genre')
+  if genre:
+    query = query.join(artist_genres, artist_genres.c.artist_id == Artist.id) \
+                 .join(Genre, Genre.id == artist_genres.c.genre_id) \
+                 .filter(Genre.name == genre)
+  return query, [Artist.name, Artist.id]
+
+def shows_query():
+  query = db.session.query(Show.id, Show.venue_id.label("venue_id"), Venue.name.label("venue_name"), \
+                           Show.artist_id.label("artist_id"), Artist.name.label("artist_name"), \
+                           Artist.image_link.label("artist_image_link"),
+                           Show.start_time, Show.updated_at, \
+                           Artist.updated_at.label("artist_updated_at"), \
+                           Venue.updated_at.label("venue_updated_at")) \
+                           .join(Venue, Venue.id == Show.venue_id) \
+                           .join(Artist, Artist.id == Show.artist_id) \
+                           .filter(Show.start_time >= datetime.utcnow())
+  return query, [Show.start_time, Show.id]
+
+def search_results(model, ids):
+  if not ids:
+    return []
+  return ranked(search_results_query(model, ids).all(), ids)
+
+def search_results_query(model, ids):
+  # Names and upcoming show counts for one page of search hits
+  return db.session.query(model.id, model.name, \
+           model.upcoming_shows_count.label("num_upcoming_shows")) \
+           .filter(model.id.in_(ids))
+
+def ranked(rows, ids):
+  # rows kept in the ranked order of ids
+  by_id = {row.id: row for row in rows}
+  return [by_id[id] for id in ids if id in by_id]
+
+def search_response(hits, total, page, per_page):
+  return {
+    "count": total,
+    "data": hits,
+    "page": page,
+    "pages": -(-total // per_page)
+  }
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('build-assets')
+def build_assets_command():
+  """Bundle, minify, fingerprint and precompress the css and js."""
+  build_assets(app.static_folder, echo=click.echo)
+
+@app.cli.command('import')
+@click.argument('table', type=click.Choice(IMPORT_TABLES))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']),
+              help='Input format, guessed from the file extension by default.')
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Rows written per transaction.')
+@click.option('--restart', is_flag=True,
+              help='Ignore the checkpoint of an earlier run and start from the top.')
+def import_command(table, path, format, batch_size, restart):
+  """Bulk load venues, artists or shows from a CSV or JSON Lines file."""
+  importer = BulkImporter(db.engine, db.metadata, table, batch_size=batch_size, echo=click.echo)
+  try:
+    imported = importer.run(path, format=format, resume=not restart)
+  except RuntimeError as e:
+    raise click.ClickException(str(e))
+  finally:
+    cache.clear()
+  click.echo('imported %d %s, rejected %d' % (imported, table, importer.rejected))
+  if table == 'venues':
+    located, missing = geocode_venues()
+    click.echo('located %d venues, %d cities not in the dataset' % (located, len(missing)))
+
+@app.cli.command('geocode-venues')
+@click.option('--all', 'everything', is_flag=True,
+              help='Locate every venue again, not only those without coordinates.')
+def geocode_venues_command(everything):
+  """Place venues at their city's centroid from data/city_centroids.csv."""
+  located, missing = geocode_venues(everything)
+  cache.clear()
+  click.echo('located %d venues' % located)
+  for city, state in missing:
+    click.echo('not in the dataset: %s, %s' % (city, state))
+
+@app.cli.command('roll-show-counters')
+def roll_show_counters_command():
+  """Move shows that have started from the upcoming to the past counts.
+
+  Run it periodically (e.g. every minute from cron); the listing and
+  search pages read these counts."""
+  click.echo('moved %d shows from upcoming to past' % roll_show_counters())
+
+@app.cli.command('check-show-counters')
+@click.option('--repair', is_flag=True, help='Rewrite the counters that have drifted.')
+def check_show_counters_command(repair):
+  """Compare the venue/artist show counters with the shows table."""
+  drifted = 0
+  for model, fk in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+    rows = show_counter_drift(model, fk)
+    for row in rows:
+      click.echo('%s %d: upcoming %d (actual %d), past %d (actual %d)' % (model.__tablename__, \
+                 row.id, row.upcoming_shows_count, row.upcoming, row.past_shows_count, row.past))
+    if repair and rows:
+      db.session.execute(model.__table__.update() \
+                         .where(model.id == db.bindparam('owner_id')) \
+                         .values(upcoming_shows_count=db.bindparam('upcoming'),
+                                 past_shows_count=db.bindparam('past'),
+                                 updated_at=datetime.utcnow()),
+                         [{'owner_id': row.id, 'upcoming': row.upcoming, 'past': row.past} for row in rows])
+    drifted += len(rows)
+  if repair:
+    db.session.commit()
+    click.echo('repaired %d counters' % drifted)
+  elif drifted:
+    click.echo('%d counters have drifted, rerun with --repair to fix them' % drifted)
+    sys.exit(1)
+  else:
+    click.echo('all counters match')
+
+@app.cli.command('create-show-partitions')
+@click.option('--months-ahead', default=3, show_default=True,
+              help='Months after the current one to create partitions for.')
+def create_show_partitions_command(months_ahead):
+  """Create the monthly shows partitions that do not exist yet.
+
+  Only for databases migrated with `-x partition_shows=true`. Run it
+  regularly (e.g. daily from cron) so new shows never land in
+  shows_default."""
+  with db.engine.begin() as connection:
+    if not partitions.is_partitioned(connection):
+      raise click.ClickException('the shows table is not partitioned')
+    months = partitions.missing_months(connection, datetime.utcnow(), months_ahead)
+  for month in months:
+    with db.engine.begin() as connection:
+      moved = partitions.create_partition(connection, month)
+    click.echo('created %s (%d rows moved from shows_default)' % (partitions.partition_name(month), moved))
+  if not months:
+    click.echo('all partitions up to %d months ahead exist' % months_ahead)
+
+@app.cli.command('archive-show-partitions')
+@click.option('--before', required=True, metavar='YYYY-MM',
+              type=click.DateTime(formats=['%Y-%m']),
+              help='Archive the partitions of the months before this one.')
+@click.option('--schema', default='archive', show_default=True,
+              help='Schema the detached partitions are moved to.')
+@click.option('--drop', is_flag=True, help='Drop the detached partitions instead.')
+def archive_show_partitions_command(before, schema, drop):
+  """Detach the monthly shows partitions older than --before.
+
+  Their shows leave the site, the venue/artist show counts included; the
+  tables themselves are kept in --schema unless --drop is given."""
+  before = partitions.month_start(before)
+  if before > partitions.month_start(datetime.utcnow()):
+    raise click.ClickException('--before cannot be later than the current month')
+  with db.engine.begin() as connection:
+    if not partitions.is_partitioned(connection):
+      raise click.ClickException('the shows table is not partitioned')
+    old = [name for month, name in partitions.month_partitions(connection) if month < before]
+  try:
+    for name in old:
+      with db.engine.begin() as connection:
+        partitions.archive_partition(connection, name, schema=None if drop else schema)
+      click.echo('%s %s' % ('dropped' if drop else 'archived to %s:' % schema, name))
+  finally:
+    cache.clear()
+  if not old:
+    click.echo('no partitions before %s' % before.strftime('%Y-%m'))
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
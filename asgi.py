@@ -0,0 +1,244 @@
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#
+# Optional async deployment mode:
+#
+#   pip install databases[postgresql] asgiref uvicorn  # databases[sqlite] for SQLite
+#   uvicorn asgi:application --workers 2
+#
+# The read-only pages (venue, artist and show listings, both searches and
+# both detail pages) run on an async connection pool (asyncpg, or
+# aiosqlite for SQLite), so a slow listing or search waits without holding
+# a worker thread. They are built from the same queries and helpers as the
+# views in app.py. Everything else, writes included, is passed to the Flask
+# app, which asgiref runs on a thread pool.
+#
+# SQLAlchemy 1.3 has no async engine, so the queries are compiled by
+# SQLAlchemy and executed by the `databases` package. Pages are rendered
+# after all of their queries have returned, and no Flask context is held
+# across an await. The work between queries that can block (the page
+# cache, which may be Redis) and the rendering with the app's request
+# hooks (whose replica health checks ping a database) run on the event
+# loop's default thread pool, never on the loop itself.
+#----------------------------------------------------------------------------#
+import asyncio
+import functools
+import re
+
+from asgiref.wsgi import WsgiToAsgi
+from databases import Database
+from sqlalchemy.util import KeyedTuple
+from werkzeug.datastructures import Headers
+from werkzeug.http import is_resource_modified
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from flask import Response, make_response, render_template
+from app import app, Venue, Artist, venues_query, venue_areas, artists_query, shows_query, \
+  page_args, search_results_query, ranked, search_response, detail_page, abort, \
+  with_validators
+from pagination import keyset_query, keyset_page
+from search import search_queries
+
+
+class AsyncReads(object):
+  """ASGI application serving the read-only pages of ``app`` from
+  ``database`` and handing every other request to ``fallback``."""
+
+  def __init__(self, app, database, fallback):
+    self.app = app
+    self.database = database
+    self.fallback = fallback
+    self.routes = [
+      ('GET', re.compile(r'^/venues$'), self.venues),
+      ('GET', re.compile(r'^/venues/search$'), self.search_venues),
+      ('POST', re.compile(r'^/venues/search$'), self.search_venues),
+      ('GET', re.compile(r'^/venues/(\d+)$'), self.show_venue),
+      ('GET', re.compile(r'^/artists$'), self.artists),
+      ('GET', re.compile(r'^/artists/search$'), self.search_artists),
+      ('POST', re.compile(r'^/artists/search$'), self.search_artists),
+      ('GET', re.compile(r'^/artists/(\d+)$'), self.show_artist),
+      ('GET', re.compile(r'^/shows$'), self.shows),
+    ]
+
+  async def __call__(self, scope, receive, send):
+    if scope['type'] == 'lifespan':
+      return await self.lifespan(receive, send)
+    route = self.match(scope) if scope['type'] == 'http' else None
+    if route is None:
+      return await self.fallback(scope, receive, send)
+    view, path_args = route
+
+    environ = wsgi_environ(scope, await read_body(receive))
+    try:
+      result = await view(Request(environ), *[int(arg) for arg in path_args])
+    except Exception as error:
+      response = await blocking(self.respond, environ, error=error)
+    else:
+      response = await blocking(self.respond, environ, result)
+
+    await send({
+      'type': 'http.response.start',
+      'status': response.status_code,
+      'headers': [(key.encode('latin-1'), value.encode('latin-1'))
+                  for key, value in response.headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+  async def lifespan(self, receive, send):
+    while True:
+      message = await receive()
+      if message['type'] == 'lifespan.startup':
+        await self.database.connect()
+        await send({'type': 'lifespan.startup.complete'})
+      elif message['type'] == 'lifespan.shutdown':
+        await self.database.disconnect()
+        await send({'type': 'lifespan.shutdown.complete'})
+        return
+
+  def match(self, scope):
+    for method, pattern, view in self.routes:
+      match = pattern.match(scope['path'])
+      if match and scope['method'] == method:
+        return view, match.groups()
+    return None
+
+  def respond(self, environ, result=None, error=None):
+    # Renders the page a view returned as (template, context[, validators])
+    # or passes on its response, or the error it raised, inside a request
+    # context of its own, running the app's request hooks and error
+    # handlers as Flask.wsgi_app would
+    with self.app.request_context(environ):
+      try:
+        try:
+          rv = self.app.preprocess_request()
+          if rv is None:
+            if error is not None:
+              raise error
+            rv = render(*result) if isinstance(result, tuple) else result
+        except Exception as error:
+          rv = self.app.handle_user_exception(error)
+        return self.app.finalize_request(rv)
+      except Exception as error:
+        return self.app.handle_exception(error)
+
+  #  Queries
+  #  ----------------------------------------------------------------
+
+  async def fetch(self, query):
+    # Rows of a Query or Core statement, with the attribute access the
+    # Query's own rows have
+    rows = await self.database.fetch_all(getattr(query, 'statement', query))
+    result = []
+    for row in rows:
+      keys = list(row.keys())
+      result.append(KeyedTuple([row[key] for key in keys], keys))
+    return result
+
+  async def paginate(self, query, columns, args):
+    after, before, limit = page_args(args)
+    try:
+      query = keyset_query(query, columns, after=after, before=before, limit=limit)
+    except ValueError:
+      abort(400)
+    return keyset_page(await self.fetch(query), columns, after=after, before=before, limit=limit)
+
+  async def search(self, model, args):
+    tag = args.get('search_term', '')
+    page = max(args.get('page', 1, type=int), 1)
+    per_page = self.app.config['SEARCH_RESULTS_PER_PAGE']
+    count, ids = search_queries(self.database.url.dialect, model, tag, page, per_page)
+    ids = [row[0] for row in await self.fetch(ids)]
+    total = (await self.fetch(count))[0][0]
+    hits = ranked(await self.fetch(search_results_query(model, ids)), ids) if ids else []
+    return search_response(hits, total, page, per_page), tag
+
+  async def detail(self, model, owner_id, request, template, name):
+    # detail_page() as show_venue/show_artist run it, with each query
+    # awaited and the steps between them run on the thread pool
+    steps = detail_page(model, owner_id, request.environ, request.args)
+    rows = None
+    while True:
+      done, value = await blocking(advance, steps, rows)
+      if done:
+        break
+      rows = await self.fetch(value)
+    if isinstance(value, Response):
+      return value
+    data, validators = value
+    return template, {name: data}, validators
+
+  #  Views
+  #  ----------------------------------------------------------------
+
+  async def venues(self, request):
+    page = await self.paginate(*venues_query(request.args), request.args)
+    return 'pages/venues.html', dict(areas=venue_areas(page.items), page=page)
+
+  async def search_venues(self, request):
+    response, tag = await self.search(Venue, request.values)
+    return 'pages/search_venues.html', dict(results=response, search_term=tag)
+
+  async def show_venue(self, request, venue_id):
+    return await self.detail(Venue, venue_id, request, 'pages/show_venue.html', 'venue')
+
+  async def artists(self, request):
+    page = await self.paginate(*artists_query(request.args), request.args)
+    return 'pages/artists.html', dict(artists=page.items, page=page)
+
+  async def search_artists(self, request):
+    response, tag = await self.search(Artist, request.values)
+    return 'pages/search_artists.html', dict(results=response, search_term=tag)
+
+  async def show_artist(self, request, artist_id):
+    return await self.detail(Artist, artist_id, request, 'pages/show_artist.html', 'artist')
+
+  async def shows(self, request):
+    page = await self.paginate(*shows_query(), request.args)
+    return 'pages/shows.html', dict(shows=page.items, page=page)
+
+
+async def blocking(function, *args, **kwargs):
+  return await asyncio.get_running_loop().run_in_executor(
+    None, functools.partial(function, *args, **kwargs))
+
+
+def advance(steps, rows):
+  # steps.send(rows) as (done, the query yielded or the value returned),
+  # as StopIteration cannot be passed out of an executor
+  try:
+    return False, steps.send(rows)
+  except StopIteration as stop:
+    return True, stop.value
+
+
+def render(template, context, validators=None):
+  response = make_response(render_template(template, **context))
+  return response if validators is None else with_validators(response, *validators)
+
+
+async def read_body(receive):
+  body = b''
+  while True:
+    message = await receive()
+    body += message.get('body', b'')
+    if not message.get('more_body'):
+      return body
+
+
+def wsgi_environ(scope, body):
+  # WSGI environ of an ASGI http scope, for the request context pages
+  # are rendered in
+  headers = Headers([(key.decode('latin-1'), value.decode('latin-1'))
+                     for key, value in scope['headers']])
+  scheme = scope.get('scheme', 'http')
+  host = headers.get('host') or '%s:%s' % tuple(scope['server'] or ('localhost', 80))
+  client = scope.get('client') or ('', 0)
+  return EnvironBuilder(path=scope['path'], method=scope['method'],
+                        base_url='%s://%s%s' % (scheme, host, scope.get('root_path', '')),
+                        query_string=scope['query_string'].decode('latin-1'),
+                        headers=headers, data=body,
+                        environ_base={'REMOTE_ADDR': client[0]}).get_environ()
+
+
+application = AsyncReads(app, Database(app.config['ASYNC_DATABASE_URL']), WsgiToAsgi(app))
@@ -0,0 +1,189 @@
+#----------------------------------------------------------------------------#
+# Static assets.
+#
+# `flask build-assets` concatenates the stylesheets and scripts of each
+# bundle below, minifies them, and writes each one to static/dist under a
+# name carrying a hash of its content, next to .gz and (with the optional
+# `brotli` package) .br copies. It also writes static/dist/manifest.json,
+# mapping bundle names to those files. Templates link assets through
+# static_url() and bundle_urls(). Those use the built files when there is
+# a manifest and the source files when there is not, as in a fresh
+# checkout. Built files never change under the same name. /static/dist
+# serves them with a year-long immutable Cache-Control, picking the
+# precompressed copy the client accepts.
+#
+# CSS and JS are minified with rcssmin/rjsmin when those are installed.
+# Otherwise CSS gets a conservative built-in minifier and JS is only
+# concatenated; most of the scripts are shipped minified already.
+#----------------------------------------------------------------------------#
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+
+from flask import request, send_from_directory, url_for
+
+# Bundle name -> source files under static/, in load order (script.js
+# used to load deferred from the head, which runs it in the same place,
+# before the deferred scripts at the end of the body). The output
+# lands one level below static/, like the sources, so relative url()s in
+# the stylesheets still resolve.
+BUNDLES = {
+  'main.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+               'css/main.responsive.css', 'css/main.quickfix.css'],
+  'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+  'main.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'],
+  'jquery.js': ['js/libs/jquery-1.11.1.min.js'],
+  'respond.js': ['js/libs/respond-1.4.2.min.js'],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+ONE_YEAR = 365 * 24 * 3600
+
+# Precompressed copies, best first: (suffix, Content-Encoding)
+ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s+')
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(source):
+  try:
+    import rcssmin
+  except ImportError:
+    source = CSS_COMMENT.sub('', source)
+    source = CSS_SPACE.sub(' ', source)
+    return CSS_PUNCTUATION.sub(r'\1', source).replace(';}', '}').strip()
+  return rcssmin.cssmin(source)
+
+
+def minify_js(source):
+  try:
+    import rjsmin
+  except ImportError:
+    return source
+  return rjsmin.jsmin(source)
+
+
+def compressed_copies(path, data):
+  with gzip.open(path + '.gz', 'wb', compresslevel=9) as out:
+    out.write(data)
+  written = ['gzip']
+  try:
+    import brotli
+  except ImportError:
+    return written
+  with open(path + '.br', 'wb') as out:
+    out.write(brotli.compress(data))
+  return written + ['br']
+
+
+def build(static_folder, bundles=BUNDLES, echo=print):
+  """Write every bundle and the manifest to static_folder/dist, removing
+  the files of earlier builds. Returns the manifest."""
+  dist = os.path.join(static_folder, DIST)
+  os.makedirs(dist, exist_ok=True)
+  manifest = {}
+  for name, sources in sorted(bundles.items()):
+    parts = []
+    for source in sources:
+      with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+        parts.append(f.read())
+    if name.endswith('.css'):
+      data = minify_css('\n'.join(parts))
+    else:
+      # a separator for scripts that do not end their last statement
+      data = minify_js('\n;\n'.join(parts))
+    data = data.encode('utf-8')
+    stem, ext = os.path.splitext(name)
+    filename = '%s.%s%s' % (stem, hashlib.sha256(data).hexdigest()[:12], ext)
+    with open(os.path.join(dist, filename), 'wb') as out:
+      out.write(data)
+    encodings = compressed_copies(os.path.join(dist, filename), data)
+    manifest[name] = filename
+    echo('%s -> %s/%s (%d bytes, %s)' % (name, DIST, filename, len(data), ', '.join(encodings)))
+
+  keep = set(manifest.values()) | {MANIFEST}
+  for filename in os.listdir(dist):
+    built = filename
+    for suffix, _ in ENCODINGS:
+      if built.endswith(suffix):
+        built = built[:-len(suffix)]
+    if built not in keep:
+      os.remove(os.path.join(dist, filename))
+  with open(os.path.join(dist, MANIFEST), 'w') as out:
+    json.dump(manifest, out, indent=2, sort_keys=True)
+  return manifest
+
+
+class Assets(object):
+
+  def __init__(self, app=None):
+    self._lock = threading.Lock()
+    self._manifest = None
+    self._mtime = None
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    self.static_folder = app.static_folder
+    self.reload = app.debug
+    app.jinja_env.globals.update(static_url=self.static_url, bundle_urls=self.bundle_urls)
+    app.add_url_rule('/%s/%s/<path:filename>' % (app.static_url_path.strip('/'), DIST),
+                     'static_dist', self.send_built)
+
+  @property
+  def manifest(self):
+    # Read once, or again whenever it changes while debugging
+    path = os.path.join(self.static_folder, DIST, MANIFEST)
+    if self._manifest is not None and not self.reload:
+      return self._manifest
+    try:
+      mtime = os.stat(path).st_mtime
+    except OSError:
+      return {}
+    with self._lock:
+      if mtime != self._mtime:
+        with open(path) as f:
+          self._manifest = json.load(f)
+        self._mtime = mtime
+    return self._manifest
+
+  def static_url(self, filename):
+    """URL of a static file or a single-file bundle, built if it has
+    been built."""
+    built = self.manifest.get(filename)
+    if built is not None:
+      return url_for('static_dist', filename=built)
+    if filename in BUNDLES:
+      filename, = BUNDLES[filename]
+    return url_for('static', filename=filename)
+
+  def bundle_urls(self, name):
+    """The built bundle, or the URLs of its source files when there is
+    no build yet."""
+    if name in self.manifest:
+      return [self.static_url(name)]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+  def send_built(self, filename):
+    # Fingerprinted files never change, so they can be cached forever
+    folder = os.path.join(self.static_folder, DIST)
+    accepted = request.accept_encodings
+    for suffix, encoding in ENCODINGS:
+      if accepted[encoding] and os.path.isfile(os.path.join(folder, filename + suffix)):
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(folder, filename + suffix, mimetype=mimetype,
+                                       cache_timeout=ONE_YEAR)
+        response.headers['Content-Encoding'] = encoding
+        break
+    else:
+      response = send_from_directory(folder, filename, cache_timeout=ONE_YEAR)
+    response.headers['Cache-Control'] = 'public, max-age=%d, immutable' % ONE_YEAR
+    response.vary.add('Accept-Encoding')
+    return response
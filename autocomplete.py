@@ -0,0 +1,221 @@
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#
+# In-process prefix indexes of venue and artist names for
+# /api/autocomplete and the show form's pickers. Each index is two sorted arrays searched with bisect:
+# the full names, and the names from the start of each later word, so
+# "hop" finds "The Musical Hop" after the names that start with "hop".
+# Names are case- and accent-folded.
+#
+# Each index is built from the database by its first lookup in a process,
+# which also starts the rebuild thread below. The write routes then update
+# the indexes in place (add/remove). Other worker processes catch up on
+# their own: each lookup re-reads the rows whose updated_at moved on since
+# the last sync, at most every AUTOCOMPLETE_SYNC_INTERVAL seconds, and a
+# background thread rebuilds every index every
+# AUTOCOMPLETE_REBUILD_INTERVAL seconds, to drop the rows other processes
+# deleted. Rebuilds and syncs query outside the locks lookups take: a
+# rebuild reads the table into new arrays and swaps them in, so lookups
+# carry on against the old ones meanwhile.
+#----------------------------------------------------------------------------#
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from sqlalchemy import func
+
+
+def fold(text):
+  text = text or ''
+  if text.isascii():
+    return ' '.join(text.lower().split())
+  text = unicodedata.normalize('NFKD', text)
+  text = ''.join(char for char in text if not unicodedata.combining(char))
+  return ' '.join(text.casefold().split())
+
+
+def word_keys(key):
+  # The key from the start of each word after the first
+  return [key[i + 1:] for i, char in enumerate(key) if char == ' ']
+
+
+class PrefixIndex(object):
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.names = []
+    self.words = []
+    self.entries = {}
+
+  def __len__(self):
+    return len(self.entries)
+
+  def load(self, rows):
+    # (id, name) rows, replacing everything
+    names, words, entries = [], [], {}
+    for id, name in rows:
+      key = fold(name)
+      entries[id] = (key, name)
+      names.append((key, id, name))
+      words.extend((word, id, name) for word in word_keys(key))
+    names.sort()
+    words.sort()
+    with self._lock:
+      self.names, self.words, self.entries = names, words, entries
+
+  def add(self, id, name):
+    key = fold(name)
+    with self._lock:
+      if self.entries.get(id) == (key, name):
+        return
+      self._remove(id)
+      self.entries[id] = (key, name)
+      insort(self.names, (key, id, name))
+      for word in word_keys(key):
+        insort(self.words, (word, id, name))
+
+  def remove(self, id):
+    with self._lock:
+      self._remove(id)
+
+  def _remove(self, id):
+    entry = self.entries.pop(id, None)
+    if entry is None:
+      return
+    key, name = entry
+    for array, words in ((self.names, [key]), (self.words, word_keys(key))):
+      for word in words:
+        i = bisect_left(array, (word, id, name))
+        if i < len(array) and array[i] == (word, id, name):
+          del array[i]
+
+  def search(self, prefix, limit):
+    """(id, name) of up to ``limit`` names with a word starting with
+    ``prefix``, those whose first word does ahead of the rest."""
+    prefix = fold(prefix)
+    if not prefix:
+      return []
+    found, seen = [], set()
+    with self._lock:
+      for array in (self.names, self.words):
+        i = bisect_left(array, (prefix,))
+        while i < len(array) and len(found) < limit and array[i][0].startswith(prefix):
+          _, id, name = array[i]
+          if id not in seen:
+            seen.add(id)
+            found.append((id, name))
+          i += 1
+    return found
+
+
+class Autocomplete(object):
+  """A PrefixIndex per kind of ``models`` (e.g. {'venue': Venue}), kept
+  in step with their tables through ``session``."""
+
+  def __init__(self, session, models, sync_interval=5, rebuild_interval=600):
+    self.session = session
+    self.models = models
+    self.sync_interval = sync_interval
+    self.rebuild_interval = rebuild_interval
+    self._lock = threading.Lock()
+    self._rebuilder = None
+    self.app = None
+    self.indexes = {kind: PrefixIndex() for kind in models}
+    # kind -> (time of the last sync, latest updated_at seen)
+    self.synced = {}
+
+  def init_app(self, app):
+    # Nothing is read or started here: CLI commands (db upgrade among them)
+    # never read the tables, and the rebuild thread starts in the process
+    # that serves the lookups, after any pre-fork
+    self.app = app
+
+  def start(self, app):
+    """Build every index, and rebuild them on a background thread from
+    now on; for warming a process up ahead of its first lookup."""
+    for kind in self.models:
+      self.build(kind)
+    self.start_rebuilder(app)
+
+  def start_rebuilder(self, app):
+    with self._lock:
+      if self._rebuilder is not None:
+        return
+      self._rebuilder = threading.Thread(target=self.rebuild_forever, args=(app,),
+                                         name='autocomplete-rebuild', daemon=True)
+    self._rebuilder.start()
+
+  def rebuild_forever(self, app):
+    while True:
+      time.sleep(self.rebuild_interval)
+      with app.app_context():
+        for kind in self.models:
+          try:
+            self.build(kind)
+          except Exception:
+            app.logger.exception('autocomplete: rebuilding the %s index failed', kind)
+        self.session.remove()
+
+  def build(self, kind):
+    model = self.models[kind]
+    latest = self.session.query(func.max(model.updated_at)).scalar() or datetime.min
+    self.indexes[kind].load(self.session.query(model.id, model.name))
+    with self._lock:
+      # Rows synced into the old arrays meanwhile are read again from latest
+      self.synced[kind] = (time.monotonic(), latest)
+
+  def search(self, kind, prefix, limit=10):
+    self.refresh(kind)
+    return self.indexes[kind].search(prefix, limit)
+
+  def name(self, kind, id):
+    # From the index rather than the database, e.g. to redisplay a pick
+    self.refresh(kind)
+    entry = self.indexes[kind].entries.get(id)
+    return entry[1] if entry else None
+
+  def add(self, kind, id, name):
+    self.indexes[kind].add(id, name)
+
+  def remove(self, kind, id):
+    self.indexes[kind].remove(id)
+
+  def invalidate(self):
+    # The next lookup of each kind builds its index again
+    with self._lock:
+      self.synced.clear()
+
+  def refresh(self, kind):
+    now = time.monotonic()
+    synced, latest = self.synced.get(kind, (None, None))
+    if synced is not None and now - synced < self.sync_interval:
+      return
+    if synced is None:
+      # Not started, or invalidated
+      self.build(kind)
+      if self.app is not None:
+        self.start_rebuilder(self.app)
+      return
+    with self._lock:
+      synced, latest = self.synced[kind]
+      if now - synced < self.sync_interval:
+        return
+      # Claimed, so concurrent lookups carry on without syncing meanwhile
+      self.synced[kind] = (now, latest)
+    # Only rows written by other processes since the last sync, read
+    # without holding the lock
+    index = self.indexes[kind]
+    model = self.models[kind]
+    rows = self.session.query(model.id, model.name, model.updated_at) \
+                       .filter(model.updated_at >= latest).all()
+    for id, name, updated_at in rows:
+      index.add(id, name)
+      latest = max(latest, updated_at)
+    with self._lock:
+      # Unless invalidated meanwhile; a build may also have finished
+      # meanwhile, from a later latest
+      if kind in self.synced:
+        synced, stored = self.synced[kind]
+        self.synced[kind] = (synced, max(stored, latest))
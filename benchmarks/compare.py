@@ -0,0 +1,56 @@
+#----------------------------------------------------------------------------#
+# Compare load test results.
+#
+# Prints the per-route change between two benchmarks.loadtest result files,
+# usually the same dataset and settings run on two commits:
+#
+#   python -m benchmarks.compare benchmarks/results/BEFORE.json benchmarks/results/AFTER.json
+#----------------------------------------------------------------------------#
+import argparse
+import json
+
+METRICS = [
+  ('p50_ms', 'p50 ms'),
+  ('p95_ms', 'p95 ms'),
+  ('p99_ms', 'p99 ms'),
+  ('throughput_rps', 'req/s'),
+  ('statements_avg', 'stmts'),
+]
+
+
+def change(before, after):
+  if not before:
+    return ''
+  return '%+.0f%%' % ((after - before) / before * 100)
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Compare two load test result files.')
+  parser.add_argument('before')
+  parser.add_argument('after')
+  args = parser.parse_args()
+  with open(args.before) as f:
+    before = json.load(f)
+  with open(args.after) as f:
+    after = json.load(f)
+
+  print('before: %s (%s)' % (before['commit'], before['created']))
+  print('after:  %s (%s)' % (after['commit'], after['created']))
+  for key in ('dataset', 'settings', 'database'):
+    if before[key] != after[key]:
+      print('warning: %s differs: %r -> %r' % (key, before[key], after[key]))
+
+  print('%-26s' % 'route' + ''.join('%22s' % heading for _, heading in METRICS))
+  for name in list(before['routes']) + [name for name in after['routes'] if name not in before['routes']]:
+    old, new = before['routes'].get(name), after['routes'].get(name)
+    if old is None or new is None:
+      print('%-26s only in %s' % (name, 'after' if old is None else 'before'))
+      continue
+    cells = []
+    for key, _ in METRICS:
+      cells.append('%22s' % ('%.1f -> %.1f %s' % (old[key], new[key], change(old[key], new[key]))))
+    print('%-26s' % name + ''.join(cells))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,70 @@
+#----------------------------------------------------------------------------#
+# Micro-benchmark: the `datetime` template filter.
+#
+# Renders a list of show tiles through Jinja with the old per-call
+# babel.dates.format_datetime filter and with dateformat.DateFormatter,
+# with and without its memo. Run from the repository root:
+#
+#   python -m benchmarks.datetime_filter [--shows 10000] [--distinct 500]
+#
+# --distinct is how many different start times the shows share; a listing
+# page repeats the same evening slots many times over.
+#----------------------------------------------------------------------------#
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+from jinja2 import Environment
+
+from dateformat import DateFormatter, FORMATS
+
+TEMPLATE = '''{% for show in shows %}<div class="tile"><h4>{{ show.start_time|datetime('full') }}</h4></div>
+{% endfor %}'''
+
+
+def babel_filter(value, format='medium'):
+  # What app.py did before DateFormatter
+  return babel.dates.format_datetime(value, FORMATS.get(format, format))
+
+
+def render(make_filter, shows, repeat):
+  # Each run gets a fresh filter, so a memo starts cold
+  best = None
+  for _ in range(repeat):
+    env = Environment()
+    env.filters['datetime'] = make_filter()
+    template = env.from_string(TEMPLATE)
+    started = time.perf_counter()
+    template.render(shows=shows)
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--shows', type=int, default=10000)
+  parser.add_argument('--distinct', type=int, default=500)
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  start = datetime(2026, 1, 1, 20, 0)
+  shows = [{'start_time': start + timedelta(hours=i % args.distinct)} for i in range(args.shows)]
+
+  candidates = [
+    ('babel.dates.format_datetime', lambda: babel_filter),
+    ('DateFormatter, no memo', lambda: DateFormatter(memo_size=0)),
+    ('DateFormatter, memo', lambda: DateFormatter()),
+  ]
+  baseline = None
+  print('%d shows, %d distinct start times, best of %d' % (args.shows, args.distinct, args.repeat))
+  for name, make in candidates:
+    elapsed = render(make, shows, args.repeat)
+    baseline = baseline or elapsed
+    print('  %-30s %8.1f ms  %10.0f shows/s  x%.1f'
+          % (name, elapsed * 1000, args.shows / elapsed, baseline / elapsed))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,310 @@
+#----------------------------------------------------------------------------#
+# Load test.
+#
+# Drives every route of app.py through the Flask test client, at a fixed
+# number of concurrent clients, against a catalog seeded by
+# benchmarks.seed. For each route it records p50/p95/p99 latency,
+# throughput and SQL statements per request. The results are written as
+# JSON so runs on different commits can be set side by side with
+# benchmarks.compare.
+#
+#   python -m benchmarks.loadtest --database-url sqlite:////tmp/fyyur-bench.db \
+#       --concurrency 8 --requests 200 [--writes] [--no-cache]
+#
+# --writes adds the create/edit/delete routes. They only touch rows the
+# run creates itself and delete them again, so the seeded catalog is
+# unchanged afterwards.
+#----------------------------------------------------------------------------#
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from benchmarks.seed import CITY_AREA
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+SEARCH_TERMS = ['blue', 'hall', 'city 1', 'velvet band', 'ne', 'xyzzy']
+
+
+def percentile(values, fraction):
+  # Nearest-rank percentile of a sorted list
+  if not values:
+    return None
+  return values[max(math.ceil(fraction * len(values)), 1) - 1]
+
+
+def git_commit():
+  try:
+    commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'], stderr=subprocess.DEVNULL) != 0
+  except (OSError, subprocess.CalledProcessError):
+    return None
+  return commit + ('-dirty' if dirty else '')
+
+
+class StatementCounter(object):
+  """Counts the SQL statements each thread's current request runs."""
+
+  def __init__(self, engine):
+    from sqlalchemy import event
+    self._local = threading.local()
+    event.listen(engine, 'before_cursor_execute', self.count)
+
+  def count(self, *args):
+    self._local.statements = getattr(self._local, 'statements', 0) + 1
+
+  def start(self):
+    self._local.statements = 0
+
+  def stop(self):
+    return self._local.statements
+
+
+class Routes(object):
+  """The requests the load test makes, keyed by route name. Each returns
+  (method, path, form data or None) for one request."""
+
+  def __init__(self, app, db, models, rng, writes):
+    self.db = db
+    self.rng = rng
+    self.lock = threading.Lock()
+    with app.app_context():
+      self.venue_ids = [row[0] for row in db.session.query(models.Venue.id)]
+      self.artist_ids = [row[0] for row in db.session.query(models.Artist.id)]
+      # The venues and artists with the most shows have the longest detail pages
+      self.busy_venue_ids = [row[0] for row in db.session.query(models.Venue.id).order_by(
+        models.Venue.past_shows_count.desc()).limit(20)]
+      self.busy_artist_ids = [row[0] for row in db.session.query(models.Artist.id).order_by(
+        models.Artist.past_shows_count.desc()).limit(20)]
+    if not self.venue_ids or not self.artist_ids:
+      raise SystemExit('the database has no venues or artists, run benchmarks.seed first')
+    self.run_id = uuid.uuid4().hex[:8]
+    self.created = {'venues': [], 'artists': []}
+    day = datetime.utcnow().date() + timedelta(days=7)
+    self.window = 'since=%s&until=%s' % (day, day + timedelta(days=1))
+
+    self.reads = [
+      ('index', lambda: ('GET', '/', None)),
+      ('venues', lambda: ('GET', '/venues', None)),
+      ('venues_genre', lambda: ('GET', '/venues?genre=Jazz&limit=50', None)),
+      ('search_venues', lambda: ('GET', '/venues/search?search_term=%s' % self.term(), None)),
+      ('show_venue', lambda: ('GET', '/venues/%d' % self.rng.choice(self.venue_ids), None)),
+      ('venues_nearby', lambda: ('GET', '/venues/nearby?lat=%.4f&lon=%.4f&radius=50' % self.point(), None)),
+      ('show_venue_busy', lambda: ('GET', '/venues/%d?past_page=2' % self.rng.choice(self.busy_venue_ids), None)),
+      ('edit_venue', lambda: ('GET', '/venues/%d/edit' % self.rng.choice(self.venue_ids), None)),
+      ('create_venue_form', lambda: ('GET', '/venues/create', None)),
+      ('artists', lambda: ('GET', '/artists', None)),
+      ('artists_genre', lambda: ('GET', '/artists?genre=Jazz&limit=50', None)),
+      ('search_artists', lambda: ('GET', '/artists/search?search_term=%s' % self.term(), None)),
+      ('show_artist', lambda: ('GET', '/artists/%d' % self.rng.choice(self.artist_ids), None)),
+      ('show_artist_busy', lambda: ('GET', '/artists/%d?past_page=2' % self.rng.choice(self.busy_artist_ids), None)),
+      ('edit_artist', lambda: ('GET', '/artists/%d/edit' % self.rng.choice(self.artist_ids), None)),
+      ('create_artist_form', lambda: ('GET', '/artists/create', None)),
+      ('shows', lambda: ('GET', '/shows', None)),
+      ('create_shows', lambda: ('GET', '/shows/create', None)),
+      ('api_shows', lambda: ('GET', '/api/v1/shows?%s' % self.window, None)),
+      ('api_venues', lambda: ('GET', '/api/v1/venues?fields=id,name&%s' % self.window, None)),
+      ('api_artists', lambda: ('GET', '/api/v1/artists?fields=id,name&%s' % self.window, None)),
+      ('autocomplete', lambda: ('GET', '/api/autocomplete?type=venue&q=%s' % self.term()[:3], None)),
+      ('cache_stats', lambda: ('GET', '/_debug/cache', None)),
+      ('pool_stats', lambda: ('GET', '/_debug/pool', None)),
+    ]
+    # In order: what the later write routes work on is made by the earlier ones
+    self.writes = [
+      ('create_venue_submission', lambda: ('POST', '/venues/create', self.owner_form('venues'))),
+      ('create_artist_submission', lambda: ('POST', '/artists/create', self.owner_form('artists'))),
+      ('edit_venue_submission', lambda: self.edit('venues')),
+      ('edit_artist_submission', lambda: self.edit('artists')),
+      ('create_show_submission', lambda: ('POST', '/shows/create', self.show_form())),
+      ('delete_venue', lambda: ('DELETE', '/venues/%d' % self.take('venues'), None)),
+      ('delete_artist', lambda: ('DELETE', '/artists/%d' % self.take('artists'), None)),
+    ] if writes else []
+    # Write routes working on the rows created earlier in the run
+    self.needs_created = {
+      'edit_venue_submission': 'venues',
+      'edit_artist_submission': 'artists',
+      'create_show_submission': 'venues',
+      'delete_venue': 'venues',
+      'delete_artist': 'artists',
+    }
+
+  def point(self):
+    # Somewhere in the area benchmarks.seed puts its cities
+    south, west, north, east = CITY_AREA
+    return self.rng.uniform(south, north), self.rng.uniform(west, east)
+
+  def term(self):
+    return self.rng.choice(SEARCH_TERMS).replace(' ', '+')
+
+  def owner_form(self, kind):
+    form = {
+      'name': 'Bench %s %s %s' % (kind, self.run_id, uuid.uuid4().hex[:8]),
+      'city': 'City 1',
+      'state': 'CA',
+      'phone': '415-555-0100',
+      'image_link': 'https://images.example.com/bench.jpg',
+      'facebook_link': 'https://www.facebook.com/bench',
+      'website': 'https://bench.example.com',
+      'genres': ['Jazz', 'Folk'],
+      'seeking_description': '',
+    }
+    if kind == 'venues':
+      form['address'] = '1 Bench Street'
+    return form
+
+  def load_created(self, models):
+    # Ids of the venues and artists this run created, for the edit/delete routes
+    for kind, model in (('venues', models.Venue), ('artists', models.Artist)):
+      self.created[kind] = [row[0] for row in self.db.session.query(model.id).filter(
+        model.name.like('Bench %s %s %%' % (kind, self.run_id)))]
+
+  def edit(self, kind):
+    owner_id = self.rng.choice(self.created[kind])
+    return ('POST', '/%s/%d/edit' % (kind, owner_id), self.owner_form(kind))
+
+  def show_form(self):
+    start_time = datetime.utcnow() + timedelta(days=self.rng.randint(1, 60))
+    return {
+      'venue_id': str(self.rng.choice(self.created['venues'])),
+      'artist_id': str(self.rng.choice(self.artist_ids)),
+      'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+  def take(self, kind):
+    with self.lock:
+      return self.created[kind].pop()
+
+
+def drive(app, counter, name, make_request, requests, concurrency, warmup):
+  local = threading.local()
+
+  def one(record):
+    client = getattr(local, 'client', None)
+    if client is None:
+      client = local.client = app.test_client()
+    method, path, data = make_request()
+    counter.start()
+    started = time.perf_counter()
+    response = client.open(path, method=method, data=data)
+    response.get_data()  # consume streamed bodies inside the timing
+    elapsed = time.perf_counter() - started
+    statements = counter.stop()
+    response.close()
+    if record:
+      return elapsed, statements, response.status_code
+
+  with ThreadPoolExecutor(max_workers=concurrency) as pool:
+    list(pool.map(lambda _: one(False), range(warmup)))
+    started = time.perf_counter()
+    samples = list(pool.map(lambda _: one(True), range(requests)))
+    wall = time.perf_counter() - started
+
+  latencies = sorted(sample[0] for sample in samples)
+  statements = [sample[1] for sample in samples]
+  status = Counter(sample[2] for sample in samples)
+  return {
+    'requests': requests,
+    'errors': sum(count for code, count in status.items() if code >= 500),
+    'status': {str(code): count for code, count in sorted(status.items())},
+    'throughput_rps': requests / wall,
+    'mean_ms': sum(latencies) / len(latencies) * 1000,
+    'p50_ms': percentile(latencies, 0.50) * 1000,
+    'p95_ms': percentile(latencies, 0.95) * 1000,
+    'p99_ms': percentile(latencies, 0.99) * 1000,
+    'max_ms': latencies[-1] * 1000,
+    'statements_avg': sum(statements) / len(statements),
+    'statements_max': max(statements),
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Load test every Fyyur route.')
+  parser.add_argument('--database-url', help='Defaults to DATABASE_URL / config.py.')
+  parser.add_argument('--concurrency', type=int, default=8)
+  parser.add_argument('--requests', type=int, default=200, help='Measured requests per route.')
+  parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per route first.')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--writes', action='store_true', help='Also drive the create/edit/delete routes.')
+  parser.add_argument('--no-cache', action='store_true', help='Disable the detail page cache.')
+  parser.add_argument('--routes', help='Comma separated route names to run, all by default.')
+  parser.add_argument('--output', help='Result file, benchmarks/results/<time>-<commit>.json by default.')
+  args = parser.parse_args()
+  if args.database_url:
+    os.environ['DATABASE_URL'] = args.database_url
+  if args.no_cache:
+    os.environ['CACHE_BACKEND'] = 'memory'
+    os.environ['CACHE_MAXSIZE'] = '0'
+  # for the cache_stats and pool_stats routes
+  os.environ['DEBUG_ENDPOINTS'] = 'true'
+
+  import app as fyyur
+  app, db = fyyur.app, fyyur.db
+  app.config['WTF_CSRF_ENABLED'] = False
+  rng = random.Random(args.seed)
+  routes = Routes(app, db, fyyur, rng, args.writes)
+  with app.app_context():
+    counter = StatementCounter(db.engine)
+    dataset = {table: db.session.query(db.func.count()).select_from(db.metadata.tables[table]).scalar()
+               for table in ('venues', 'artists', 'shows', 'genres')}
+    database = db.engine.url.__to_string__(hide_password=True)
+
+  selected = args.routes.split(',') if args.routes else None
+  results = {}
+  for name, make_request in routes.reads + routes.writes:
+    if selected and name not in selected:
+      continue
+    requests, warmup = args.requests, args.warmup
+    if name in routes.needs_created:
+      with app.app_context():
+        routes.load_created(fyyur)
+      kind = routes.needs_created[name]
+      if not routes.created[kind]:
+        print('%-26s skipped, no %s created by this run' % (name, kind))
+        continue
+      if name.startswith('delete_'):
+        # Each delete needs a row of its own
+        requests, warmup = len(routes.created[kind]), 0
+    results[name] = drive(app, counter, name, make_request, requests, args.concurrency, warmup)
+    result = results[name]
+    print('%-26s p50 %7.1fms  p95 %7.1fms  p99 %7.1fms  %7.1f req/s  %5.1f stmts  %s'
+          % (name, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+             result['throughput_rps'], result['statements_avg'], result['status']))
+
+  report = {
+    'commit': git_commit(),
+    'created': datetime.utcnow().isoformat() + 'Z',
+    'python': platform.python_version(),
+    'database': database,
+    'dataset': dataset,
+    'settings': {
+      'concurrency': args.concurrency,
+      'requests': args.requests,
+      'warmup': args.warmup,
+      'seed': args.seed,
+      'writes': args.writes,
+      'cache': not args.no_cache,
+    },
+    'routes': results,
+  }
+  output = args.output
+  if not output:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = os.path.join(RESULTS_DIR, '%s-%s.json' % (datetime.utcnow().strftime('%Y%m%dT%H%M%S'),
+                                                       (report['commit'] or 'unknown')[:12]))
+  with open(output, 'w') as f:
+    json.dump(report, f, indent=2, sort_keys=True)
+  print('results written to %s' % output)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,178 @@
+#----------------------------------------------------------------------------#
+# Benchmark dataset.
+#
+# Seeds a synthetic catalog of venues, artists and shows into the database
+# named by DATABASE_URL (or --database-url). The same --seed and sizes
+# always give the same catalog, so runs on different commits compare like
+# with like. Rows are written with the bulk importer's insert path: COPY on
+# Postgres, executemany elsewhere, with genres linked and show counters
+# kept as the importer does.
+#
+#   python -m benchmarks.seed --database-url sqlite:////tmp/fyyur-bench.db --scale 0.01
+#
+# The defaults (--scale 1) are 100k artists, 20k venues in 2k cities and
+# 5M shows.
+#----------------------------------------------------------------------------#
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+SIZES = {
+  'artists': 100000,
+  'venues': 20000,
+  'cities': 2000,
+  'shows': 5000000,
+}
+
+WORDS = ['Blue', 'Electric', 'Velvet', 'Midnight', 'Golden', 'Wild', 'Silver', 'Hollow',
+         'Crimson', 'Lucky', 'Paper', 'Neon', 'Iron', 'Little', 'Northern', 'Broken']
+ARTIST_NOUNS = ['Band', 'Quartet', 'Collective', 'Sound', 'Orchestra', 'Trio', 'Project', 'Kids']
+VENUE_NOUNS = ['Hall', 'Lounge', 'Club', 'Theater', 'Room', 'Garden', 'Cellar', 'Arena']
+
+# Synthetic cities are placed in this (south, west, north, east) box,
+# roughly the continental US
+CITY_AREA = (25.0, -124.0, 49.0, -67.0)
+
+# Shows are spread from this far back to this far ahead of the seed time
+PAST_DAYS = 3 * 365
+FUTURE_DAYS = 365
+
+
+def choices(field):
+  # Values of a select field on the app's forms
+  import forms
+  return [value for value, _ in getattr(forms.VenueForm, field).kwargs['choices']]
+
+
+def sizes_for(scale, **overrides):
+  sizes = {key: max(int(value * scale), 1) for key, value in SIZES.items()}
+  sizes.update((key, value) for key, value in overrides.items() if value is not None)
+  return sizes
+
+
+def city_points(seed, count):
+  # A random generator of its own, so the rest of the catalog stays the
+  # same as before venues had coordinates
+  rng = random.Random('%s-cities' % seed)
+  south, west, north, east = CITY_AREA
+  return [(rng.uniform(south, north), rng.uniform(west, east)) for _ in range(count)]
+
+
+def owner_rows(rng, kind, count, cities, genres, points):
+  from geo import geohash
+  nouns = VENUE_NOUNS if kind == 'venues' else ARTIST_NOUNS
+  for number in range(1, count + 1):
+    index = rng.randrange(len(cities))
+    city, state = cities[index]
+    row = {
+      'name': '%s %s %s %d' % (rng.choice(WORDS), rng.choice(WORDS), rng.choice(nouns), number),
+      'city': city,
+      'state': state,
+      'phone': '%03d-%03d-%04d' % (rng.randrange(200, 999), rng.randrange(1000), rng.randrange(10000)),
+      'image_link': 'https://images.example.com/%s/%d.jpg' % (kind, number),
+      'facebook_link': 'https://www.facebook.com/%s%d' % (kind, number),
+      'website': 'https://%s%d.example.com' % (kind[:-1], number),
+      'seeking_description': None,
+      'genres': rng.sample(genres, rng.randint(1, 3)),
+    }
+    if kind == 'venues':
+      row['address'] = '%d %s Street' % (rng.randrange(1, 2000), rng.choice(WORDS))
+      row['seeking_talent'] = rng.random() < 0.3
+      # at the city's centre, as the app places venues
+      row['latitude'], row['longitude'] = points[index]
+      row['geohash'] = geohash(*points[index])
+    else:
+      row['seeking_venue'] = rng.random() < 0.3
+    yield row
+
+
+def show_rows(rng, count, artist_ids, venue_ids, now):
+  # Popularity is skewed, so some venues and artists have thousands of
+  # shows and the paged detail lists get exercised
+  for _ in range(count):
+    start_time = now + timedelta(days=rng.uniform(-PAST_DAYS, FUTURE_DAYS))
+    start_time = start_time.replace(minute=0, second=0, microsecond=0)
+    yield {
+      'start_time': start_time,
+      'artist_id': artist_ids[min(int(rng.paretovariate(1.2)) - 1, len(artist_ids) - 1)
+                              if rng.random() < 0.2 else rng.randrange(len(artist_ids))],
+      'venue_id': venue_ids[min(int(rng.paretovariate(1.2)) - 1, len(venue_ids) - 1)
+                            if rng.random() < 0.2 else rng.randrange(len(venue_ids))],
+      'is_past': start_time <= now,
+    }
+
+
+def write(engine, metadata, table, rows, batch_size, echo):
+  from importer import BulkImporter
+  importer = BulkImporter(engine, metadata, table, batch_size=batch_size, echo=echo)
+  started = time.monotonic()
+  written = 0
+  batch = []
+  for row in rows:
+    batch.append(row)
+    if len(batch) >= batch_size:
+      with engine.begin() as connection:
+        importer.insert(connection, batch)
+      written += len(batch)
+      batch = []
+      echo('%s: %d rows, %.0f rows/s' % (table, written, written / max(time.monotonic() - started, 1e-6)))
+  if batch:
+    with engine.begin() as connection:
+      importer.insert(connection, batch)
+    written += len(batch)
+  echo('%s: %d rows in %.1fs' % (table, written, time.monotonic() - started))
+
+
+def seed(db, sizes, seed=0, batch_size=5000, echo=print):
+  """Fill an empty catalog. Returns the seed time the shows are spread
+  around, as shows before it are past."""
+  engine, metadata = db.engine, db.metadata
+  db.create_all()
+  if engine.execute(metadata.tables['venues'].count()).scalar():
+    raise SystemExit('the database already has venues, seed an empty one')
+  rng = random.Random(seed)
+  states = choices('state')
+  genres = choices('genres')
+  cities = [('City %d' % number, rng.choice(states)) for number in range(1, sizes['cities'] + 1)]
+  points = city_points(seed, len(cities))
+  now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+  write(engine, metadata, 'venues', owner_rows(rng, 'venues', sizes['venues'], cities, genres, points), batch_size, echo)
+  write(engine, metadata, 'artists', owner_rows(rng, 'artists', sizes['artists'], cities, genres, points), batch_size, echo)
+  ids = {}
+  for table in ('venues', 'artists'):
+    column = metadata.tables[table].c.id
+    ids[table] = [row.id for row in engine.execute(select([column]).order_by(column))]
+  write(engine, metadata, 'shows', show_rows(rng, sizes['shows'], ids['artists'], ids['venues'], now),
+        batch_size, echo)
+  return now
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Seed a synthetic Fyyur catalog.')
+  parser.add_argument('--database-url', help='Defaults to DATABASE_URL / config.py.')
+  parser.add_argument('--scale', type=float, default=1.0, help='Multiplies every default size.')
+  parser.add_argument('--artists', type=int)
+  parser.add_argument('--venues', type=int)
+  parser.add_argument('--cities', type=int)
+  parser.add_argument('--shows', type=int)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--batch-size', type=int, default=5000)
+  args = parser.parse_args()
+  if args.database_url:
+    os.environ['DATABASE_URL'] = args.database_url
+
+  import app
+  sizes = sizes_for(args.scale, artists=args.artists, venues=args.venues,
+                    cities=args.cities, shows=args.shows)
+  with app.app.app_context():
+    print('seeding %s with %s' % (app.db.engine.url, sizes))
+    seed(app.db, sizes, seed=args.seed, batch_size=args.batch_size)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,115 @@
+#----------------------------------------------------------------------------#
+# Cache.
+#
+# Small key/value cache used for the venue and artist detail pages. Entries
+# are written on read and deleted by the routes that change the underlying
+# rows. Two backends share one interface: an in-process LRU with per-entry
+# expiry, and a Redis-compatible server for deployments with several
+# worker processes.
+#----------------------------------------------------------------------------#
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+  """In-process cache holding at most ``maxsize`` entries, each for at
+  most ``ttl`` seconds."""
+
+  def __init__(self, maxsize=1024, ttl=300):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None and entry[0] > time.monotonic():
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+      if entry is not None:
+        del self._entries[key]
+      self.misses += 1
+      return None
+
+  def set(self, key, value, ttl=None):
+    expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+    with self._lock:
+      self._entries[key] = (expires, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+
+  def delete(self, *keys):
+    with self._lock:
+      for key in keys:
+        self._entries.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self):
+    return {
+      'backend': 'memory',
+      'hits': self.hits,
+      'misses': self.misses,
+      'evictions': self.evictions,
+      'size': len(self._entries),
+      'maxsize': self.maxsize,
+    }
+
+
+class RedisCache(object):
+  """Cache kept in a Redis-compatible server, shared by every worker.
+  Hit/miss counters are per process."""
+
+  def __init__(self, url, ttl=300, prefix='fyyur:'):
+    # Optional dependency, only needed when CACHE_BACKEND is 'redis'
+    import redis
+    self._client = redis.Redis.from_url(url)
+    self.ttl = ttl
+    self.prefix = prefix
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key):
+    raw = self._client.get(self.prefix + key)
+    if raw is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    return pickle.loads(raw)
+
+  def set(self, key, value, ttl=None):
+    ttl = self.ttl if ttl is None else ttl
+    self._client.set(self.prefix + key, pickle.dumps(value), ex=max(int(ttl), 1))
+
+  def delete(self, *keys):
+    if keys:
+      self._client.delete(*[self.prefix + key for key in keys])
+
+  def clear(self):
+    for key in self._client.scan_iter(match=self.prefix + '*'):
+      self._client.delete(key)
+
+  def stats(self):
+    return {
+      'backend': 'redis',
+      'hits': self.hits,
+      'misses': self.misses,
+    }
+
+
+def make_cache(config, prefix='CACHE_', key_prefix='fyyur:'):
+  # prefix picks the settings, e.g. FRAGMENT_CACHE_BACKEND for 'FRAGMENT_CACHE_'
+  if config.get(prefix + 'BACKEND') == 'redis':
+    return RedisCache(config[prefix + 'REDIS_URL'], ttl=config[prefix + 'TTL'], prefix=key_prefix)
+  return LRUCache(maxsize=config[prefix + 'MAXSIZE'], ttl=config[prefix + 'TTL'])
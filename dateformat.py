@@ -0,0 +1,70 @@
+#----------------------------------------------------------------------------#
+# Date formatting.
+#
+# Backs the `datetime` template filter, which runs once per show tile.
+# babel.dates.format_datetime looks the locale up again on every call; the
+# formatter here keeps one Locale object and one parsed pattern per
+# (format, locale) pair, and remembers its most recent results, since a
+# page lists the same start times over and over.
+#----------------------------------------------------------------------------#
+import threading
+from functools import lru_cache
+
+import babel.dates
+import dateutil.parser
+from babel import Locale
+
+# Named formats used by the templates
+FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+# Babel's own named formats, which depend on the locale's date and time
+# formats rather than on a single pattern
+BABEL_FORMATS = ('long', 'short')
+
+
+class DateFormatter(object):
+  """Formats datetimes (or date strings) like babel.dates.format_datetime.
+
+  Results are memoized in an LRU of ``memo_size`` entries; 0 turns the
+  memo off."""
+
+  def __init__(self, locale=babel.dates.LC_TIME, memo_size=4096):
+    self.default_locale = locale
+    self._locales = {}
+    self._patterns = {}
+    self._lock = threading.Lock()
+    if memo_size:
+      self.format = lru_cache(maxsize=memo_size)(self.format)
+
+  def __call__(self, value, format='medium', locale=None):
+    return self.format(value, format, locale or self.default_locale)
+
+  def locale(self, identifier):
+    locale = self._locales.get(identifier)
+    if locale is None:
+      with self._lock:
+        locale = self._locales[identifier] = Locale.parse(identifier)
+    return locale
+
+  def pattern(self, format, locale):
+    key = (format, locale)
+    pattern = self._patterns.get(key)
+    if pattern is None:
+      with self._lock:
+        pattern = self._patterns[key] = babel.dates.parse_pattern(FORMATS.get(format, format))
+    return pattern
+
+  def format(self, value, format, locale):
+    if isinstance(value, str):
+      value = dateutil.parser.parse(value)
+    if format in BABEL_FORMATS:
+      return babel.dates.format_datetime(value, format, locale=self.locale(locale))
+    if value.tzinfo is None:
+      value = value.replace(tzinfo=babel.dates.UTC)
+    return self.pattern(format, locale).apply(value, self.locale(locale))
+
+  def cache_info(self):
+    return self.format.cache_info() if hasattr(self.format, 'cache_info') else None
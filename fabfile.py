@@ -7,12 +7,20 @@ from fabric.contrib.console import confirm
 def test():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m pytest -q tests", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def bench(database_url='sqlite:////tmp/fyyur-bench.db', scale='0.01'):
+    # Seed a synthetic catalog (once) and load test every route; results
+    # land in benchmarks/results/ for `python -m benchmarks.compare`
+    with settings(warn_only=True):
+        local("python -m benchmarks.seed --database-url {} --scale {}".format(database_url, scale))
+    local("python -m benchmarks.loadtest --database-url {} --writes".format(database_url))
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -1,14 +1,17 @@
 from datetime import datetime
 from flask_wtf import FlaskForm as Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, HiddenField
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, HiddenField, \
+  IntegerField
 from wtforms.validators import DataRequired, AnyOf, URL
 
 class ShowForm(Form):
-    artist_id = StringField(
-        'artist_id'
+    # filled in by the name pickers on the form; that the ids exist is
+    # checked by create_show_submission
+    artist_id = IntegerField(
+        'artist_id', validators=[DataRequired()]
     )
-    venue_id = StringField(
-        'venue_id'
+    venue_id = IntegerField(
+        'venue_id', validators=[DataRequired()]
     )
     start_time = DateTimeField(
         'start_time',
@@ -0,0 +1,116 @@
+#----------------------------------------------------------------------------#
+# Fragment cache.
+#
+# A `{% cache key, ttl %}...{% endcache %}` template tag that stores the
+# rendered HTML of its body in a cache.py store, used for the show tiles
+# and venue list items that listing and detail pages repeat unchanged from
+# one request to the next. Keys come from fragment_key(), which stamps each
+# venue/artist/show id with the updated_at of its row. Whatever process
+# makes a write also moves updated_at, so stale fragments are simply never
+# read again and age out of the store, even in a per-process memory store.
+# Hits and misses are logged every log_interval seconds.
+#----------------------------------------------------------------------------#
+import threading
+import time
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+
+class FragmentCacheExtension(Extension):
+  """Adds the `{% cache key[, ttl] %}` tag. Without a fragment cache on
+  the environment the body is rendered every time."""
+
+  tags = {'cache'}
+
+  def __init__(self, environment):
+    super(FragmentCacheExtension, self).__init__(environment)
+    environment.extend(fragment_cache=None)
+
+  def parse(self, parser):
+    lineno = next(parser.stream).lineno
+    # Keys are namespaced by the tag's place in the templates, so the same
+    # entity can have fragments in several of them
+    args = [nodes.Const('%s:%d' % (parser.name, lineno)), parser.parse_expression()]
+    if parser.stream.skip_if('comma'):
+      args.append(parser.parse_expression())
+    else:
+      args.append(nodes.Const(None))
+    body = parser.parse_statements(['name:endcache'], drop_needle=True)
+    return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+  def _render(self, block, key, ttl, caller):
+    fragments = self.environment.fragment_cache
+    if fragments is None:
+      return caller()
+    return fragments.fetch('%s/%s' % (block, key), ttl, caller)
+
+
+class Fragments(object):
+
+  def __init__(self, store, logger, log_interval=60):
+    self.store = store
+    self.logger = logger
+    self.log_interval = log_interval
+    self._lock = threading.Lock()
+    self._last_log = time.monotonic()
+    self.hits = 0
+    self.misses = 0
+
+  def init_app(self, app, enabled=True):
+    # Disabled, the tag is still understood but always renders its body
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = self if enabled else None
+    app.jinja_env.globals['fragment_key'] = self.key
+
+  #  Keys
+  #  ----------------------------------------------------------------
+
+  def key(self, kind, id, updated_at, *values):
+    """Key of a fragment showing entity ``kind`` ``id`` as of its
+    ``updated_at``, and any other ``values`` it depends on, such as the
+    updated_at of the other entities it shows or a count."""
+    return '/'.join(['%s:%s@%s' % (kind, id, updated_at)] + [str(value) for value in values])
+
+  def clear(self):
+    self.store.clear()
+
+  #  Rendering
+  #  ----------------------------------------------------------------
+
+  def fetch(self, key, ttl, render):
+    key = 'fragment:' + key
+    html = self.store.get(key)
+    hit = html is not None
+    if not hit:
+      html = render()
+      self.store.set(key, str(html), ttl=ttl)
+    self.record(hit)
+    return Markup(html)
+
+  def record(self, hit):
+    with self._lock:
+      if hit:
+        self.hits += 1
+      else:
+        self.misses += 1
+      due = time.monotonic() - self._last_log >= self.log_interval
+      if due:
+        self._last_log = time.monotonic()
+    if due:
+      self.logger.info('fragment cache: %s', self.summary())
+
+  def stats(self):
+    with self._lock:
+      total = self.hits + self.misses
+      return {
+        'hits': self.hits,
+        'misses': self.misses,
+        'hit_rate': self.hits / total if total else 0.0,
+        'store': self.store.stats(),
+      }
+
+  def summary(self):
+    data = self.stats()
+    return '%d hits, %d misses (%.0f%% hit rate)' % (data['hits'], data['misses'], data['hit_rate'] * 100)
@@ -0,0 +1,129 @@
+#----------------------------------------------------------------------------#
+# Geography.
+#
+# Venues are placed offline, at the centroid of their city as listed in
+# data/city_centroids.csv (see Gazetteer). For the nearby search each venue
+# also stores an integer geohash: its longitude and latitude quantized to
+# BITS bits each and interleaved, longitude first, as in a geohash string.
+# All the points of a geohash cell then share a prefix of that integer, so
+# a cell is one contiguous range of it, and a plain B-tree index answers
+# "venues in these cells" with one range scan per cell on SQLite and
+# Postgres alike. cell_ranges() covers the bounding box of a search circle
+# with at most MAX_CELLS cells; the few venues found there are then
+# filtered and sorted by great-circle distance.
+#----------------------------------------------------------------------------#
+import csv
+import math
+import os
+import threading
+
+# Bits per axis, about 0.6 m of longitude at the equator
+BITS = 26
+MAX_CELLS = 16
+EARTH_RADIUS_KM = 6371.0088
+
+CENTROIDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'city_centroids.csv')
+
+
+def quantize(value, low, high):
+  cell = int((value - low) / (high - low) * (1 << BITS))
+  return min(max(cell, 0), (1 << BITS) - 1)
+
+
+def interleave(x, y):
+  code = 0
+  for bit in range(BITS - 1, -1, -1):
+    code = (code << 2) | ((x >> bit) & 1) << 1 | ((y >> bit) & 1)
+  return code
+
+
+def geohash(latitude, longitude):
+  """Integer geohash of a point, 2 * BITS bits long."""
+  return interleave(quantize(longitude, -180.0, 180.0), quantize(latitude, -90.0, 90.0))
+
+
+def distance_km(latitude1, longitude1, latitude2, longitude2):
+  # Haversine, on a spherical Earth
+  phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+  a = math.sin((phi2 - phi1) / 2) ** 2 + \
+      math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(longitude2 - longitude1) / 2) ** 2
+  return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_boxes(latitude, longitude, radius_km):
+  # (south, west, north, east) boxes around the circle, split in two where
+  # it crosses the antimeridian
+  angle = radius_km / EARTH_RADIUS_KM
+  south = max(latitude - math.degrees(angle), -90.0)
+  north = min(latitude + math.degrees(angle), 90.0)
+  spread = math.sin(angle) / max(math.cos(math.radians(latitude)), 1e-12)
+  if south == -90.0 or north == 90.0 or spread >= 1.0:
+    return [(south, -180.0, north, 180.0)]
+  west = longitude - math.degrees(math.asin(spread))
+  east = longitude + math.degrees(math.asin(spread))
+  if west < -180.0:
+    return [(south, west + 360.0, north, 180.0), (south, -180.0, north, east)]
+  if east > 180.0:
+    return [(south, west, north, 180.0), (south, -180.0, north, east - 360.0)]
+  return [(south, west, north, east)]
+
+
+def cell_ranges(latitude, longitude, radius_km):
+  """Inclusive (low, high) geohash ranges of the cells covering the circle
+  around a point, adjacent ranges merged."""
+  boxes = [(quantize(west, -180.0, 180.0), quantize(south, -90.0, 90.0),
+            quantize(east, -180.0, 180.0), quantize(north, -90.0, 90.0))
+           for south, west, north, east in bounding_boxes(latitude, longitude, radius_km)]
+  # The smallest cells that keep the cover within MAX_CELLS
+  for shift in range(BITS + 1):
+    cells = sum(((x1 >> shift) - (x0 >> shift) + 1) * ((y1 >> shift) - (y0 >> shift) + 1)
+                for x0, y0, x1, y1 in boxes)
+    if cells <= MAX_CELLS:
+      break
+
+  size = 1 << (2 * shift)
+  lows = sorted({interleave(x, y) * size
+                 for x0, y0, x1, y1 in boxes
+                 for x in range(x0 >> shift, (x1 >> shift) + 1)
+                 for y in range(y0 >> shift, (y1 >> shift) + 1)})
+  ranges = []
+  for low in lows:
+    if ranges and ranges[-1][1] + 1 == low:
+      ranges[-1][1] = low + size - 1
+    else:
+      ranges.append([low, low + size - 1])
+  return [tuple(bounds) for bounds in ranges]
+
+
+def normalize_city(city):
+  # "St. Louis", "st louis" and "Saint Louis" are the same city
+  words = city.replace('.', ' ').lower().split()
+  if words and words[0] == 'saint':
+    words[0] = 'st'
+  return ' '.join(words)
+
+
+class Gazetteer(object):
+  """City centroids, read from ``path`` on first use."""
+
+  def __init__(self, path=CENTROIDS):
+    self.path = path
+    self._lock = threading.Lock()
+    self._places = None
+
+  @property
+  def places(self):
+    if self._places is None:
+      with self._lock:
+        if self._places is None:
+          with open(self.path, newline='', encoding='utf-8') as f:
+            self._places = {(normalize_city(row['city']), row['state'].upper()):
+                            (float(row['latitude']), float(row['longitude']))
+                            for row in csv.DictReader(f)}
+    return self._places
+
+  def locate(self, city, state):
+    """(latitude, longitude) of a city, or None if it is not listed."""
+    if not city or not state:
+      return None
+    return self.places.get((normalize_city(city), state.upper()))
@@ -0,0 +1,411 @@
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+# Streams venues, artists or shows from a CSV or JSON Lines file into the
+# database in batches. Each batch is one transaction: rows go in with COPY
+# on Postgres and executemany elsewhere (a venue or artist at a time, to
+# read back the id the database assigned), and the foreign keys of a batch
+# (show -> artist/venue, venue/artist -> genres) are resolved with one query
+# per referenced table. Records that cannot be imported (malformed lines,
+# missing required fields, unknown references) are reported and skipped.
+# After every committed batch the number of records consumed is written to
+# a checkpoint file next to the input, so a run that stops on a failed
+# batch picks up from that batch when started again. Imported shows are
+# added to their venue's and artist's show counters in the same
+# transaction.
+#----------------------------------------------------------------------------#
+import csv
+import io
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import dateutil.parser
+from sqlalchemy import bindparam, select
+
+TABLES = ('venues', 'artists', 'shows')
+
+COLUMNS = {
+  'venues': ['name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+             'website', 'seeking_talent', 'seeking_description'],
+  'artists': ['name', 'city', 'state', 'phone', 'image_link', 'facebook_link',
+              'website', 'seeking_venue', 'seeking_description'],
+  'shows': ['start_time', 'artist_id', 'venue_id'],
+}
+
+# Owner tables whose rows carry a genres list, and their association table
+GENRE_LINKS = {
+  'venues': ('venue_genres', 'venue_id'),
+  'artists': ('artist_genres', 'artist_id'),
+}
+
+BOOLEAN_COLUMNS = ('seeking_talent', 'seeking_venue')
+
+# Columns a record is rejected without (shows need start_time and their keys)
+REQUIRED_COLUMNS = {
+  'venues': ('name', 'city', 'state'),
+  'artists': ('name', 'city', 'state'),
+}
+
+
+class RejectedRow(ValueError):
+  pass
+
+
+def read_records(path, format=None):
+  # Yields (line number, record dict) without loading the file; a JSON
+  # line that is not an object comes as a RejectedRow instead of a dict
+  format = format or ('jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv')
+  with open(path, newline='', encoding='utf-8') as f:
+    if format == 'csv':
+      reader = csv.DictReader(f)
+      for record in reader:
+        yield reader.line_num, record
+    else:
+      for number, line in enumerate(f, 1):
+        if line.strip():
+          yield number, parse_json_record(line)
+
+
+def parse_json_record(line):
+  try:
+    record = json.loads(line)
+  except ValueError as e:
+    return RejectedRow('malformed JSON: %s' % e)
+  if not isinstance(record, dict):
+    return RejectedRow('not a JSON object')
+  return record
+
+
+def show_key(record, key):
+  # ('id', int) or ('name', str) for the artist or venue a show record
+  # names; RejectedRow for one it does not name properly
+  id, name = record.get(key + '_id'), record.get(key + '_name')
+  if id not in (None, ''):
+    if isinstance(id, bool) or not isinstance(id, (int, str)):
+      raise RejectedRow('%s_id %r is not an id' % (key, id))
+    try:
+      return 'id', int(id)
+    except ValueError:
+      raise RejectedRow('%s_id %r is not an id' % (key, id))
+  if name not in (None, ''):
+    if not isinstance(name, str):
+      raise RejectedRow('%s_name %r is not a name' % (key, name))
+    return 'name', name
+  raise RejectedRow('missing %s_id or %s_name' % (key, key))
+
+
+def parse_bool(value):
+  if isinstance(value, bool) or value is None:
+    return value
+  return str(value).strip().lower() in ('1', 't', 'true', 'y', 'yes')
+
+
+def parse_genres(value):
+  # Accepts a JSON list, "Jazz;Rock n Roll", "Jazz,Blues" or "{Jazz,Blues}"
+  if not value:
+    return []
+  if isinstance(value, list):
+    names = value
+  else:
+    value = value.strip().strip('{}')
+    names = value.split(';') if ';' in value else next(csv.reader([value]))
+  return [name.strip() for name in names if name and name.strip()]
+
+
+class BulkImporter(object):
+
+  def __init__(self, engine, metadata, table, batch_size=5000, echo=print):
+    if table not in TABLES:
+      raise ValueError('cannot import into %r, expected one of %s' % (table, ', '.join(TABLES)))
+    self.engine = engine
+    self.metadata = metadata
+    self.table = metadata.tables[table]
+    self.columns = COLUMNS[table]
+    self.batch_size = batch_size
+    self.echo = echo
+    self.use_copy = engine.dialect.name == 'postgresql'
+    self.imported = 0
+    self.rejected = 0
+    # Same clock as the Show mapper events, which store naive UTC
+    self.now = datetime.utcnow()
+
+  #  Checkpoints
+  #  ----------------------------------------------------------------
+
+  @staticmethod
+  def checkpoint_path(path):
+    return path + '.import-checkpoint'
+
+  def load_checkpoint(self, path):
+    try:
+      with open(self.checkpoint_path(path)) as f:
+        checkpoint = json.load(f)
+    except (IOError, ValueError):
+      return 0
+    if checkpoint.get('table') != self.table.name:
+      return 0
+    return checkpoint.get('records', 0)
+
+  def save_checkpoint(self, path, records):
+    tmp = self.checkpoint_path(path) + '.tmp'
+    with open(tmp, 'w') as f:
+      json.dump({'table': self.table.name, 'records': records}, f)
+    os.replace(tmp, self.checkpoint_path(path))
+
+  #  Running
+  #  ----------------------------------------------------------------
+
+  def run(self, path, format=None, resume=True):
+    """Import every record of ``path``. Returns the number of rows written.
+
+    With ``resume`` the records committed by an earlier run of the same
+    file are skipped."""
+    skip = self.load_checkpoint(path) if resume else 0
+    if skip:
+      self.echo('resuming %s after %d records' % (path, skip))
+    consumed = skip
+    started = time.monotonic()
+    batch = []
+    for number, record in read_records(path, format):
+      if skip:
+        skip -= 1
+        continue
+      batch.append((number, record))
+      if len(batch) >= self.batch_size:
+        consumed = self.commit_batch(path, batch, consumed, started)
+        batch = []
+    if batch:
+      consumed = self.commit_batch(path, batch, consumed, started)
+    if os.path.exists(self.checkpoint_path(path)):
+      os.remove(self.checkpoint_path(path))
+    return self.imported
+
+  def commit_batch(self, path, batch, consumed, started):
+    first, last = batch[0][0], batch[-1][0]
+    try:
+      with self.engine.begin() as connection:
+        rows = self.prepare(connection, batch)
+        self.insert(connection, rows)
+    except Exception as e:
+      raise RuntimeError('batch at records %d-%d of %s failed, nothing from it was kept '
+                         '(rerun to resume from it): %s'
+                         % (consumed + 1, consumed + len(batch), path, e))
+    consumed += len(batch)
+    self.imported += len(rows)
+    self.save_checkpoint(path, consumed)
+    elapsed = max(time.monotonic() - started, 1e-6)
+    self.echo('%s: %d records read, %d imported, %d rejected, %.0f rows/s'
+              % (self.table.name, consumed, self.imported, self.rejected, self.imported / elapsed))
+    return consumed
+
+  #  Preparing rows
+  #  ----------------------------------------------------------------
+
+  def prepare(self, connection, batch):
+    readable = []
+    for number, record in batch:
+      if isinstance(record, RejectedRow):
+        self.reject(number, record)
+      else:
+        readable.append((number, record))
+    batch = readable
+    if self.table.name == 'shows':
+      batch = self.resolve_show_keys(connection, batch)
+    rows = []
+    for number, record in batch:
+      try:
+        rows.append(self.convert(record))
+      except (RejectedRow, TypeError, ValueError, OverflowError) as e:
+        self.reject(number, e)
+    return rows
+
+  def convert(self, record):
+    row = {}
+    for column in self.columns:
+      value = record.get(column)
+      if value == '':
+        value = None
+      if value is None and column in REQUIRED_COLUMNS.get(self.table.name, ()):
+        raise RejectedRow('missing %s' % column)
+      if isinstance(value, (dict, list)):
+        raise RejectedRow('%s is not a single value' % column)
+      if column in BOOLEAN_COLUMNS:
+        value = parse_bool(value)
+      elif column == 'start_time':
+        if value is None:
+          raise RejectedRow('missing start_time')
+        if isinstance(value, str):
+          value = dateutil.parser.parse(value)
+        elif not isinstance(value, datetime):
+          raise RejectedRow('start_time %r is not a date and time' % (value,))
+        if value.tzinfo is not None:
+          # Stored as naive UTC, like the timestamps the app writes
+          value = value.astimezone(timezone.utc).replace(tzinfo=None)
+      row[column] = value
+    if self.table.name in GENRE_LINKS:
+      row['genres'] = parse_genres(record.get('genres'))
+    if self.table.name == 'shows':
+      row['is_past'] = row['start_time'] <= self.now
+    return row
+
+  def reject(self, number, reason):
+    self.rejected += 1
+    self.echo('rejected record at line %s: %s' % (number, reason))
+
+  def resolve_show_keys(self, connection, batch):
+    # Shows name their artist and venue by *_id or by exact *_name;
+    # every reference in the batch is checked with one query per table
+    parsed = []
+    for number, record in batch:
+      try:
+        parsed.append((number, {key: show_key(record, key) for key in ('artist', 'venue')}, record))
+      except RejectedRow as e:
+        self.reject(number, e)
+
+    lookups = {}
+    for owner, key in (('artists', 'artist'), ('venues', 'venue')):
+      table = self.metadata.tables[owner]
+      ids = {keys[key][1] for _, keys, _ in parsed if keys[key][0] == 'id'}
+      names = {keys[key][1] for _, keys, _ in parsed if keys[key][0] == 'name'}
+      found_ids = set()
+      if ids:
+        found_ids = {row.id for row in connection.execute(
+          select([table.c.id]).where(table.c.id.in_(ids)))}
+      by_name = {}
+      if names:
+        for row in connection.execute(select([table.c.name, table.c.id]).where(table.c.name.in_(names))):
+          by_name.setdefault(row.name, []).append(row.id)
+      lookups[key] = (found_ids, by_name)
+
+    resolved = []
+    for number, keys, record in parsed:
+      record = dict(record)
+      try:
+        for key in ('artist', 'venue'):
+          found_ids, by_name = lookups[key]
+          kind, value = keys[key]
+          if kind == 'id':
+            if value not in found_ids:
+              raise RejectedRow('no %s with id %s' % (key, value))
+            record[key + '_id'] = value
+          else:
+            matches = by_name.get(value, [])
+            if len(matches) != 1:
+              raise RejectedRow('%s name %r matches %d rows' % (key, value, len(matches)))
+            record[key + '_id'] = matches[0]
+      except RejectedRow as e:
+        self.reject(number, e)
+        continue
+      resolved.append((number, record))
+    return resolved
+
+  #  Writing rows
+  #  ----------------------------------------------------------------
+
+  def insert(self, connection, rows):
+    if not rows:
+      return
+    genres = [row.pop('genres') for row in rows] if self.table.name in GENRE_LINKS else None
+    # Set here rather than left to the column defaults, which COPY skips
+    now = datetime.utcnow()
+    for row in rows:
+      row['updated_at'] = now
+    if self.use_copy:
+      if genres is not None:
+        # Owner ids are drawn up front so the genre links can be written
+        # without reading the new rows back
+        for row, id in zip(rows, self.allocate_ids(connection, len(rows))):
+          row['id'] = id
+      self.copy(connection, self.table.name, list(rows[0]), rows)
+    elif genres is not None:
+      # The genre links need the ids the database gives the rows, and an
+      # executemany reports none (the DBAPI's lastrowid is the last row's
+      # at best; working the others back from it would assume the ids are
+      # consecutive, which other writers and deleted rows break). So the
+      # rows with genres are inserted one at a time to read their ids
+      # back, and only the rest in one executemany
+      insert = self.table.insert()
+      unlinked = []
+      for row, owner_genres in zip(rows, genres):
+        if owner_genres:
+          row['id'] = connection.execute(insert, row).inserted_primary_key[0]
+        else:
+          unlinked.append(row)
+      if unlinked:
+        connection.execute(insert, unlinked)
+    else:
+      connection.execute(self.table.insert(), rows)
+    if genres is not None:
+      self.link_genres(connection, [(row['id'], owner_genres)
+                                    for row, owner_genres in zip(rows, genres) if owner_genres])
+    if self.table.name == 'shows':
+      self.count_shows(connection, rows)
+
+  def allocate_ids(self, connection, count):
+    # From the table's sequence, so no other writer can get the same ids
+    return [row[0] for row in connection.execute(
+      "SELECT nextval(pg_get_serial_sequence('%s', 'id')) FROM generate_series(1, %d)"
+      % (self.table.name, count))]
+
+  def copy(self, connection, table, columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+      writer.writerow([self.copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+      cursor.copy_expert('COPY %s (%s) FROM STDIN WITH (FORMAT csv)'
+                         % (table, ', '.join(columns)), buffer)
+    finally:
+      cursor.close()
+
+  @staticmethod
+  def copy_value(value):
+    # An unquoted empty CSV field is NULL to COPY
+    if value is None:
+      return ''
+    if isinstance(value, bool):
+      return 'true' if value else 'false'
+    if isinstance(value, datetime):
+      return value.isoformat()
+    return value
+
+  def count_shows(self, connection, rows):
+    # Bulk inserts bypass the Show mapper events, so the venue and artist
+    # counters (and updated_at) are bumped here with one executemany per
+    # owner table
+    now = rows[0]['updated_at']
+    for owner, fk in (('venues', 'venue_id'), ('artists', 'artist_id')):
+      table = self.metadata.tables[owner]
+      counts = Counter((row[fk], row['is_past']) for row in rows)
+      for is_past, column in ((False, 'upcoming_shows_count'), (True, 'past_shows_count')):
+        params = [{'owner_id': owner_id, 'added': count}
+                  for (owner_id, past), count in counts.items() if past == is_past]
+        if params:
+          connection.execute(table.update().where(table.c.id == bindparam('owner_id'))
+                             .values({column: table.c[column] + bindparam('added'),
+                                      'updated_at': now}), params)
+
+  def link_genres(self, connection, links):
+    # links: (owner id, genre names) pairs
+    link_name, fk = GENRE_LINKS[self.table.name]
+    genre_table = self.metadata.tables['genres']
+    link_table = self.metadata.tables[link_name]
+    names = {name for _, owner_genres in links for name in owner_genres}
+    if not names:
+      return
+    genre_ids = dict(connection.execute(
+      select([genre_table.c.name, genre_table.c.id]).where(genre_table.c.name.in_(names))).fetchall())
+    missing = sorted(names - set(genre_ids))
+    if missing:
+      connection.execute(genre_table.insert(), [{'name': name} for name in missing])
+      genre_ids.update(connection.execute(
+        select([genre_table.c.name, genre_table.c.id]).where(genre_table.c.name.in_(missing))).fetchall())
+    connection.execute(link_table.insert(), [
+      {fk: owner_id, 'genre_id': genre_ids[name]}
+      for owner_id, owner_genres in links
+      for name in dict.fromkeys(owner_genres)])
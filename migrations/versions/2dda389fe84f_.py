@@ -0,0 +1,62 @@
+"""add search indexes for venues and artists
+
+Revision ID: 2dda389fe84f
+Revises: 4e770b7c25dd
+Create Date: 2026-10-18 10:27:05.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2dda389fe84f'
+down_revision = '4e770b7c25dd'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['venues', 'artists']
+COLUMNS = ['name', 'city', 'state']
+
+
+def upgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with op.get_context().autocommit_block():
+            for table in TABLES:
+                for column in COLUMNS:
+                    op.execute(
+                        'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{0}_{1}_trgm '
+                        'ON {0} USING gin ({1} gin_trgm_ops)'.format(table, column))
+    elif op.get_context().dialect.name == 'sqlite':
+        for table in TABLES:
+            op.execute(
+                "CREATE VIRTUAL TABLE {0}_search USING fts5(name, city, state, "
+                "content='{0}', content_rowid='id', tokenize='trigram')".format(table))
+            delete_old = ("INSERT INTO {0}_search({0}_search, rowid, name, city, state) "
+                          "VALUES ('delete', old.id, old.name, old.city, old.state);").format(table)
+            insert_new = ("INSERT INTO {0}_search(rowid, name, city, state) "
+                          "VALUES (new.id, new.name, new.city, new.state);").format(table)
+            op.execute('CREATE TRIGGER {0}_search_ai AFTER INSERT ON {0} BEGIN {1} END'
+                       .format(table, insert_new))
+            op.execute('CREATE TRIGGER {0}_search_ad AFTER DELETE ON {0} BEGIN {1} END'
+                       .format(table, delete_old))
+            op.execute('CREATE TRIGGER {0}_search_au AFTER UPDATE OF name, city, state ON {0} '
+                       'BEGIN {1} {2} END'.format(table, delete_old, insert_new))
+            op.execute("INSERT INTO {0}_search({0}_search) VALUES ('rebuild')".format(table))
+
+
+def downgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for table in TABLES:
+                for column in COLUMNS:
+                    op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_{0}_{1}_trgm'
+                               .format(table, column))
+    elif op.get_context().dialect.name == 'sqlite':
+        for table in TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute('DROP TRIGGER IF EXISTS {0}_search_{1}'.format(table, suffix))
+            op.execute('DROP TABLE IF EXISTS {0}_search'.format(table))
@@ -0,0 +1,124 @@
+"""optionally range partition shows by start_time month (Postgres)
+
+Revision ID: 3c8f1e2b7d95
+Revises: 9b3e5d7a1c42
+Create Date: 2026-10-18 15:21:44.106318
+
+Opt-in: only runs on Postgres (11 or later) with `flask db upgrade -x partition_shows=true`.
+Without the flag the revision is recorded and changes nothing. The table
+is rewritten under an exclusive lock, so plan for downtime on a large
+shows table. See partitions.py for the layout and the commands that
+maintain it.
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8f1e2b7d95'
+down_revision = '9b3e5d7a1c42'
+branch_labels = None
+depends_on = None
+
+
+# Months after the current one that get a partition up front
+MONTHS_AHEAD = 3
+
+# Indexes of the Show model, recreated on the new table
+INDEXES = '''
+CREATE INDEX ix_shows_venue_id_start_time ON shows (venue_id, start_time);
+CREATE INDEX ix_shows_artist_id_start_time ON shows (artist_id, start_time);
+CREATE INDEX ix_shows_start_time_id ON shows (start_time, id);
+CREATE INDEX ix_shows_start_time_not_past ON shows (start_time) WHERE NOT is_past;
+'''
+
+UPGRADE = '''
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM shows WHERE start_time IS NULL) THEN
+        RAISE EXCEPTION 'shows without a start_time cannot be partitioned, fix or delete them first';
+    END IF;
+END $$;
+
+ALTER TABLE shows RENAME TO shows_unpartitioned;
+ALTER INDEX shows_pkey RENAME TO shows_unpartitioned_pkey;
+DROP INDEX ix_shows_venue_id_start_time, ix_shows_artist_id_start_time,
+    ix_shows_start_time_id, ix_shows_start_time_not_past;
+
+-- The partition key has to be part of the primary key; ids still come
+-- from the one sequence, so they stay unique
+CREATE TABLE shows (
+    id integer NOT NULL DEFAULT nextval('shows_id_seq'),
+    start_time timestamp without time zone NOT NULL,
+    artist_id integer NOT NULL REFERENCES artists (id),
+    venue_id integer NOT NULL REFERENCES venues (id),
+    is_past boolean NOT NULL DEFAULT false,
+    CONSTRAINT shows_pkey PRIMARY KEY (id, start_time)
+) PARTITION BY RANGE (start_time);
+CREATE TABLE shows_default PARTITION OF shows DEFAULT;
+
+-- A partition for every month that has shows, and for the months ahead
+DO $$
+DECLARE
+    first_day date;
+BEGIN
+    FOR first_day IN
+        SELECT date_trunc('month', start_time)::date FROM shows_unpartitioned
+        UNION
+        SELECT (date_trunc('month', now() AT TIME ZONE 'utc') + n * interval '1 month')::date
+        FROM generate_series(0, {months_ahead}) n
+    LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF shows FOR VALUES FROM (%L) TO (%L)',
+                       'shows_y' || to_char(first_day, 'YYYY"m"MM'), first_day,
+                       (first_day + interval '1 month')::date);
+    END LOOP;
+END $$;
+
+INSERT INTO shows (id, start_time, artist_id, venue_id, is_past)
+    SELECT id, start_time, artist_id, venue_id, is_past FROM shows_unpartitioned;
+ALTER SEQUENCE shows_id_seq OWNED BY shows.id;
+DROP TABLE shows_unpartitioned;
+'''.format(months_ahead=MONTHS_AHEAD) + INDEXES
+
+# Runs only if shows is partitioned, so it needs no flag. Archived
+# partitions are not brought back.
+DOWNGRADE = '''
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'shows'::regclass) = 'p' THEN
+        ALTER TABLE shows RENAME TO shows_partitioned;
+        ALTER INDEX shows_pkey RENAME TO shows_partitioned_pkey;
+        DROP INDEX ix_shows_venue_id_start_time, ix_shows_artist_id_start_time,
+            ix_shows_start_time_id, ix_shows_start_time_not_past;
+        CREATE TABLE shows (
+            id integer NOT NULL DEFAULT nextval('shows_id_seq'),
+            start_time timestamp without time zone,
+            artist_id integer NOT NULL REFERENCES artists (id),
+            venue_id integer NOT NULL REFERENCES venues (id),
+            is_past boolean NOT NULL DEFAULT false,
+            CONSTRAINT shows_pkey PRIMARY KEY (id)
+        );
+        INSERT INTO shows (id, start_time, artist_id, venue_id, is_past)
+            SELECT id, start_time, artist_id, venue_id, is_past FROM shows_partitioned;
+        ALTER SEQUENCE shows_id_seq OWNED BY shows.id;
+        DROP TABLE shows_partitioned;
+        {indexes}
+    END IF;
+END $$;
+'''.format(indexes=INDEXES)
+
+
+def partition_requested():
+    value = context.get_x_argument(as_dictionary=True).get('partition_shows', '')
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def upgrade():
+    if op.get_context().dialect.name == 'postgresql' and partition_requested():
+        op.execute(UPGRADE)
+
+
+def downgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        op.execute(DOWNGRADE)
@@ -0,0 +1,45 @@
+"""add indexes for show lookups and venue areas
+
+Revision ID: 4e770b7c25dd
+Revises: 6b6b84152b40
+Create Date: 2026-10-18 09:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e770b7c25dd'
+down_revision = '6b6b84152b40'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time']),
+    ('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time']),
+    ('ix_shows_start_time', 'shows', ['start_time']),
+    ('ix_venues_state_city', 'venues', ['state', 'city']),
+]
+
+
+def upgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,61 @@
+"""add updated_at to venues, artists and shows
+
+Revision ID: 5e1a7c9d3b20
+Revises: 3c8f1e2b7d95
+Create Date: 2026-10-18 17:48:12.390571
+
+"""
+from contextlib import nullcontext
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1a7c9d3b20'
+down_revision = '3c8f1e2b7d95'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['venues', 'artists', 'shows']
+
+INDEXES = [
+    ('ix_shows_venue_id_updated_at', ['venue_id', 'updated_at']),
+    ('ix_shows_artist_id_updated_at', ['artist_id', 'updated_at']),
+]
+
+
+def shows_partitioned():
+    # Indexes on a partitioned table cannot be built concurrently. Offline
+    # (--sql) there is no way to tell, and the plain table is assumed.
+    if op.get_context().as_sql:
+        return False
+    relkind = op.get_bind().execute(sa.text("SELECT relkind FROM pg_class WHERE oid = 'shows'::regclass"))
+    return relkind.scalar() == 'p'
+
+
+def upgrade():
+    postgresql = op.get_context().dialect.name == 'postgresql'
+    if postgresql:
+        # Not volatile, so Postgres 11+ adds the column without rewriting
+        # the table; UTC, like the timestamps the app writes
+        default = sa.text("timezone('utc', now())")
+    else:
+        # SQLite only adds columns with a constant default
+        default = datetime.utcnow().isoformat(' ', 'seconds')
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=default, nullable=False))
+
+    concurrently = postgresql and not shows_partitioned()
+    with op.get_context().autocommit_block() if concurrently else nullcontext():
+        for name, columns in INDEXES:
+            op.create_index(name, 'shows', columns, postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    for name, columns in reversed(INDEXES):
+        op.drop_index(name, table_name='shows')
+    for table in reversed(TABLES):
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,38 @@
+"""add latitude, longitude and geohash to venues
+
+Revision ID: 8d2f4b6a1e37
+Revises: 5e1a7c9d3b20
+Create Date: 2026-10-18 19:06:51.227804
+
+Existing venues are left without coordinates; place them with
+`flask geocode-venues` after upgrading.
+
+"""
+from contextlib import nullcontext
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f4b6a1e37'
+down_revision = '5e1a7c9d3b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('geohash', sa.BigInteger(), nullable=True))
+
+    concurrently = op.get_context().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block() if concurrently else nullcontext():
+        op.create_index('ix_venues_geohash', 'venues', ['geohash'], postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    op.drop_index('ix_venues_geohash', table_name='venues')
+    op.drop_column('venues', 'geohash')
+    op.drop_column('venues', 'longitude')
+    op.drop_column('venues', 'latitude')
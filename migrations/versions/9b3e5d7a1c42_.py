@@ -0,0 +1,66 @@
+"""denormalize upcoming/past show counts onto venues and artists
+
+Revision ID: 9b3e5d7a1c42
+Revises: f6e6eb16a9d9
+Create Date: 2026-10-18 14:02:37.518204
+
+"""
+from contextlib import nullcontext
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e5d7a1c42'
+down_revision = 'f6e6eb16a9d9'
+branch_labels = None
+depends_on = None
+
+
+OWNERS = [
+    # owner table, show foreign key
+    ('venues', 'venue_id'),
+    ('artists', 'artist_id'),
+]
+
+shows = sa.table('shows', sa.column('id', sa.Integer), sa.column('start_time', sa.DateTime),
+                 sa.column('venue_id', sa.Integer), sa.column('artist_id', sa.Integer),
+                 sa.column('is_past', sa.Boolean))
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('is_past', sa.Boolean(), server_default=sa.false(), nullable=False))
+    for owner, fk in OWNERS:
+        op.add_column(owner, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(owner, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Inline literals so `flask db upgrade --sql` renders runnable SQL
+    now = op.inline_literal(datetime.utcnow().isoformat(' '), sa.String)
+    op.execute(shows.update().where(shows.c.start_time <= now).values(is_past=sa.true()))
+    for owner, fk in OWNERS:
+        owners = sa.table(owner, sa.column('id', sa.Integer),
+                          sa.column('upcoming_shows_count', sa.Integer),
+                          sa.column('past_shows_count', sa.Integer))
+
+        def count(is_past):
+            return sa.select([sa.func.count(shows.c.id)]) \
+                     .where(shows.c[fk] == owners.c.id) \
+                     .where(shows.c.is_past if is_past else sa.not_(shows.c.is_past)).as_scalar()
+
+        op.execute(owners.update().values(upcoming_shows_count=count(False), past_shows_count=count(True)))
+
+    concurrently = op.get_context().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block() if concurrently else nullcontext():
+        op.create_index('ix_shows_start_time_not_past', 'shows', ['start_time'],
+                        postgresql_where=sa.text('NOT is_past'), sqlite_where=sa.text('NOT is_past'),
+                        postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    op.drop_index('ix_shows_start_time_not_past', table_name='shows')
+    for owner, fk in reversed(OWNERS):
+        op.drop_column(owner, 'past_shows_count')
+        op.drop_column(owner, 'upcoming_shows_count')
+    op.drop_column('shows', 'is_past')
@@ -0,0 +1,36 @@
+"""index updated_at on venues and artists
+
+Revision ID: b7c3e9a2d418
+Revises: 8d2f4b6a1e37
+Create Date: 2026-10-18 20:12:30.648153
+
+"""
+from contextlib import nullcontext
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c3e9a2d418'
+down_revision = '8d2f4b6a1e37'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_venues_updated_at', 'venues'),
+    ('ix_artists_updated_at', 'artists'),
+]
+
+
+def upgrade():
+    concurrently = op.get_context().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block() if concurrently else nullcontext():
+        for name, table in INDEXES:
+            op.create_index(name, table, ['updated_at'], postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    for name, table in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
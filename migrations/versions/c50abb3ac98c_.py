@@ -0,0 +1,55 @@
+"""index the keyset pagination orders
+
+Revision ID: c50abb3ac98c
+Revises: 2dda389fe84f
+Create Date: 2026-10-18 11:40:52.730914
+
+"""
+from contextlib import nullcontext
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c50abb3ac98c'
+down_revision = '2dda389fe84f'
+branch_labels = None
+depends_on = None
+
+
+# The listings sort nullable names, cities and states as coalesce(column,
+# '') (see pagination.sort_column), so those are indexed as expressions;
+# ix_venues_state_city stays for the lookups by area. The shows index
+# leads with the column of the one it replaces
+def sort_key(column):
+    return sa.text("coalesce(%s, '')" % column)
+
+
+INDEXES = [
+    ('ix_artists_name_id', 'artists', [sort_key('name'), 'id'], None),
+    ('ix_venues_state_city_name_id', 'venues',
+     [sort_key('state'), sort_key('city'), sort_key('name'), 'id'], None),
+    ('ix_shows_start_time_id', 'shows', ['start_time', 'id'],
+     ('ix_shows_start_time', ['start_time'])),
+]
+
+
+def upgrade():
+    concurrently = op.get_context().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block() if concurrently else nullcontext():
+        for name, table, columns, replaces in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=concurrently)
+            if replaces:
+                op.drop_index(replaces[0], table_name=table, postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    concurrently = op.get_context().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block() if concurrently else nullcontext():
+        for name, table, columns, replaces in reversed(INDEXES):
+            if replaces:
+                op.create_index(replaces[0], table, replaces[1],
+                                postgresql_concurrently=concurrently)
+            op.drop_index(name, table_name=table, postgresql_concurrently=concurrently)
+
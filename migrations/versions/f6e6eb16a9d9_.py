@@ -0,0 +1,122 @@
+"""move genres into a genres table with venue/artist association tables
+
+Revision ID: f6e6eb16a9d9
+Revises: c50abb3ac98c
+Create Date: 2026-10-18 13:05:19.842770
+
+"""
+import csv
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6e6eb16a9d9'
+down_revision = 'c50abb3ac98c'
+branch_labels = None
+depends_on = None
+
+
+# Owner rows are backfilled this many at a time
+BATCH_SIZE = 1000
+
+OWNERS = [
+    # owner table, association table, association foreign key
+    ('venues', 'venue_genres', 'venue_id'),
+    ('artists', 'artist_genres', 'artist_id'),
+]
+
+genres = sa.table('genres', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+
+def parse_genres(value):
+    # The old column holds Postgres array literals such as
+    # {Jazz,"Rock n Roll"}, written by psycopg2 from the form's list
+    if not value or not value.strip('{}'):
+        return []
+    return [name.strip() for name in next(csv.reader([value.strip('{}')]))
+            if name.strip()]
+
+
+def format_genres(names):
+    return '{' + ','.join('"%s"' % name if ' ' in name or ',' in name else name
+                          for name in names) + '}'
+
+
+def upgrade():
+    op.create_table('genres',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for owner, link, fk in OWNERS:
+        op.create_table(link,
+        sa.Column(fk, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([fk], [owner + '.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['genres.id'], ),
+        sa.PrimaryKeyConstraint(fk, 'genre_id')
+        )
+        op.create_index('ix_{}_genre_id_{}'.format(link, fk), link, ['genre_id', fk])
+
+    bind = op.get_bind()
+    genre_ids = {}
+    for owner, link, fk in OWNERS:
+        owners = sa.table(owner, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        links = sa.table(link, sa.column(fk, sa.Integer), sa.column('genre_id', sa.Integer))
+        last_id = 0
+        while True:
+            rows = bind.execute(sa.select([owners.c.id, owners.c.genres])
+                                .where(owners.c.id > last_id)
+                                .order_by(owners.c.id).limit(BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            pairs = {(row.id, name) for row in rows for name in parse_genres(row.genres)}
+            new_names = sorted({name for _, name in pairs} - set(genre_ids))
+            if new_names:
+                bind.execute(genres.insert(), [{'name': name} for name in new_names])
+                genre_ids.update(bind.execute(sa.select([genres.c.name, genres.c.id])
+                                              .where(genres.c.name.in_(new_names))).fetchall())
+            if pairs:
+                bind.execute(links.insert(), [{fk: owner_id, 'genre_id': genre_ids[name]}
+                                              for owner_id, name in sorted(pairs)])
+
+    op.drop_column('venues', 'genres')
+    op.drop_column('artists', 'genres')
+
+
+def downgrade():
+    op.add_column('artists', sa.Column('genres', sa.String(length=500), nullable=True))
+    op.add_column('venues', sa.Column('genres', sa.String(length=120), nullable=True))
+
+    bind = op.get_bind()
+    for owner, link, fk in OWNERS:
+        owners = sa.table(owner, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        links = sa.table(link, sa.column(fk, sa.Integer), sa.column('genre_id', sa.Integer))
+        last_id = 0
+        while True:
+            ids = [row.id for row in bind.execute(sa.select([owners.c.id])
+                                                  .where(owners.c.id > last_id)
+                                                  .order_by(owners.c.id).limit(BATCH_SIZE))]
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            names = dict((owner_id, []) for owner_id in ids)
+            for owner_id, name in bind.execute(
+                    sa.select([links.c[fk], genres.c.name])
+                    .select_from(links.join(genres, genres.c.id == links.c.genre_id))
+                    .where(links.c[fk].in_(ids)).order_by(genres.c.name)):
+                names[owner_id].append(name)
+            bind.execute(owners.update().where(owners.c.id == sa.bindparam('owner_id'))
+                         .values(genres=sa.bindparam('owner_genres')),
+                         [{'owner_id': owner_id, 'owner_genres': format_genres(owner_names)}
+                          for owner_id, owner_names in names.items()])
+
+    op.drop_table('artist_genres')
+    op.drop_table('venue_genres')
+    op.drop_table('genres')
@@ -0,0 +1,104 @@
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#
+# Listing pages are walked with opaque cursors holding the sort key of the
+# first/last row shown, rather than with OFFSET, so each page is a bounded
+# index range scan no matter how deep into the catalog it is.
+#----------------------------------------------------------------------------#
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import DateTime, func, literal_column, tuple_
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def sort_column(column):
+  # A nullable text key column is sorted and compared as coalesce(column,
+  # ''), so a row with a NULL there has a key like any other rather than
+  # one the cursor predicate cannot compare. The '' is written into the
+  # SQL, not bound, for the expression to match the index on it
+  if column.type.python_type is str and column.expression.nullable:
+    return func.coalesce(column, literal_column("''"))
+  return column
+
+
+def encode_cursor(values):
+  values = [value.isoformat() if isinstance(value, datetime) else value
+            for value in values]
+  return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, columns):
+  # Raises ValueError for anything that is not a cursor for these columns
+  try:
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    if not isinstance(values, list) or len(values) != len(columns):
+      raise ValueError('malformed cursor')
+    return [decode_value(value, column) for column, value in zip(columns, values)]
+  except (TypeError, UnicodeError, ValueError):
+    raise ValueError('malformed cursor')
+
+
+def decode_value(value, column):
+  # Key values are non-null (see sort_column), and JSON has no datetimes:
+  # those were encoded as ISO strings
+  if isinstance(column.type, DateTime):
+    if not isinstance(value, str):
+      raise ValueError('%s is not a datetime' % column.key)
+    return datetime.fromisoformat(value)
+  python_type = column.type.python_type
+  if not isinstance(value, python_type) or (isinstance(value, bool) and python_type is not bool):
+    raise ValueError('%s is not a %s' % (column.key, python_type.__name__))
+  return value
+
+
+def row_key(row, columns):
+  values = [getattr(row, column.key) for column in columns]
+  return [value if value is not None or sort_column(column) is column else ''
+          for column, value in zip(columns, values)]
+
+
+def keyset_query(query, columns, after=None, before=None, limit=20):
+  """``query`` narrowed to the page after/before a cursor, in the order
+  that page is read (reversed for ``before``), one row over ``limit`` to
+  tell whether there is more. Raises ValueError for a bad cursor."""
+  # The bound on the first column alone is implied by the key comparison,
+  # but SQLite only seeks an index on expressions with it
+  sort = [sort_column(column) for column in columns]
+  key = tuple_(*sort)
+  if before:
+    values = decode_cursor(before, columns)
+    query = query.filter(sort[0] <= values[0], key < tuple_(*values))
+    return query.order_by(*[column.desc() for column in sort]).limit(limit + 1)
+  if after:
+    values = decode_cursor(after, columns)
+    query = query.filter(sort[0] >= values[0], key > tuple_(*values))
+  return query.order_by(*sort).limit(limit + 1)
+
+
+def keyset_page(rows, columns, after=None, before=None, limit=20):
+  """The Page for the rows a keyset_query() returned."""
+  has_more = len(rows) > limit
+  if before:
+    rows = rows[:limit][::-1]
+    next_cursor = encode_cursor(row_key(rows[-1], columns)) if rows else None
+    prev_cursor = encode_cursor(row_key(rows[0], columns)) if has_more else None
+  else:
+    rows = rows[:limit]
+    next_cursor = encode_cursor(row_key(rows[-1], columns)) if has_more else None
+    prev_cursor = encode_cursor(row_key(rows[0], columns)) if after and rows else None
+  return Page(rows, next_cursor, prev_cursor)
+
+
+def keyset_paginate(query, columns, after=None, before=None, limit=20):
+  """Return one Page of ``query`` ordered by ``columns``.
+
+  ``after``/``before`` are cursors from a previous page; the key columns
+  must, taken together, be unique (end them with the id), and only text
+  ones may be null.
+  """
+  rows = keyset_query(query, columns, after, before, limit).all()
+  return keyset_page(rows, columns, after, before, limit)
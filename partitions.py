@@ -0,0 +1,107 @@
+#----------------------------------------------------------------------------#
+# Show partitions.
+#
+# Optional Postgres layout in which `shows` is range partitioned by the
+# month of start_time, one partition per month named shows_yYYYYmMM plus
+# shows_default for rows outside all of them. It is set up by migration
+# 3c8f1e2b7d95 when run with `flask db upgrade -x partition_shows=true`.
+# Upcoming-show queries filter on start_time, so Postgres prunes them to
+# the current and future months. Future months are created ahead of time
+# by `flask create-show-partitions`. Old months are detached (and archived
+# or dropped) by `flask archive-show-partitions`.
+#----------------------------------------------------------------------------#
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+PARTITION_NAME = re.compile(r'^shows_y(\d{4})m(\d{2})$')
+
+COUNTER_TABLES = (('venues', 'venue_id'), ('artists', 'artist_id'))
+
+
+def month_start(value):
+  return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+  index = month.year * 12 + month.month - 1 + count
+  return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+  return 'shows_y%04dm%02d' % (month.year, month.month)
+
+
+def is_partitioned(connection):
+  if connection.dialect.name != 'postgresql':
+    return False
+  return connection.execute(text(
+    "SELECT relkind FROM pg_class WHERE oid = to_regclass('shows')")).scalar() == 'p'
+
+
+def month_partitions(connection):
+  # [(month, partition name)] of the attached monthly partitions, oldest first
+  names = connection.execute(text(
+    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = 'shows'::regclass")).fetchall()
+  months = []
+  for name, in names:
+    match = PARTITION_NAME.match(name)
+    if match:
+      months.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+  return sorted(months)
+
+
+def create_partition(connection, month):
+  """Create and attach the partition for ``month``. Rows of that month
+  already sitting in shows_default are moved into it first, since Postgres
+  refuses to attach a range the default partition has rows for. Returns
+  the number of rows moved."""
+  name = partition_name(month)
+  bounds = {'lo': month, 'hi': add_months(month, 1)}
+  connection.execute(text(
+    'CREATE TABLE %s (LIKE shows INCLUDING DEFAULTS INCLUDING CONSTRAINTS)' % name))
+  moved = connection.execute(text(
+    'WITH moved AS (DELETE FROM shows_default WHERE start_time >= :lo AND start_time < :hi '
+    'RETURNING *) INSERT INTO %s SELECT * FROM moved' % name), bounds).rowcount
+  connection.execute(text(
+    "ALTER TABLE shows ATTACH PARTITION %s FOR VALUES FROM ('%s') TO ('%s')"
+    % (name, bounds['lo'], bounds['hi'])))
+  return moved
+
+
+def missing_months(connection, today, months_ahead):
+  existing = {month for month, _ in month_partitions(connection)}
+  first = month_start(today)
+  return [month for month in (add_months(first, n) for n in range(months_ahead + 1))
+          if month not in existing]
+
+
+def archive_partition(connection, name, schema=None):
+  """Detach the partition ``name``, take its shows off the venue/artist
+  counters and then move it to ``schema``, or drop it when no schema is
+  given."""
+  for table, fk in COUNTER_TABLES:
+    connection.execute(text(
+      'UPDATE {0} SET upcoming_shows_count = {0}.upcoming_shows_count - n.upcoming, '
+      'past_shows_count = {0}.past_shows_count - n.past, '
+      "updated_at = now() AT TIME ZONE 'utc' "
+      'FROM (SELECT {1} AS id, count(*) FILTER (WHERE NOT is_past) AS upcoming, '
+      'count(*) FILTER (WHERE is_past) AS past FROM {2} GROUP BY {1}) n '
+      'WHERE {0}.id = n.id'.format(table, fk, name)))
+  connection.execute(text('ALTER TABLE shows DETACH PARTITION %s' % name))
+  # A detached partition keeps its foreign keys, which would stop venues
+  # and artists with archived shows from being deleted
+  foreign_keys = connection.execute(text(
+    "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:name AS regclass) AND contype = 'f'"),
+    name=name).fetchall()
+  for constraint, in foreign_keys:
+    connection.execute(text('ALTER TABLE %s DROP CONSTRAINT %s'
+                            % (name, connection.dialect.identifier_preparer.quote(constraint))))
+  if schema:
+    schema = connection.dialect.identifier_preparer.quote(schema)
+    connection.execute(text('CREATE SCHEMA IF NOT EXISTS %s' % schema))
+    connection.execute(text('ALTER TABLE %s SET SCHEMA %s' % (name, schema)))
+  else:
+    connection.execute(text('DROP TABLE %s' % name))
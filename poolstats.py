@@ -0,0 +1,115 @@
+#----------------------------------------------------------------------------#
+# Connection pool instrumentation.
+#
+# Counts checkouts, checkins, new connections and invalidations through
+# SQLAlchemy pool events, and times how long each checkout waited for a
+# free connection through a QueuePool subclass. The numbers are served by
+# /_debug/pool and summarized in the application log.
+#----------------------------------------------------------------------------#
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+class PoolStats(object):
+
+  def __init__(self, logger, slow_checkout=0.1, log_interval=60):
+    self.logger = logger
+    self.slow_checkout = slow_checkout
+    self.log_interval = log_interval
+    self._lock = threading.Lock()
+    self._last_log = time.monotonic()
+    self.checkouts = 0
+    self.checkins = 0
+    self.connects = 0
+    self.invalidations = 0
+    self.waits = 0
+    self.wait_total = 0.0
+    self.wait_max = 0.0
+    self.in_use_max = 0
+    self.overflow_max = 0
+
+  def listen(self, target):
+    # target is an Engine, a Pool or the Pool class itself
+    event.listen(target, 'connect', self.on_connect)
+    event.listen(target, 'checkout', self.on_checkout)
+    event.listen(target, 'checkin', self.on_checkin)
+    event.listen(target, 'invalidate', self.on_invalidate)
+    event.listen(target, 'soft_invalidate', self.on_invalidate)
+
+  def pool_class(self):
+    """A QueuePool that reports how long every checkout waited."""
+    stats = self
+
+    class TimedQueuePool(QueuePool):
+      def _do_get(self):
+        started = time.monotonic()
+        try:
+          return super(TimedQueuePool, self)._do_get()
+        finally:
+          stats.record_wait(self, time.monotonic() - started)
+
+    return TimedQueuePool
+
+  @property
+  def in_use(self):
+    return self.checkouts - self.checkins
+
+  def record_wait(self, pool, seconds):
+    with self._lock:
+      self.waits += 1
+      self.wait_total += seconds
+      self.wait_max = max(self.wait_max, seconds)
+      self.overflow_max = max(self.overflow_max, pool.overflow())
+    if seconds >= self.slow_checkout:
+      self.logger.warning('db pool: checkout waited %.0fms (%s)', seconds * 1000, pool.status())
+
+  def on_connect(self, dbapi_connection, connection_record):
+    with self._lock:
+      self.connects += 1
+
+  def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+    with self._lock:
+      self.checkouts += 1
+      self.in_use_max = max(self.in_use_max, self.in_use)
+
+  def on_checkin(self, dbapi_connection, connection_record):
+    with self._lock:
+      self.checkins += 1
+      due = time.monotonic() - self._last_log >= self.log_interval
+      if due:
+        self._last_log = time.monotonic()
+    if due:
+      self.logger.info('db pool: %s', self.summary())
+
+  def on_invalidate(self, dbapi_connection, connection_record, exception):
+    with self._lock:
+      self.invalidations += 1
+    self.logger.warning('db pool: connection invalidated (%s)', exception)
+
+  def snapshot(self, pool=None):
+    with self._lock:
+      data = {
+        'checkouts': self.checkouts,
+        'checkins': self.checkins,
+        'in_use': self.in_use,
+        'in_use_max': self.in_use_max,
+        'connects': self.connects,
+        'invalidations': self.invalidations,
+        'overflow_max': self.overflow_max,
+        'checkout_wait_avg_ms': self.wait_total / self.waits * 1000 if self.waits else 0.0,
+        'checkout_wait_max_ms': self.wait_max * 1000,
+      }
+    if isinstance(pool, QueuePool):
+      data.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    if pool is not None:
+      data['status'] = pool.status()
+    return data
+
+  def summary(self):
+    data = self.snapshot()
+    return ('in use %(in_use)d (max %(in_use_max)d), overflow max %(overflow_max)d, '
+            'wait avg %(checkout_wait_avg_ms).1fms max %(checkout_wait_max_ms).1fms, '
+            '%(connects)d connects, %(invalidations)d invalidations' % data)
@@ -0,0 +1,142 @@
+#----------------------------------------------------------------------------#
+# Request profiler.
+#
+# Opt-in (PROFILE_SQL=1). For every request it records the number of SQL
+# statements, the time spent in the database, the slowest statement and
+# the template render time, returns them in a Server-Timing header and
+# keeps the last PROFILE_REPORT_SIZE requests for /_debug/profile, served
+# with DEBUG_ENDPOINTS=1. A statement run PROFILE_N_PLUS_ONE times or more
+# in one request is reported as a likely N+1 query.
+#----------------------------------------------------------------------------#
+import threading
+import time
+from collections import Counter, deque
+
+from flask import g, has_request_context, jsonify, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestProfiler(object):
+
+  def __init__(self, app=None):
+    self._lock = threading.Lock()
+    self.report = deque()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    self.logger = app.logger
+    self.report = deque(maxlen=app.config['PROFILE_REPORT_SIZE'])
+    self.n_plus_one = app.config['PROFILE_N_PLUS_ONE']
+    event.listen(Engine, 'before_cursor_execute', self.before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+    app.jinja_env.template_class = self.timed_template_class()
+    app.before_request(self.before_request)
+    app.after_request(self.after_request)
+    if app.config.get('DEBUG_ENDPOINTS'):
+      app.add_url_rule('/_debug/profile', 'profile_report', self.report_view)
+
+  def timed_template_class(self):
+    class TimedTemplate(Template):
+      def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+          return super(TimedTemplate, self).render(*args, **kwargs)
+        finally:
+          profile = current_profile()
+          if profile is not None:
+            profile['template_time'] += time.perf_counter() - started
+    return TimedTemplate
+
+  #  SQL events
+  #  ----------------------------------------------------------------
+
+  def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+  def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['profile_started'].pop()
+    profile = current_profile()
+    if profile is None:
+      return
+    profile['queries'] += 1
+    profile['db_time'] += elapsed
+    profile['statements'][statement] += 1
+    if elapsed > profile['slowest_time']:
+      profile['slowest_time'] = elapsed
+      profile['slowest'] = statement
+
+  #  Request hooks
+  #  ----------------------------------------------------------------
+
+  def before_request(self):
+    g.profile = {
+      'started': time.perf_counter(),
+      'queries': 0,
+      'db_time': 0.0,
+      'slowest': None,
+      'slowest_time': 0.0,
+      'template_time': 0.0,
+      'statements': Counter(),
+    }
+
+  def after_request(self, response):
+    profile = current_profile()
+    if profile is None:
+      return response
+    total = time.perf_counter() - profile['started']
+    repeated = [{'statement': statement, 'count': count}
+                for statement, count in profile['statements'].most_common()
+                if count >= self.n_plus_one]
+    entry = {
+      'method': request.method,
+      'path': request.full_path.rstrip('?'),
+      'endpoint': request.endpoint,
+      'status': response.status_code,
+      'queries': profile['queries'],
+      'db_ms': profile['db_time'] * 1000,
+      'slowest_ms': profile['slowest_time'] * 1000,
+      'slowest': profile['slowest'],
+      'template_ms': profile['template_time'] * 1000,
+      'total_ms': total * 1000,
+      'n_plus_one': repeated,
+    }
+    with self._lock:
+      self.report.append(entry)
+    if repeated:
+      self.logger.warning('possible N+1 in %s: %d statements, %r ran %d times',
+                          request.endpoint, profile['queries'],
+                          repeated[0]['statement'][:200], repeated[0]['count'])
+    response.headers.add('Server-Timing', 'db;dur=%.2f;desc="%d queries", tpl;dur=%.2f, total;dur=%.2f'
+                         % (entry['db_ms'], entry['queries'], entry['template_ms'], entry['total_ms']))
+    return response
+
+  #  Report
+  #  ----------------------------------------------------------------
+
+  def report_view(self):
+    with self._lock:
+      entries = list(self.report)
+    endpoints = {}
+    for entry in entries:
+      summary = endpoints.setdefault(entry['endpoint'] or entry['path'], {
+        'requests': 0, 'queries': 0, 'db_ms': 0.0, 'total_ms': 0.0, 'max_total_ms': 0.0,
+        'n_plus_one': 0})
+      summary['requests'] += 1
+      summary['queries'] += entry['queries']
+      summary['db_ms'] += entry['db_ms']
+      summary['total_ms'] += entry['total_ms']
+      summary['max_total_ms'] = max(summary['max_total_ms'], entry['total_ms'])
+      summary['n_plus_one'] += bool(entry['n_plus_one'])
+    for summary in endpoints.values():
+      for key in ('queries', 'db_ms', 'total_ms'):
+        summary['avg_' + key] = summary.pop(key) / summary['requests']
+    return jsonify({'endpoints': endpoints, 'requests': entries[::-1]})
+
+
+def current_profile():
+  if not has_request_context():
+    return None
+  return g.get('profile')
@@ -0,0 +1,182 @@
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# With DATABASE_REPLICA_URLS set (comma-separated), the views marked
+# @replicas.read_only run their queries on a replica. Each request picks
+# one, round-robin, skipping replicas that failed their last health check.
+# A replica is pinged (SELECT 1) at most every REPLICA_HEALTH_INTERVAL
+# seconds, and one that drops a connection is skipped until it answers a
+# ping again. With no replica up, reads go to the primary.
+#
+# Everything else goes to the primary: writes, other views, CLI commands,
+# and any flush. After a POST or DELETE to any other view, the client's next
+# REPLICA_READ_YOUR_WRITES seconds of requests also read from the primary.
+# That covers the redirect that follows the write, so users see their own
+# changes even while the replicas lag. Replicas are Flask-SQLAlchemy binds
+# named replica0, replica1, ... and share SQLALCHEMY_ENGINE_OPTIONS.
+#----------------------------------------------------------------------------#
+import threading
+import time
+
+from flask import current_app, g, has_request_context, jsonify, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, exc, orm, text
+from sqlalchemy.engine.url import make_url
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class RoutingSession(SignallingSession):
+
+  def get_bind(self, mapper=None, clause=None):
+    # Flushes always go to the primary, even inside a read-only view
+    engine = g.get('replica') if has_request_context() else None
+    if engine is not None and not self._flushing:
+      return engine
+    return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+  # Replicas copy the primary's schema, so only the primary is created or
+  # dropped by default (rather than every bind)
+
+  def create_all(self, bind=None, app=None):
+    super(RoutingSQLAlchemy, self).create_all(bind=bind, app=app)
+
+  def drop_all(self, bind=None, app=None):
+    super(RoutingSQLAlchemy, self).drop_all(bind=bind, app=app)
+
+
+class Replica(object):
+
+  def __init__(self, key, url):
+    self.key = key
+    self.url = url
+    self.engine = None
+    self.up = True
+    self.next_check = 0.0
+    self.reads = 0
+    self.failures = 0
+
+
+class Replicas(object):
+
+  def __init__(self, app=None, db=None):
+    self._lock = threading.Lock()
+    self._next = 0
+    self.replicas = []
+    if app is not None:
+      self.init_app(app, db)
+
+  def init_app(self, app, db):
+    self.db = db
+    self.logger = app.logger
+    self.health_interval = app.config['REPLICA_HEALTH_INTERVAL']
+    self.sticky = app.config['REPLICA_READ_YOUR_WRITES']
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for number, url in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']):
+      replica = Replica('replica%d' % number, url)
+      binds[replica.key] = url
+      self.replicas.append(replica)
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.before_request(self.before_request)
+    app.after_request(self.after_request)
+    if app.config.get('DEBUG_ENDPOINTS'):
+      app.add_url_rule('/_debug/replicas', 'replica_stats', self.stats_view)
+
+  def read_only(self, view):
+    """Marks a view whose queries may run on a replica."""
+    view.read_only = True
+    return view
+
+  #  Routing
+  #  ----------------------------------------------------------------
+
+  def before_request(self):
+    if not self.replicas or not self.is_read_only():
+      return
+    if session.get('read_primary_until', 0) > time.time():
+      return
+    replica = self.pick()
+    if replica is not None:
+      g.replica = replica.engine
+
+  def after_request(self, response):
+    if self.replicas and request.method in WRITE_METHODS and not self.is_read_only():
+      session['read_primary_until'] = time.time() + self.sticky
+    return response
+
+  def is_read_only(self):
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'read_only', False)
+
+  def pick(self):
+    # Round-robin over the replicas that pass their health check
+    with self._lock:
+      start = self._next
+      self._next = (self._next + 1) % len(self.replicas)
+    for offset in range(len(self.replicas)):
+      replica = self.replicas[(start + offset) % len(self.replicas)]
+      if self.healthy(replica):
+        replica.reads += 1
+        return replica
+    return None
+
+  #  Health checks
+  #  ----------------------------------------------------------------
+
+  def engine(self, replica):
+    if replica.engine is None:
+      with self._lock:
+        if replica.engine is None:
+          engine = self.db.get_engine(bind=replica.key)
+          event.listen(engine, 'handle_error', lambda context: self.failed(replica, context))
+          replica.engine = engine
+    return replica.engine
+
+  def healthy(self, replica):
+    now = time.monotonic()
+    if now < replica.next_check:
+      return replica.up
+    replica.next_check = now + self.health_interval
+    try:
+      with self.engine(replica).connect() as connection:
+        connection.execute(text('SELECT 1'))
+    except exc.DBAPIError as error:
+      self.mark(replica, False, error)
+    else:
+      self.mark(replica, True)
+    return replica.up
+
+  def failed(self, replica, context):
+    # A dropped connection takes the replica out until its next ping
+    if context.is_disconnect:
+      replica.next_check = time.monotonic() + self.health_interval
+      self.mark(replica, False, context.original_exception)
+
+  def mark(self, replica, up, error=None):
+    if replica.up and not up:
+      replica.failures += 1
+      self.logger.warning('read replica %s is down: %s', replica.key, error)
+    elif up and not replica.up:
+      self.logger.info('read replica %s is back up', replica.key)
+    replica.up = up
+
+  #  Stats
+  #  ----------------------------------------------------------------
+
+  def stats(self):
+    return [{
+      'name': replica.key,
+      'url': repr(make_url(replica.url)),
+      'up': replica.up,
+      'reads': replica.reads,
+      'failures': replica.failures,
+    } for replica in self.replicas]
+
+  def stats_view(self):
+    return jsonify(self.stats())
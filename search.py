@@ -0,0 +1,96 @@
+#----------------------------------------------------------------------------#
+# Search.
+#
+# Venue and artist search matches the term anywhere in name, city or state.
+# On Postgres that is served by pg_trgm GIN indexes (which can answer
+# ILIKE '%term%') and ranked by trigram similarity. On SQLite an FTS5 table
+# with the trigram tokenizer stands in for them, ranked by bm25.
+#----------------------------------------------------------------------------#
+from sqlalchemy import DDL, event, func, or_, select, text
+
+SEARCH_COLUMNS = ('name', 'city', 'state')
+
+# The trigram tokenizer needs at least three characters to use the index
+MIN_INDEXED_TERM = 3
+
+
+def postgres_ddl(table):
+  statements = ['CREATE EXTENSION IF NOT EXISTS pg_trgm']
+  for column in SEARCH_COLUMNS:
+    statements.append(
+      'CREATE INDEX IF NOT EXISTS ix_{0}_{1}_trgm ON {0} USING gin ({1} gin_trgm_ops)'
+      .format(table, column))
+  return statements
+
+
+def sqlite_ddl(table):
+  columns = ', '.join(SEARCH_COLUMNS)
+  new_values = ', '.join('new.' + column for column in SEARCH_COLUMNS)
+  old_values = ', '.join('old.' + column for column in SEARCH_COLUMNS)
+  delete_old = "INSERT INTO {0}_search({0}_search, rowid, {1}) VALUES ('delete', old.id, {2});" \
+               .format(table, columns, old_values)
+  insert_new = "INSERT INTO {0}_search(rowid, {1}) VALUES (new.id, {2});" \
+               .format(table, columns, new_values)
+  return [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {0}_search USING fts5({1}, content='{0}', "
+    "content_rowid='id', tokenize='trigram')".format(table, columns),
+    "CREATE TRIGGER IF NOT EXISTS {0}_search_ai AFTER INSERT ON {0} BEGIN {1} END"
+    .format(table, insert_new),
+    "CREATE TRIGGER IF NOT EXISTS {0}_search_ad AFTER DELETE ON {0} BEGIN {1} END"
+    .format(table, delete_old),
+    # Only edits to the indexed columns touch the index, not the counter
+    # and updated_at writes every show makes
+    "CREATE TRIGGER IF NOT EXISTS {0}_search_au AFTER UPDATE OF {1} ON {0} BEGIN {2} {3} END"
+    .format(table, columns, delete_old, insert_new),
+    "INSERT INTO {0}_search({0}_search) VALUES ('rebuild')".format(table),
+  ]
+
+
+def install_search_index(table):
+  # Create the search index alongside the table, so databases built with
+  # db.create_all() get the same index the migration adds.
+  for statement in postgres_ddl(table.name):
+    event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+  for statement in sqlite_ddl(table.name):
+    event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def escape_like(term):
+  return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_queries(dialect, model, term, page=1, per_page=20):
+  """Return (count, ids) statements for one page of ``model`` rows
+  matching ``term``, most relevant first, on the named dialect."""
+  offset = (page - 1) * per_page
+
+  if dialect == 'sqlite' and len(term) >= MIN_INDEXED_TERM:
+    fts = model.__tablename__ + '_search'
+    # A quoted FTS5 string is a substring match under the trigram tokenizer
+    match = '"{}"'.format(term.replace('"', '""'))
+    count = text('SELECT count(*) FROM {0} WHERE {0} MATCH :match'.format(fts)) \
+      .bindparams(match=match)
+    ids = text('SELECT rowid FROM {0} WHERE {0} MATCH :match '
+               'ORDER BY rank, rowid LIMIT :limit OFFSET :offset'.format(fts)) \
+      .bindparams(match=match, limit=per_page, offset=offset)
+    return count, ids
+
+  pattern = '%{}%'.format(escape_like(term))
+  matches = or_(*[getattr(model, column).ilike(pattern, escape='\\')
+                  for column in SEARCH_COLUMNS])
+  if dialect == 'postgresql':
+    rank = func.greatest(*[func.similarity(getattr(model, column), term)
+                           for column in SEARCH_COLUMNS]).desc()
+  else:
+    rank = model.name
+  count = select([func.count(model.id)]).where(matches)
+  ids = select([model.id]).where(matches).order_by(rank, model.name, model.id) \
+    .offset(offset).limit(per_page)
+  return count, ids
+
+
+def search_ids(session, model, term, page=1, per_page=20):
+  """Return (ids, total) for one page of ``model`` rows matching ``term``,
+  most relevant first."""
+  count, ids = search_queries(session.get_bind().dialect.name, model, term, page, per_page)
+  return [row[0] for row in session.execute(ids)], session.execute(count).scalar()
@@ -25,3 +25,69 @@ function deleteFetchWrapper(url, redirect){
     });	
   }
 }
+
+// Suggestions from /api/autocomplete as the user types into input, for
+// type 'venue' or 'artist'. pick is called with the result chosen from the
+// list, and with null once the text no longer names the result picked.
+// Names shared by several results are listed with their ids.
+function suggest(input, type, pick) {
+  var list = document.getElementById(input.getAttribute('list'));
+  var results = {};
+  var picked = input.value || null;
+  var timer = null;
+  input.addEventListener('input', function(event) {
+    // Choosing an option replaces the text rather than typing it
+    var chosen = !(event instanceof InputEvent) || event.inputType === 'insertReplacementText';
+    if (chosen && results[input.value]) {
+      picked = input.value;
+      pick(results[input.value]);
+      return;
+    }
+    if (picked !== null && input.value !== picked) {
+      picked = null;
+      pick(null);
+    }
+    clearTimeout(timer);
+    timer = setTimeout(function() {
+      var term = input.value.trim();
+      if (!term) {
+        return;
+      }
+      fetch('/api/autocomplete?type=' + type + '&q=' + encodeURIComponent(term))
+      .then(response => response.json())
+      .then(data => {
+        var named = {};
+        data.results.forEach(function(result) {
+          named[result.name] = (named[result.name] || 0) + 1;
+        });
+        list.innerHTML = '';
+        results = {};
+        data.results.forEach(function(result) {
+          var label = named[result.name] > 1 ? result.name + ' (#' + result.id + ')' : result.name;
+          var option = document.createElement('option');
+          option.value = label;
+          list.appendChild(option);
+          results[label] = result;
+        });
+      });
+    }, 100);
+  });
+}
+
+// The navbar search boxes open the page of the suggestion picked
+document.querySelectorAll('input[data-autocomplete]').forEach(function(input) {
+  suggest(input, input.dataset.autocomplete, function(result) {
+    if (result) {
+      window.location.href = result.url;
+    }
+  });
+});
+
+// The show form's pickers fill in the id of the venue or artist picked,
+// and clear it when the name is edited away from that pick
+document.querySelectorAll('input[data-picker]').forEach(function(input) {
+  var field = document.getElementById(input.dataset.target);
+  suggest(input, input.dataset.picker, function(result) {
+    field.value = result ? result.id : '';
+  });
+});
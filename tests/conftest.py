@@ -0,0 +1,97 @@
+#----------------------------------------------------------------------------#
+# Test fixtures.
+#
+# The app reads its configuration when it is imported, so the environment
+# is set first: a throwaway SQLite database, in-process caches and no read
+# replicas. Each test starts from freshly created tables and empty caches.
+#----------------------------------------------------------------------------#
+import collections
+import collections.abc
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+# python-dateutil 2.6 (requirements.txt) still looks up collections.Callable,
+# which Python 3.10 removed
+if not hasattr(collections, 'Callable'):
+  collections.Callable = collections.abc.Callable
+
+DATABASE = os.path.join(tempfile.mkdtemp(prefix='fyyur-tests-'), 'fyyur.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DATABASE
+os.environ['CACHE_BACKEND'] = 'memory'
+os.environ['FRAGMENT_CACHE_BACKEND'] = 'memory'
+os.environ.pop('DATABASE_REPLICA_URLS', None)
+os.environ.pop('PROFILE_SQL', None)
+os.environ.pop('DEBUG_ENDPOINTS', None)
+
+import pytest
+from sqlalchemy import event
+
+import app as fyyur
+
+
+@pytest.fixture
+def app():
+  fyyur.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+  with fyyur.app.app_context():
+    fyyur.db.session.remove()
+    fyyur.db.engine.dispose()
+    if os.path.exists(DATABASE):
+      os.remove(DATABASE)
+    fyyur.db.create_all()
+    fyyur.cache.clear()
+    fyyur.fragments.clear()
+    fyyur.autocomplete.invalidate()
+    yield fyyur.app
+    fyyur.db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+  return app.test_client()
+
+
+class Statements(list):
+  """SQL statements the engine ran, as recorded by a
+  before_cursor_execute listener."""
+
+  def __call__(self, connection, cursor, statement, parameters, context, executemany):
+    self.append(statement)
+
+
+@pytest.fixture
+def statements(app):
+  recorded = Statements()
+  event.listen(fyyur.db.engine, 'before_cursor_execute', recorded)
+  yield recorded
+  event.remove(fyyur.db.engine, 'before_cursor_execute', recorded)
+
+
+@pytest.fixture
+def catalog(app):
+  """A few venues, artists and shows, by name."""
+  db = fyyur.db
+  db.session.add_all([fyyur.Genre(name=name) for name in ('Classical', 'Jazz', 'Reggae', 'Rock n Roll')])
+  db.session.commit()
+  hop = fyyur.Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom Street',
+                    genres=fyyur.genres_named(['Jazz', 'Reggae']))
+  park = fyyur.Venue(name='Park Square Live Music & Coffee', city='San Francisco', state='CA',
+                     address='34 Whiskey Moore Ave', genres=fyyur.genres_named(['Rock n Roll', 'Jazz']))
+  pianos = fyyur.Venue(name='The Dueling Pianos Bar', city='New York', state='NY', address='335 Delancey Street',
+                       genres=fyyur.genres_named(['Classical']))
+  petals = fyyur.Artist(name='Guns N Petals', city='San Francisco', state='CA',
+                        genres=fyyur.genres_named(['Rock n Roll']))
+  sax = fyyur.Artist(name='The Wild Sax Band', city='San Francisco', state='CA',
+                     genres=fyyur.genres_named(['Jazz']))
+  db.session.add_all([hop, park, pianos, petals, sax])
+  db.session.commit()
+  now = datetime.utcnow()
+  db.session.add_all([
+    fyyur.Show(venue_id=hop.id, artist_id=petals.id, start_time=now - timedelta(days=3)),
+    fyyur.Show(venue_id=hop.id, artist_id=sax.id, start_time=now + timedelta(days=3)),
+    fyyur.Show(venue_id=pianos.id, artist_id=sax.id, start_time=now + timedelta(days=5)),
+  ])
+  db.session.commit()
+  ids = {entity.name: entity.id for entity in (hop, park, pianos, petals, sax)}
+  db.session.remove()
+  return ids
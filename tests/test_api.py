@@ -0,0 +1,88 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import app as fyyur
+
+
+@pytest.fixture
+def dated_shows(catalog):
+  # Three shows on consecutive days of June 2035
+  fyyur.db.session.add_all([
+    fyyur.Show(venue_id=catalog['The Musical Hop'], artist_id=catalog['Guns N Petals'],
+               start_time=datetime(2035, 6, day, 20, 0))
+    for day in (1, 2, 3)])
+  fyyur.db.session.commit()
+  fyyur.db.session.remove()
+
+
+def ndjson(response):
+  assert response.status_code == 200
+  assert response.mimetype == 'application/x-ndjson'
+  body = response.get_data(as_text=True)
+  assert body == '' or body.endswith('\n')
+  return [json.loads(line) for line in body.splitlines()]
+
+
+def test_ndjson_export_has_one_object_per_row(client, catalog):
+  rows = ndjson(client.get('/api/v1/venues'))
+  assert [row['name'] for row in rows] == ['The Musical Hop', 'Park Square Live Music & Coffee',
+                                           'The Dueling Pianos Bar']
+  assert set(rows[0]) == {column.name for column in fyyur.Venue.__table__.columns}
+
+
+def test_json_export_is_one_array(client, catalog):
+  response = client.get('/api/v1/artists?format=json&fields=id,name')
+  assert response.mimetype == 'application/json'
+  assert response.get_json() == [{'id': catalog['Guns N Petals'], 'name': 'Guns N Petals'},
+                                 {'id': catalog['The Wild Sax Band'], 'name': 'The Wild Sax Band'}]
+
+
+def test_empty_exports(client, app):
+  assert client.get('/api/v1/shows').get_data(as_text=True) == ''
+  assert client.get('/api/v1/shows?format=json').get_json() == []
+
+
+def test_show_fields_join_their_venue_and_artist(client, catalog, dated_shows):
+  rows = ndjson(client.get('/api/v1/shows?fields=start_time,venue_name,artist_name&since=2035-01-01'))
+  assert rows == [{'start_time': '2035-06-0%dT20:00:00' % day, 'venue_name': 'The Musical Hop',
+                   'artist_name': 'Guns N Petals'} for day in (1, 2, 3)]
+
+
+def test_shows_since_until(client, catalog, dated_shows):
+  times = lambda query: [row['start_time'] for row in ndjson(client.get('/api/v1/shows?fields=start_time&' + query))]
+  assert times('since=2035-06-02T20:00&until=2035-06-03T20:00') == ['2035-06-02T20:00:00']
+  # the same window in another offset
+  assert times('since=2035-06-02T22:00%2B02:00&until=2035-06-03T13:00-07:00') == ['2035-06-02T20:00:00']
+  # and the catalog's three shows
+  assert len(times('until=2035-06-02')) == 4 and times('until=2035-06-02')[-1] == '2035-06-01T20:00:00'
+
+
+def test_venues_and_artists_since_until_keep_those_with_a_show_then(client, catalog, dated_shows):
+  rows = ndjson(client.get('/api/v1/venues?fields=name&since=2035-06-01&until=2035-06-02'))
+  assert rows == [{'name': 'The Musical Hop'}]
+  rows = ndjson(client.get('/api/v1/artists?fields=name&since=2035-06-01'))
+  assert rows == [{'name': 'Guns N Petals'}]
+  assert ndjson(client.get('/api/v1/artists?fields=name&since=2036-01-01')) == []
+
+
+@pytest.mark.parametrize('query', [
+  'fields=id,password', 'fields=', 'format=xml', 'since=yesterday', 'until=99999-01-01', 'since=2035-13-01',
+])
+def test_bad_export_arguments_are_a_bad_request(client, app, query):
+  assert client.get('/api/v1/shows?' + query).status_code == 400
+
+
+def test_export_is_streamed_a_batch_at_a_time(client, catalog, dated_shows, monkeypatch):
+  monkeypatch.setitem(fyyur.app.config, 'API_BATCH_SIZE', 2)
+  response = client.get('/api/v1/shows?fields=id')
+  assert response.is_streamed
+  chunks = [chunk.decode() for chunk in response.response]
+  # six shows in batches of two
+  assert [chunk.count('\n') for chunk in chunks] == [2, 2, 2]
+
+  response = client.get('/api/v1/shows?fields=id&format=json')
+  chunks = [chunk.decode() for chunk in response.response]
+  assert chunks[0] == '[' and chunks[-1] == ']' and len(chunks) == 5
+  assert len(json.loads(''.join(chunks))) == 6
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('databases')
+pytest.importorskip('aiosqlite')
+pytest.importorskip('asgiref')
+
+from asgiref.wsgi import WsgiToAsgi
+from databases import Database
+
+import app as fyyur
+from asgi import AsyncReads
+
+
+def get(application, path, query_string='', headers=()):
+  """(status, headers, body) of a GET through the ASGI application."""
+  scope = {
+    'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+    'path': path, 'raw_path': path.encode(), 'root_path': '',
+    'query_string': query_string.encode(), 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+    'headers': [(b'host', b'testserver')] + [(key.encode(), value.encode()) for key, value in headers],
+  }
+  messages = []
+
+  async def receive():
+    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+  async def send(message):
+    messages.append(message)
+
+  async def run():
+    await application.database.connect()
+    try:
+      await application(scope, receive, send)
+    finally:
+      await application.database.disconnect()
+
+  asyncio.run(run())
+  start = messages[0]
+  body = b''.join(message.get('body', b'') for message in messages[1:])
+  return start['status'], {key.decode(): value.decode() for key, value in start['headers']}, body.decode()
+
+
+@pytest.fixture
+def application(app):
+  return AsyncReads(app, Database('sqlite:///' + fyyur.db.engine.url.database), WsgiToAsgi(app))
+
+
+def test_detail_page(application, catalog):
+  status, headers, body = get(application, '/venues/%d' % catalog['The Musical Hop'])
+  assert status == 200
+  assert 'The Musical Hop' in body and 'Guns N Petals' in body and 'Reggae' in body
+  assert headers['ETag'].startswith('W/')
+
+
+def test_detail_page_shares_the_cache_with_the_sync_views(application, catalog, client, statements):
+  artist_id = catalog['The Wild Sax Band']
+  assert get(application, '/artists/%d' % artist_id)[0] == 200
+  statements.clear()
+  assert 'The Wild Sax Band' in client.get('/artists/%d' % artist_id).get_data(as_text=True)
+  # validators only
+  assert len(statements) == 1
+
+
+def test_conditional_get_is_not_modified(application, catalog):
+  path = '/venues/%d' % catalog['The Musical Hop']
+  etag = get(application, path)[1]['ETag']
+  status, headers, body = get(application, path, headers=[('if-none-match', etag)])
+  assert status == 304 and body == ''
+  assert headers['ETag'] == etag
+
+
+def test_missing_detail_page(application, catalog):
+  assert get(application, '/artists/999')[0] == 404
+
+
+def test_detail_page_past_the_last(application, catalog):
+  assert get(application, '/venues/%d' % catalog['The Musical Hop'], 'upcoming_page=2')[0] == 404
+
+
+def test_listings_and_search(application, catalog):
+  status, _, body = get(application, '/venues')
+  assert status == 200 and 'The Dueling Pianos Bar' in body
+  status, _, body = get(application, '/artists/search', 'search_term=sax')
+  assert status == 200 and 'The Wild Sax Band' in body and 'Guns N Petals' not in body
+  assert get(application, '/shows', 'after=not-a-cursor')[0] == 400
+
+
+def test_other_routes_fall_back_to_flask(application, catalog):
+  status, _, body = get(application, '/venues/create')
+  assert status == 200 and 'List a new venue' in body
+
+
+def on_event_loop():
+  try:
+    asyncio.get_running_loop()
+  except RuntimeError:
+    return False
+  return True
+
+
+def test_blocking_work_runs_off_the_event_loop(application, app, catalog, monkeypatch):
+  # The page cache (Redis in production) and the request hooks, which
+  # ping the read replicas
+  calls = []
+  cache_get = fyyur.cache.get
+  monkeypatch.setattr(fyyur.cache, 'get', lambda key: calls.append(on_event_loop()) or cache_get(key))
+  hook = lambda: calls.append(on_event_loop())
+  app.before_request_funcs.setdefault(None, []).append(hook)
+  try:
+    assert get(application, '/venues/%d' % catalog['The Musical Hop'])[0] == 200
+  finally:
+    app.before_request_funcs[None].remove(hook)
+  assert calls == [False, False]
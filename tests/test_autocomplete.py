@@ -0,0 +1,83 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+import app as fyyur
+from autocomplete import Autocomplete
+
+
+def suggestions(client, kind, q):
+  response = client.get('/api/autocomplete?type=%s&q=%s' % (kind, q))
+  assert response.status_code == 200
+  return [result['name'] for result in response.get_json()['results']]
+
+
+def test_suggests_names_by_any_word(client, catalog):
+  assert suggestions(client, 'venue', 'hop') == ['The Musical Hop']
+  assert suggestions(client, 'venue', 'the') == ['The Dueling Pianos Bar', 'The Musical Hop']
+  assert suggestions(client, 'artist', 'sax') == ['The Wild Sax Band']
+
+
+def test_started_indexes_answer_lookups_from_memory(app, client, catalog, statements):
+  fyyur.autocomplete.start(app)
+  statements.clear()
+  assert suggestions(client, 'venue', 'park') == ['Park Square Live Music & Coffee']
+  assert statements == []
+  assert fyyur.autocomplete._rebuilder.is_alive() and fyyur.autocomplete._rebuilder.daemon
+
+
+def test_rebuild_drops_rows_deleted_elsewhere(app, client, catalog):
+  assert suggestions(client, 'venue', 'park') == ['Park Square Live Music & Coffee']
+  # As another worker process would, without telling this one
+  fyyur.db.session.execute(fyyur.Venue.__table__.delete()
+                           .where(fyyur.Venue.id == catalog['Park Square Live Music & Coffee']))
+  fyyur.db.session.commit()
+  assert suggestions(client, 'venue', 'park') == ['Park Square Live Music & Coffee']
+  fyyur.autocomplete.build('venue')
+  assert suggestions(client, 'venue', 'park') == []
+
+
+def test_write_routes_update_the_index(client, catalog):
+  response = client.post('/venues/create', data={
+    'name': 'The Blue Note', 'city': 'New York', 'state': 'NY', 'address': '131 W 3rd St',
+    'phone': '', 'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/bluenote',
+    'image_link': '', 'website': 'https://www.bluenotejazz.com',
+    'seeking_description': ''})
+  assert response.status_code == 302
+  assert suggestions(client, 'venue', 'blue') == ['The Blue Note']
+
+
+def due_for_sync(kind):
+  synced, latest = fyyur.autocomplete.synced[kind]
+  fyyur.autocomplete.synced[kind] = (synced - fyyur.autocomplete.sync_interval, latest)
+
+
+def test_sync_reads_rows_written_elsewhere_without_the_lock(client, catalog):
+  assert suggestions(client, 'artist', 'blue') == []
+  fyyur.db.session.execute(fyyur.Artist.__table__.insert().values(
+    name='Blue Man Group', updated_at=datetime.utcnow() + timedelta(seconds=1)))
+  fyyur.db.session.commit()
+  locked = []
+  record = lambda *args: locked.append(fyyur.autocomplete._lock.locked())
+  event.listen(fyyur.db.engine, 'before_cursor_execute', record)
+  try:
+    due_for_sync('artist')
+    assert suggestions(client, 'artist', 'blue') == ['Blue Man Group']
+  finally:
+    event.remove(fyyur.db.engine, 'before_cursor_execute', record)
+  assert locked == [False]
+  # and not again until the next interval
+  assert fyyur.autocomplete.synced['artist'][0] == pytest.approx(time.monotonic(), abs=1)
+
+
+def test_first_lookup_builds_and_starts_the_rebuilds(app, catalog):
+  flask_app = Flask(__name__)
+  autocomplete = Autocomplete(fyyur.db.session, {'venue': fyyur.Venue}, rebuild_interval=3600)
+  autocomplete.init_app(flask_app)
+  assert not flask_app.before_first_request_funcs
+  assert autocomplete._rebuilder is None and len(autocomplete.indexes['venue']) == 0
+  assert autocomplete.search('venue', 'hop') == [(catalog['The Musical Hop'], 'The Musical Hop')]
+  assert autocomplete._rebuilder.is_alive() and autocomplete._rebuilder.daemon
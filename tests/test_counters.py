@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as fyyur
+
+
+def counters(model, id):
+  fyyur.db.session.remove()
+  entity = model.query.get(id)
+  return entity.upcoming_shows_count, entity.past_shows_count
+
+
+def drift():
+  return fyyur.show_counter_drift(fyyur.Venue, fyyur.Show.venue_id) + \
+         fyyur.show_counter_drift(fyyur.Artist, fyyur.Show.artist_id)
+
+
+@pytest.fixture
+def show(catalog):
+  # Guns N Petals at The Dueling Pianos Bar next week
+  show = fyyur.Show(venue_id=catalog['The Dueling Pianos Bar'], artist_id=catalog['Guns N Petals'],
+                    start_time=datetime.utcnow() + timedelta(days=7))
+  fyyur.db.session.add(show)
+  fyyur.db.session.commit()
+  id = show.id
+  fyyur.db.session.remove()
+  return fyyur.Show.query.get(id)
+
+
+def test_counters_match_the_shows(catalog):
+  assert counters(fyyur.Venue, catalog['The Musical Hop']) == (1, 1)
+  assert counters(fyyur.Venue, catalog['Park Square Live Music & Coffee']) == (0, 0)
+  assert counters(fyyur.Artist, catalog['The Wild Sax Band']) == (2, 0)
+  assert drift() == []
+
+
+def test_new_show_is_counted(catalog, show):
+  assert counters(fyyur.Venue, catalog['The Dueling Pianos Bar']) == (2, 0)
+  assert counters(fyyur.Artist, catalog['Guns N Petals']) == (1, 1)
+  assert drift() == []
+
+
+def test_moved_show_is_recounted(catalog, show):
+  show.venue_id = catalog['Park Square Live Music & Coffee']
+  show.artist_id = catalog['The Wild Sax Band']
+  fyyur.db.session.commit()
+  assert counters(fyyur.Venue, catalog['The Dueling Pianos Bar']) == (1, 0)
+  assert counters(fyyur.Venue, catalog['Park Square Live Music & Coffee']) == (1, 0)
+  assert counters(fyyur.Artist, catalog['Guns N Petals']) == (0, 1)
+  assert counters(fyyur.Artist, catalog['The Wild Sax Band']) == (3, 0)
+  assert drift() == []
+
+
+def test_show_moved_into_the_past_is_recounted(catalog, show):
+  show.start_time = datetime.utcnow() - timedelta(days=7)
+  fyyur.db.session.commit()
+  assert counters(fyyur.Venue, catalog['The Dueling Pianos Bar']) == (1, 1)
+  assert counters(fyyur.Artist, catalog['Guns N Petals']) == (0, 2)
+  assert drift() == []
+
+
+def test_deleted_show_is_uncounted(catalog, show):
+  fyyur.db.session.delete(show)
+  fyyur.db.session.commit()
+  assert counters(fyyur.Venue, catalog['The Dueling Pianos Bar']) == (1, 0)
+  assert counters(fyyur.Artist, catalog['Guns N Petals']) == (0, 1)
+  assert drift() == []
+
+
+def test_roll_moves_started_shows_to_the_past(catalog, show):
+  # The show starts while it is still counted as upcoming
+  fyyur.db.session.execute(fyyur.Show.__table__.update().where(fyyur.Show.id == show.id)
+                           .values(start_time=datetime.utcnow() - timedelta(minutes=1)))
+  fyyur.db.session.commit()
+  assert fyyur.roll_show_counters() == 1
+  assert fyyur.roll_show_counters() == 0
+  assert counters(fyyur.Venue, catalog['The Dueling Pianos Bar']) == (1, 1)
+  assert counters(fyyur.Artist, catalog['Guns N Petals']) == (0, 2)
+  assert drift() == []
+
+
+def test_check_command_exits_non_zero_on_drift(app, catalog):
+  runner = app.test_cli_runner()
+  result = runner.invoke(args=['check-show-counters'])
+  assert (result.exit_code, result.output) == (0, 'all counters match\n')
+
+  venue_id = catalog['The Musical Hop']
+  fyyur.db.session.execute(fyyur.Venue.__table__.update().where(fyyur.Venue.id == venue_id)
+                           .values(upcoming_shows_count=7))
+  fyyur.db.session.commit()
+  result = runner.invoke(args=['check-show-counters'])
+  assert result.exit_code == 1
+  assert 'venues %d: upcoming 7 (actual 1), past 1 (actual 1)' % venue_id in result.output
+
+  result = runner.invoke(args=['check-show-counters', '--repair'])
+  assert (result.exit_code, result.output.splitlines()[-1]) == (0, 'repaired 1 counters')
+  assert counters(fyyur.Venue, venue_id) == (1, 1)
+  assert runner.invoke(args=['check-show-counters']).exit_code == 0
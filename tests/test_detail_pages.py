@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as fyyur
+
+
+@pytest.fixture
+def busy_venue(catalog):
+  # 15 upcoming shows: a full first page and three on the second
+  venue_id, artist_id = catalog['The Dueling Pianos Bar'], catalog['Guns N Petals']
+  now = datetime.utcnow()
+  fyyur.db.session.add_all([fyyur.Show(venue_id=venue_id, artist_id=artist_id,
+                                       start_time=now + timedelta(days=10 + day))
+                            for day in range(14)])
+  fyyur.db.session.commit()
+  fyyur.db.session.remove()
+  return venue_id
+
+
+@pytest.mark.parametrize('path, name', [('/venues/%d', 'The Musical Hop'), ('/artists/%d', 'The Wild Sax Band')])
+def test_cache_miss_then_hit(client, catalog, statements, path, name):
+  url = path % catalog[name]
+  statements.clear()
+  response = client.get(url)
+  assert response.status_code == 200
+  assert name in response.get_data(as_text=True)
+  # validators, the joined detail query, the genre names
+  assert len(statements) == 3
+
+  statements.clear()
+  again = client.get(url)
+  assert again.status_code == 200
+  # validators only
+  assert len(statements) == 1
+  assert again.get_data() == response.get_data()
+
+
+@pytest.mark.parametrize('path', ['/venues/999', '/artists/999'])
+def test_missing_id_is_one_statement(client, catalog, statements, path):
+  statements.clear()
+  assert client.get(path).status_code == 404
+  assert len(statements) == 1
+
+
+def test_detail_page_lists_shows_and_genres(client, catalog):
+  body = client.get('/venues/%d' % catalog['The Musical Hop']).get_data(as_text=True)
+  assert 'Guns N Petals' in body and 'The Wild Sax Band' in body
+  assert 'Jazz' in body and 'Reggae' in body
+
+
+def test_upcoming_page_two(client, busy_venue, statements):
+  first = client.get('/venues/%d' % busy_venue).get_data(as_text=True)
+  assert first.count('tile tile-show') == 12
+  assert 'upcoming_page=2' in first
+
+  statements.clear()
+  second = client.get('/venues/%d?upcoming_page=2' % busy_venue)
+  assert second.status_code == 200
+  # later pages are not cached: validators, detail query, genres
+  assert len(statements) == 3
+  body = second.get_data(as_text=True)
+  assert body.count('tile tile-show') == 3
+  assert '15 Upcoming Shows' in body
+  assert 'upcoming_page=1' in body
+
+  assert client.get('/venues/%d?upcoming_page=3' % busy_venue).status_code == 404
+
+
+def test_cached_page_is_not_served_after_an_uncached_write(client, catalog):
+  # A write that does not delete the cache entry, as another process or
+  # an import makes, still changes the ETag the entry was cached under
+  venue_id = catalog['The Musical Hop']
+  assert 'The Musical Hop' in client.get('/venues/%d' % venue_id).get_data(as_text=True)
+  fyyur.Venue.query.get(venue_id).name = 'The Jazz Cellar'
+  fyyur.db.session.commit()
+  fyyur.db.session.remove()
+  body = client.get('/venues/%d' % venue_id).get_data(as_text=True)
+  assert 'The Jazz Cellar' in body and 'The Musical Hop' not in body
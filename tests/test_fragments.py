@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import app as fyyur
+
+
+def rename(model, id, name):
+  # As another worker or a CLI command would: no call into this process's
+  # fragment cache, only the row and its updated_at
+  fyyur.db.session.execute(model.__table__.update().where(model.id == id)
+                           .values(name=name, updated_at=datetime.utcnow() + timedelta(seconds=1)))
+  fyyur.db.session.commit()
+  fyyur.db.session.remove()
+
+
+def test_venue_items_are_served_from_the_fragment_cache(client, catalog):
+  client.get('/venues')
+  hits = fyyur.fragments.stats()['hits']
+  body = client.get('/venues').get_data(as_text=True)
+  assert fyyur.fragments.stats()['hits'] == hits + 3
+  assert 'The Musical Hop' in body
+
+
+def test_venue_items_show_a_rename_made_elsewhere(client, catalog):
+  assert 'The Musical Hop' in client.get('/venues').get_data(as_text=True)
+  rename(fyyur.Venue, catalog['The Musical Hop'], 'The Jazz Cellar')
+  body = client.get('/venues').get_data(as_text=True)
+  assert 'The Jazz Cellar' in body and 'The Musical Hop' not in body
+
+
+def test_show_tiles_show_a_rename_of_their_artist_or_venue(client, catalog):
+  assert 'The Dueling Pianos Bar' in client.get('/shows').get_data(as_text=True)
+  rename(fyyur.Venue, catalog['The Dueling Pianos Bar'], 'The Player Pianos Bar')
+  rename(fyyur.Artist, catalog['The Wild Sax Band'], 'The Mild Sax Band')
+  body = client.get('/shows').get_data(as_text=True)
+  assert 'The Player Pianos Bar' in body and 'The Dueling Pianos Bar' not in body
+  assert 'The Mild Sax Band' in body and 'The Wild Sax Band' not in body
+
+
+def test_venue_show_tiles_show_an_edit_of_their_artist(client, catalog):
+  venue_id = catalog['The Musical Hop']
+  assert 'The Wild Sax Band' in client.get('/venues/%d' % venue_id).get_data(as_text=True)
+  client.post('/artists/%d/edit' % catalog['The Wild Sax Band'], data={
+    'name': 'The Mild Sax Band', 'city': 'San Francisco', 'state': 'CA', 'genres': ['Jazz'],
+    'facebook_link': 'https://www.facebook.com/mildsax', 'website': 'https://mildsax.com'})
+  body = client.get('/venues/%d' % venue_id).get_data(as_text=True)
+  assert 'The Mild Sax Band' in body and 'The Wild Sax Band' not in body
+
+
+def test_keys_stamp_the_entity_with_its_updated_at(app):
+  updated_at = datetime(2035, 6, 1, 20, 0)
+  assert fyyur.fragments.key('venue', 7, updated_at, 3) == 'venue:7@2035-06-01 20:00:00/3'
+  assert fyyur.fragments.key('venue', 7, updated_at, 3) != fyyur.fragments.key('venue', 7, updated_at, 4)
@@ -0,0 +1,114 @@
+import math
+import random
+import re
+
+import pytest
+
+import app as fyyur
+from geo import BITS, MAX_CELLS, Gazetteer, cell_ranges, distance_km, geohash
+
+
+def covered(ranges, code):
+  return any(low <= code <= high for low, high in ranges)
+
+
+def point_at(latitude, longitude, distance, bearing):
+  # The point distance km from another along a great circle
+  angle = distance / 6371.0088
+  phi, lam, theta = math.radians(latitude), math.radians(longitude), math.radians(bearing)
+  phi2 = math.asin(math.sin(phi) * math.cos(angle) + math.cos(phi) * math.sin(angle) * math.cos(theta))
+  lam2 = lam + math.atan2(math.sin(theta) * math.sin(angle) * math.cos(phi),
+                          math.cos(angle) - math.sin(phi) * math.sin(phi2))
+  return math.degrees(phi2), (math.degrees(lam2) + 540.0) % 360.0 - 180.0
+
+
+#  Cell cover
+#  ----------------------------------------------------------------
+
+@pytest.mark.parametrize('latitude, longitude, radius', [
+  (40.7128, -74.0060, 25),
+  (37.7749, -122.4194, 1),
+  (-33.8688, 151.2093, 500),
+  # across the antimeridian and next to a pole
+  (65.0, 179.9, 100),
+  (-16.5, -179.95, 50),
+  (89.9, 10.0, 200),
+])
+def test_cells_cover_every_point_in_the_circle(latitude, longitude, radius):
+  ranges = cell_ranges(latitude, longitude, radius)
+  assert len(ranges) <= MAX_CELLS
+  assert all(low <= high for low, high in ranges)
+  assert all(a[1] + 1 < b[0] for a, b in zip(ranges, ranges[1:]))
+  generator = random.Random(0)
+  for _ in range(500):
+    distance = radius * math.sqrt(generator.random())
+    point = point_at(latitude, longitude, distance, generator.uniform(0, 360))
+    assert covered(ranges, geohash(*point)), point
+
+
+def test_small_circles_get_small_cells():
+  ranges = cell_ranges(40.7128, -74.0060, 1)
+  # a few cells some kilometres across, not a sizable part of the map
+  assert sum(high - low + 1 for low, high in ranges) < (1 << (2 * BITS)) >> 24
+  # Philadelphia is outside the cells around Manhattan
+  assert not covered(ranges, geohash(39.9526, -75.1652))
+
+
+def test_distances():
+  assert distance_km(40.7128, -74.0060, 40.7128, -74.0060) == 0
+  assert distance_km(40.7128, -74.0060, 34.0522, -118.2437) == pytest.approx(3936, rel=0.01)
+  assert distance_km(0, 179.5, 0, -179.5) == pytest.approx(111.2, rel=0.01)
+
+
+def test_gazetteer_normalizes_city_names():
+  gazetteer = Gazetteer()
+  assert gazetteer.locate('new york', 'ny') == (40.7128, -74.0060)
+  assert gazetteer.locate('Saint Louis', 'MO') == gazetteer.locate('St. Louis', 'MO') is not None
+  assert gazetteer.locate('Atlantis', 'NY') is None
+  assert gazetteer.locate(None, 'NY') is None
+
+
+#  Nearby venues
+#  ----------------------------------------------------------------
+
+@pytest.fixture
+def located(catalog):
+  fyyur.db.session.add_all([fyyur.Venue(name='Brooklyn Bowl', city='Brooklyn', state='NY'),
+                            fyyur.Venue(name='Nowhere Hall', city='Atlantis', state='NY')])
+  fyyur.db.session.commit()
+  fyyur.geocode_venues()
+  fyyur.db.session.remove()
+
+
+def venue_hits(client, query):
+  # (name, distance) of each venue listed
+  response = client.get('/venues/nearby?' + query)
+  assert response.status_code == 200
+  return re.findall(r'<h5>(.*) - <span>.*, ([\d.]+) km</span>', response.get_data(as_text=True))
+
+
+def test_nearby_venues_are_sorted_by_distance(client, located):
+  # From the Brooklyn Museum
+  hits = venue_hits(client, 'lat=40.6712&lon=-73.9636')
+  assert [name for name, _ in hits] == ['Brooklyn Bowl', 'The Dueling Pianos Bar']
+  assert float(hits[0][1]) < float(hits[1][1]) < 25
+
+
+def test_nearby_venues_within_the_radius(client, located):
+  assert [name for name, _ in venue_hits(client, 'lat=40.6782&lon=-73.9442&radius=5')] == ['Brooklyn Bowl']
+  assert venue_hits(client, 'lat=0&lon=0') == []
+  hits = venue_hits(client, 'lat=37.8044&lon=-122.2712&radius=30')
+  assert sorted(name for name, _ in hits) == ['Park Square Live Music &amp; Coffee', 'The Musical Hop']
+
+
+def test_nearby_form_without_a_point(client, app):
+  body = client.get('/venues/nearby').get_data(as_text=True)
+  assert 'Venues near you' in body and 'No venue within' not in body
+
+
+@pytest.mark.parametrize('query', [
+  'lat=91&lon=0', 'lat=0&lon=-180.5', 'lat=nan&lon=0', 'lat=0&lon=inf',
+  'lat=0&lon=0&radius=0', 'lat=0&lon=0&radius=-5', 'lat=0&lon=0&radius=501',
+])
+def test_out_of_range_points_are_a_bad_request(client, app, query):
+  assert client.get('/venues/nearby?' + query).status_code == 400
@@ -0,0 +1,126 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import app as fyyur
+from importer import BulkImporter
+
+
+def write_jsonl(path, records):
+  path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+  return str(path)
+
+
+@pytest.fixture
+def run_import(app, tmp_path):
+  def run(table, records, **options):
+    messages = []
+    importer = BulkImporter(fyyur.db.engine, fyyur.db.metadata, table, echo=messages.append, **options)
+    path = write_jsonl(tmp_path / ('%s.jsonl' % table), records)
+    importer.run(path)
+    importer.messages = messages
+    return importer
+  return run
+
+
+def test_show_times_are_stored_as_naive_utc(catalog, run_import):
+  venue_id, artist_id = catalog['The Musical Hop'], catalog['Guns N Petals']
+  importer = run_import('shows', [
+    {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2035-06-01T20:00:00+02:00'},
+    {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2035-06-02T20:00:00'},
+  ])
+  assert importer.imported == 2
+  times = sorted(show.start_time for show in fyyur.Show.query.filter(fyyur.Show.start_time > datetime(2035, 1, 1)))
+  assert times == [datetime(2035, 6, 1, 18, 0), datetime(2035, 6, 2, 20, 0)]
+
+
+def test_copy_values_of_converted_show_times_have_no_offset(app):
+  importer = BulkImporter(fyyur.db.engine, fyyur.db.metadata, 'shows', echo=lambda message: None)
+  row = importer.convert({'venue_id': 1, 'artist_id': 1, 'start_time': '2035-06-01T20:00:00-05:00'})
+  assert BulkImporter.copy_value(row['start_time']) == '2035-06-02T01:00:00'
+  assert row['is_past'] is False
+
+
+def test_malformed_lines_are_rejected_not_fatal(run_import, tmp_path):
+  path = tmp_path / 'artists.jsonl'
+  path.write_text('{"name": "Guns N Petals", "city": "San Francisco", "state": "CA"}\n'
+                  '{"name": "The Wild Sax\n'
+                  '["not", "an", "object"]\n'
+                  '\n'
+                  '{"name": "Matt Quevedo", "city": "New York", "state": "NY"}\n')
+  messages = []
+  importer = BulkImporter(fyyur.db.engine, fyyur.db.metadata, 'artists', echo=messages.append)
+  assert importer.run(str(path)) == 2
+  assert importer.rejected == 2
+  assert any(message.startswith('rejected record at line 2: malformed JSON') for message in messages)
+  assert 'rejected record at line 3: not a JSON object' in messages
+  assert sorted(artist.name for artist in fyyur.Artist.query) == ['Guns N Petals', 'Matt Quevedo']
+
+
+@pytest.mark.parametrize('table', ['venues', 'artists'])
+def test_records_without_name_city_or_state_are_rejected(run_import, table):
+  importer = run_import(table, [
+    {'name': 'Complete', 'city': 'San Francisco', 'state': 'CA'},
+    {'city': 'San Francisco', 'state': 'CA'},
+    {'name': 'No City', 'city': '', 'state': 'CA'},
+    {'name': 'No State', 'city': 'San Francisco'},
+  ])
+  assert (importer.imported, importer.rejected) == (1, 3)
+  assert 'rejected record at line 2: missing name' in importer.messages
+  assert 'rejected record at line 3: missing city' in importer.messages
+  assert 'rejected record at line 4: missing state' in importer.messages
+
+
+def test_genres_link_to_the_ids_the_database_assigned(catalog, run_import):
+  # Ids already taken, and a gap left by a delete, are the database's to skip
+  fyyur.db.session.delete(fyyur.Venue.query.get(catalog['The Dueling Pianos Bar']))
+  fyyur.db.session.commit()
+  run_import('venues', [
+    {'name': 'The Blue Note', 'city': 'New York', 'state': 'NY', 'genres': 'Jazz;Blues'},
+    {'name': 'Carnegie Hall', 'city': 'New York', 'state': 'NY', 'genres': ['Classical']},
+  ])
+  genres = {venue.name: [genre.name for genre in venue.genres] for venue in fyyur.Venue.query}
+  assert genres['The Blue Note'] == ['Blues', 'Jazz']
+  assert genres['Carnegie Hall'] == ['Classical']
+  assert genres['The Musical Hop'] == ['Jazz', 'Reggae']
+
+
+def test_bad_show_keys_reject_only_their_record(catalog, run_import):
+  venue_id, artist_id = catalog['The Musical Hop'], catalog['Guns N Petals']
+  importer = run_import('shows', [
+    {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2035-06-01T20:00:00'},
+    {'venue_id': 'abc', 'artist_id': artist_id, 'start_time': '2035-06-02T20:00:00'},
+    {'venue_id': venue_id, 'artist_id': [artist_id], 'start_time': '2035-06-03T20:00:00'},
+    {'venue_name': {'name': 'x'}, 'artist_id': artist_id, 'start_time': '2035-06-04T20:00:00'},
+    {'venue_name': 'The Musical Hop', 'artist_name': 'Guns N Petals', 'start_time': '2035-06-05T20:00:00'},
+  ])
+  assert (importer.imported, importer.rejected) == (2, 3)
+  assert "rejected record at line 2: venue_id 'abc' is not an id" in importer.messages
+  assert 'rejected record at line 3: artist_id [%d] is not an id' % artist_id in importer.messages
+  assert fyyur.Show.query.filter(fyyur.Show.start_time > datetime(2035, 1, 1)).count() == 2
+
+
+@pytest.mark.parametrize('start_time', [20350601, ['2035-06-01'], True])
+def test_show_times_that_are_not_strings_are_rejected(catalog, run_import, start_time):
+  venue_id, artist_id = catalog['The Musical Hop'], catalog['Guns N Petals']
+  importer = run_import('shows', [
+    {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start_time},
+    {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2035-06-02T20:00:00'},
+  ])
+  assert (importer.imported, importer.rejected) == (1, 1)
+  assert importer.messages[0].startswith('rejected record at line 1: start_time')
+
+
+def test_only_venues_with_genres_are_inserted_one_at_a_time(catalog, run_import, statements):
+  # The others go in one executemany per batch
+  importer = run_import('venues', [
+    {'name': 'The Blue Note', 'city': 'New York', 'state': 'NY', 'genres': 'Jazz'},
+    {'name': 'Bowery Ballroom', 'city': 'New York', 'state': 'NY'},
+    {'name': 'Webster Hall', 'city': 'New York', 'state': 'NY', 'genres': []},
+    {'name': 'Mercury Lounge', 'city': 'New York', 'state': 'NY'},
+  ])
+  assert importer.imported == 4
+  assert len([statement for statement in statements if statement.startswith('INSERT INTO venues')]) == 2
+  genres = {venue.name: [genre.name for genre in venue.genres] for venue in fyyur.Venue.query}
+  assert genres['The Blue Note'] == ['Jazz'] and genres['Bowery Ballroom'] == genres['Mercury Lounge'] == []
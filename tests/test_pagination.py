@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+import app as fyyur
+from pagination import decode_cursor, encode_cursor
+
+SHOW_KEY = [fyyur.Show.start_time, fyyur.Show.id]
+ARTIST_KEY = [fyyur.Artist.name, fyyur.Artist.id]
+
+
+def cursor(values):
+  return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def test_cursor_round_trip():
+  values = [datetime(2035, 6, 1, 20, 30), 7]
+  assert decode_cursor(encode_cursor(values), SHOW_KEY) == values
+  assert decode_cursor(encode_cursor(['Guns N Petals', 3]), ARTIST_KEY) == ['Guns N Petals', 3]
+
+
+@pytest.mark.parametrize('columns, values', [
+  (SHOW_KEY, [123, 1]),
+  (SHOW_KEY, [None, 1]),
+  (SHOW_KEY, ['not a time', 1]),
+  (SHOW_KEY, ['2035-06-01T20:30:00', '1']),
+  (ARTIST_KEY, [{'name': 'x'}, 1]),
+  (ARTIST_KEY, [['x'], 1]),
+  (ARTIST_KEY, ['x', True]),
+  (ARTIST_KEY, ['x', 1.5]),
+  (ARTIST_KEY, ['x']),
+  (ARTIST_KEY, {'name': 'x', 'id': 1}),
+])
+def test_cursor_values_must_match_their_columns(columns, values):
+  with pytest.raises(ValueError):
+    decode_cursor(cursor(values), columns)
+
+
+@pytest.mark.parametrize('text', ['', 'not-a-cursor', '!!!', base64.urlsafe_b64encode(b'\xff\xfe').decode()])
+def test_garbage_is_not_a_cursor(text):
+  with pytest.raises(ValueError):
+    decode_cursor(text, ARTIST_KEY)
+
+
+@pytest.mark.parametrize('url', [
+  '/shows?after=' + cursor([123, 1]),
+  '/shows?before=' + cursor(['2035-06-01', None]),
+  '/artists?after=' + cursor([{'name': 'x'}, 1]),
+  '/artists?after=' + cursor([['x'], [1]]),
+  '/venues?after=' + cursor(['CA', 'San Francisco', 'The Musical Hop', 'one']),
+])
+def test_wrongly_typed_cursors_are_bad_requests(client, catalog, url):
+  assert client.get(url).status_code == 400
@@ -0,0 +1,19 @@
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from profiler import RequestProfiler
+
+
+@pytest.mark.parametrize('enabled', [False, True])
+def test_profile_report_needs_debug_endpoints(enabled):
+  app = Flask(__name__)
+  app.config.update(PROFILE_REPORT_SIZE=10, PROFILE_N_PLUS_ONE=10, DEBUG_ENDPOINTS=enabled)
+  profiler = RequestProfiler(app)
+  try:
+    assert ('profile_report' in app.view_functions) is enabled
+    assert app.test_client().get('/_debug/profile').status_code == (200 if enabled else 404)
+  finally:
+    event.remove(Engine, 'before_cursor_execute', profiler.before_cursor_execute)
+    event.remove(Engine, 'after_cursor_execute', profiler.after_cursor_execute)
@@ -0,0 +1,167 @@
+import shutil
+import sqlite3
+import time
+
+import pytest
+from flask import Flask, g
+from sqlalchemy import create_engine
+
+import app as fyyur
+from replicas import Replicas, RoutingSQLAlchemy
+
+
+@pytest.fixture
+def lagging_replica(app, tmp_path):
+  """Routes the next requests' reads to a copy of the database taken now,
+  standing in for a replica that has not replayed later writes."""
+  path = str(tmp_path / 'replica.db')
+  shutil.copyfile(fyyur.db.engine.url.database, path)
+  engine = create_engine('sqlite:///' + path)
+  state = {'on': True}
+
+  def route():
+    # g outlives a request here, as the test holds the app context open
+    g.pop('replica', None)
+    if state['on']:
+      g.replica = engine
+
+  app.before_request_funcs.setdefault(None, []).append(route)
+  yield state
+  app.before_request_funcs[None].remove(route)
+  engine.dispose()
+
+
+def test_page_cached_from_a_lagging_replica_is_not_served_after_it(client, catalog, lagging_replica):
+  venue_id = catalog['The Musical Hop']
+  fyyur.Venue.query.get(venue_id).name = 'The Jazz Cellar'
+  fyyur.db.session.commit()
+  fyyur.db.session.remove()
+
+  # Cached from the replica, which still has the old name
+  assert 'The Musical Hop' in client.get('/venues/%d' % venue_id).get_data(as_text=True)
+
+  lagging_replica['on'] = False
+  body = client.get('/venues/%d' % venue_id).get_data(as_text=True)
+  assert 'The Jazz Cellar' in body and 'The Musical Hop' not in body
+
+
+
+@pytest.mark.parametrize('enabled', [False, True])
+def test_replica_stats_need_debug_endpoints(enabled):
+  app = Flask(__name__)
+  app.config.update(REPLICA_HEALTH_INTERVAL=10, REPLICA_READ_YOUR_WRITES=5,
+                    SQLALCHEMY_REPLICA_URIS=['sqlite://'], DEBUG_ENDPOINTS=enabled)
+  Replicas(app, fyyur.db)
+  assert ('replica_stats' in app.view_functions) is enabled
+
+
+#  Routing
+#  ----------------------------------------------------------------
+
+def database(path, name):
+  # A database whose one row names it
+  connection = sqlite3.connect(path)
+  connection.execute('CREATE TABLE source (id INTEGER PRIMARY KEY, name TEXT)')
+  connection.execute('INSERT INTO source (name) VALUES (?)', (name,))
+  connection.commit()
+  connection.close()
+  return 'sqlite:///' + path
+
+
+@pytest.fixture
+def routed(tmp_path):
+  """A small app on a primary and two replica databases, plus one
+  replica that cannot be reached."""
+  app = Flask(__name__)
+  app.config.update(
+    SECRET_KEY='test', SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    SQLALCHEMY_DATABASE_URI=database(str(tmp_path / 'primary.db'), 'primary'),
+    SQLALCHEMY_REPLICA_URIS=[database(str(tmp_path / ('replica%d.db' % number)), 'replica%d' % number)
+                             for number in range(2)] + ['sqlite:///' + str(tmp_path / 'missing' / 'replica.db')],
+    REPLICA_HEALTH_INTERVAL=60, REPLICA_READ_YOUR_WRITES=5)
+  db = RoutingSQLAlchemy(app)
+  replicas = Replicas(app, db)
+
+  class Source(db.Model):
+    __tablename__ = 'source'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+
+  def names():
+    return ','.join(source.name for source in Source.query.order_by(Source.id))
+
+  @app.route('/read')
+  @replicas.read_only
+  def read():
+    return names()
+
+  @app.route('/read-and-write', methods=['GET', 'POST'])
+  @replicas.read_only
+  def read_and_write():
+    # A flush inside a read-only view
+    db.session.add(Source(name='written'))
+    db.session.commit()
+    return names()
+
+  @app.route('/other')
+  def other():
+    return names()
+
+  @app.route('/write', methods=['POST'])
+  def write():
+    db.session.add(Source(name='new'))
+    db.session.commit()
+    return 'ok'
+
+  app.db, app.replicas = db, replicas
+  yield app
+  with app.app_context():
+    for engine in [db.get_engine()] + [replica.engine for replica in replicas.replicas if replica.engine]:
+      engine.dispose()
+
+
+def test_read_only_views_rotate_over_the_live_replicas(routed):
+  client = routed.test_client()
+  assert [client.get('/read').get_data(as_text=True) for _ in range(4)] == \
+    ['replica0', 'replica1', 'replica0', 'replica0']
+  stats = {replica['name']: replica for replica in routed.replicas.stats()}
+  assert (stats['replica0']['reads'], stats['replica1']['reads']) == (3, 1)
+  assert stats['replica2']['up'] is False and stats['replica2']['failures'] == 1
+
+
+def test_other_views_read_the_primary(routed):
+  assert routed.test_client().get('/other').get_data(as_text=True) == 'primary'
+
+
+def test_no_replica_up_reads_the_primary(routed):
+  for replica in routed.replicas.replicas:
+    replica.up, replica.next_check = False, time.monotonic() + 60
+  assert routed.test_client().get('/read').get_data(as_text=True) == 'primary'
+
+
+def test_flushes_go_to_the_primary(routed):
+  client = routed.test_client()
+  # its other queries still read the replica
+  assert client.get('/read-and-write').get_data(as_text=True) == 'replica0'
+  assert client.get('/other').get_data(as_text=True) == 'primary,written'
+
+
+def test_reads_follow_a_write_to_the_primary(routed, monkeypatch):
+  client = routed.test_client()
+  assert client.post('/write').get_data(as_text=True) == 'ok'
+  with client.session_transaction() as session:
+    until = session['read_primary_until']
+  assert until == pytest.approx(time.time() + 5, abs=1)
+  assert client.get('/read').get_data(as_text=True) == 'primary,new'
+  # another client does not see its own write yet
+  assert routed.test_client().get('/read').get_data(as_text=True) == 'replica0'
+
+  monkeypatch.setattr(time, 'time', lambda: until + 1)
+  assert client.get('/read').get_data(as_text=True) == 'replica1'
+
+
+def test_a_read_only_post_does_not_stick_to_the_primary(routed):
+  client = routed.test_client()
+  client.post('/read-and-write')
+  with client.session_transaction() as session:
+    assert 'read_primary_until' not in session
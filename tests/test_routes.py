@@ -0,0 +1,268 @@
+import html
+import re
+from datetime import datetime
+
+import pytest
+
+import app as fyyur
+
+
+def add_venues(cities, per_city=2):
+  fyyur.db.session.add_all([
+    fyyur.Venue(name='Venue %d-%d' % (city, number), city='City %02d' % city, state='CA')
+    for city in range(cities) for number in range(per_city)])
+  fyyur.db.session.commit()
+  fyyur.db.session.remove()
+
+
+def add_artists(count):
+  fyyur.db.session.add_all([fyyur.Artist(name='Artist %02d' % number) for number in range(count)])
+  fyyur.db.session.commit()
+  fyyur.db.session.remove()
+
+
+def pager_link(response, rel):
+  match = re.search(r'<li class="%s"><a href="([^"]+)"' % rel, response.get_data(as_text=True))
+  return html.unescape(match.group(1)) if match else None
+
+
+def venue_names(response):
+  return re.findall(r'<h5>(.*) - <span>', response.get_data(as_text=True))
+
+
+#  Venue areas
+#  ----------------------------------------------------------------
+
+def test_venues_one_city_is_one_statement(client, statements):
+  add_venues(1)
+  statements.clear()
+  response = client.get('/venues')
+  assert response.status_code == 200
+  assert len(statements) == 1
+  assert 'City 00' in response.get_data(as_text=True)
+
+
+def test_venues_fifty_cities_is_one_statement(client, statements):
+  add_venues(50)
+  statements.clear()
+  response = client.get('/venues?limit=100')
+  assert response.status_code == 200
+  assert len(statements) == 1
+  body = response.get_data(as_text=True)
+  assert all('City %02d' % city in body for city in range(50))
+
+
+def test_venues_lists_every_area(client, catalog):
+  body = client.get('/venues').get_data(as_text=True)
+  assert 'The Musical Hop' in body and 'The Dueling Pianos Bar' in body
+
+
+#  Keyset pagination
+#  ----------------------------------------------------------------
+
+def test_artists_pages_forward_and_back(client):
+  add_artists(5)
+  first = client.get('/artists?limit=2')
+  assert 'Artist 00' in first.get_data(as_text=True)
+  assert pager_link(first, 'previous') is None
+
+  second = client.get(pager_link(first, 'next'))
+  body = second.get_data(as_text=True)
+  assert 'Artist 02' in body and 'Artist 03' in body
+  assert 'Artist 01' not in body and 'Artist 04' not in body
+
+  third = client.get(pager_link(second, 'next'))
+  assert 'Artist 04' in third.get_data(as_text=True)
+  assert pager_link(third, 'next') is None
+
+  back = client.get(pager_link(third, 'previous'))
+  assert back.get_data(as_text=True) == body
+
+
+def test_venues_cursor_pages_across_cities(client):
+  add_venues(3)
+  seen = []
+  url = '/venues?limit=4'
+  while url:
+    response = client.get(url)
+    seen += re.findall(r'Venue \d-\d', response.get_data(as_text=True))
+    url = pager_link(response, 'next')
+  assert seen == ['Venue %d-%d' % (city, number) for city in range(3) for number in range(2)]
+
+
+def walk(client, url, rel='next'):
+  # Every page from url on, following the rel links
+  pages = []
+  while url:
+    response = client.get(url)
+    assert response.status_code == 200
+    pages.append(response)
+    url = pager_link(response, rel)
+  return pages
+
+
+def test_null_names_on_a_page_boundary(client):
+  # Sorted as '', ahead of every name
+  add_artists(2)
+  fyyur.db.session.add_all([fyyur.Artist(name=None), fyyur.Artist(name=None)])
+  fyyur.db.session.commit()
+  pages = walk(client, '/artists?limit=1')
+  assert len(pages) == 4
+  assert 'Artist 00' in pages[2].get_data(as_text=True) and 'Artist 01' in pages[3].get_data(as_text=True)
+  assert len(walk(client, pager_link(pages[-1], 'previous'), 'previous')) == 3
+
+
+def test_venues_without_a_city_on_a_page_boundary(client):
+  add_venues(1)
+  fyyur.db.session.add_all([fyyur.Venue(name='Nowhere %d' % number, state='CA') for number in range(2)] +
+                           [fyyur.Venue(name=None, city='City 00', state='CA')])
+  fyyur.db.session.commit()
+  seen = []
+  for response in walk(client, '/venues?limit=1'):
+    seen += venue_names(response)
+  assert seen == ['Nowhere 0', 'Nowhere 1', 'None', 'Venue 0-0', 'Venue 0-1']
+
+
+def test_bad_cursor_is_a_bad_request(client):
+  add_artists(1)
+  assert client.get('/artists?after=not-a-cursor').status_code == 400
+  assert client.get('/venues?before=e30=').status_code == 400
+
+
+#  Genre filter
+#  ----------------------------------------------------------------
+
+def test_venues_by_genre(client, catalog):
+  assert venue_names(client.get('/venues?genre=Jazz')) == ['Park Square Live Music &amp; Coffee', 'The Musical Hop']
+  assert venue_names(client.get('/venues?genre=Classical')) == ['The Dueling Pianos Bar']
+  assert venue_names(client.get('/venues?genre=Polka')) == []
+
+
+def test_artists_by_genre(client, catalog):
+  body = client.get('/artists?genre=Jazz').get_data(as_text=True)
+  assert 'The Wild Sax Band' in body and 'Guns N Petals' not in body
+  body = client.get('/artists?genre=Rock n Roll').get_data(as_text=True)
+  assert 'Guns N Petals' in body and 'The Wild Sax Band' not in body
+
+
+def test_genre_filter_is_kept_across_pages(client, catalog):
+  seen = []
+  for response in walk(client, '/venues?genre=Jazz&limit=1'):
+    seen += venue_names(response)
+  assert seen == ['Park Square Live Music &amp; Coffee', 'The Musical Hop']
+
+
+def test_genre_filter_sees_edited_genres(client, catalog):
+  venue = fyyur.Venue.query.get(catalog['The Dueling Pianos Bar'])
+  venue.genres = fyyur.genres_named(['Jazz', 'Swing'])
+  fyyur.db.session.commit()
+  fyyur.db.session.remove()
+  assert 'The Dueling Pianos Bar' in venue_names(client.get('/venues?genre=Swing'))
+  assert venue_names(client.get('/venues?genre=Classical')) == []
+
+
+#  Search
+#  ----------------------------------------------------------------
+
+def test_search_venues_matches_name_anywhere(client, catalog):
+  body = client.post('/venues/search', data={'search_term': 'Music'}).get_data(as_text=True)
+  assert 'The Musical Hop' in body and 'Park Square Live Music &amp; Coffee' in body
+  assert 'Dueling Pianos' not in body
+
+
+def test_search_is_case_insensitive(client, catalog):
+  body = client.post('/venues/search', data={'search_term': 'hop'}).get_data(as_text=True)
+  assert 'The Musical Hop' in body and 'Park Square' not in body
+
+
+def test_search_matches_city_and_state(client, catalog):
+  body = client.post('/venues/search', data={'search_term': 'new york'}).get_data(as_text=True)
+  assert 'The Dueling Pianos Bar' in body and 'The Musical Hop' not in body
+  body = client.post('/artists/search', data={'search_term': 'CA'}).get_data(as_text=True)
+  assert 'Guns N Petals' in body and 'The Wild Sax Band' in body
+
+
+def test_short_search_term(client, catalog):
+  # Below the trigram index's three characters, matched with LIKE
+  body = client.post('/artists/search', data={'search_term': 'a'}).get_data(as_text=True)
+  assert 'Guns N Petals' in body and 'The Wild Sax Band' in body
+
+
+def test_search_sees_renames(client, catalog):
+  venue = fyyur.Venue.query.get(catalog['The Musical Hop'])
+  venue.name = 'The Jazz Cellar'
+  fyyur.db.session.commit()
+  fyyur.db.session.remove()
+  assert 'The Jazz Cellar' in client.post('/venues/search', data={'search_term': 'cellar'}).get_data(as_text=True)
+  assert 'The Jazz Cellar' not in client.post('/venues/search', data={'search_term': 'musical'}).get_data(as_text=True)
+
+
+def test_search_index_is_only_rewritten_for_searched_columns(app):
+  # Show counter and updated_at bumps do not re-index the row
+  triggers = fyyur.db.session.execute("SELECT sql FROM sqlite_master WHERE name LIKE '%_search_au'").fetchall()
+  assert len(triggers) == 2
+  assert all('AFTER UPDATE OF name, city, state ON' in sql for sql, in triggers)
+
+
+#  Available venues
+#  ----------------------------------------------------------------
+
+SHOW_AT = datetime(2035, 6, 1, 20, 0)
+
+
+@pytest.fixture
+def booked_park(catalog):
+  # Park Square has one three hour show from SHOW_AT
+  fyyur.db.session.add(fyyur.Show(venue_id=catalog['Park Square Live Music & Coffee'],
+                                  artist_id=catalog['Guns N Petals'], start_time=SHOW_AT))
+  fyyur.db.session.commit()
+  fyyur.db.session.remove()
+
+
+def available(client, start, end):
+  response = client.get('/venues/available', query_string={
+    'city': 'San Francisco', 'state': 'CA', 'from': start, 'to': end})
+  assert response.status_code == 200
+  body = response.get_data(as_text=True)
+  assert 'The Musical Hop' in body
+  return 'Park Square' in body
+
+
+@pytest.mark.parametrize('start, end, free', [
+  # ends as the show starts
+  ('2035-06-01T19:00', '2035-06-01T20:00', True),
+  ('2035-06-01T19:00', '2035-06-01T20:01', False),
+  # starts as the show ends
+  ('2035-06-01T23:00', '2035-06-02T01:00', True),
+  ('2035-06-01T22:59', '2035-06-02T01:00', False),
+])
+def test_available_venues_at_the_edges_of_a_show(client, booked_park, start, end, free):
+  assert available(client, start, end) is free
+
+
+def test_available_venues_window_with_offsets_is_utc(client, booked_park):
+  # 23:00+02:00 is 21:00 UTC, during the show
+  assert available(client, '2035-06-01T23:00:00+02:00', '2035-06-01T23:30') is False
+  assert available(client, '2035-06-02T01:00:00+02:00', '2035-06-02T01:30:00Z') is True
+  assert available(client, '2035-06-01T23:00', '2035-06-01T20:00:00-05:00') is True
+
+
+@pytest.mark.parametrize('start, end', [
+  ('2035-06-01T21:00', '2035-06-01T20:00'),
+  ('2035-06-01T19:00-02:00', '2035-06-01T20:00'),
+  ('yesterday', '2035-06-01T20:00'),
+  ('0001-01-01T00:00', '2035-06-01T20:00'),
+  ('0001-01-01T01:00+05:00', '2035-06-01T20:00'),
+])
+def test_bad_booking_window_is_a_bad_request(client, catalog, start, end):
+  response = client.get('/venues/available', query_string={
+    'city': 'San Francisco', 'state': 'CA', 'from': start, 'to': end})
+  assert response.status_code == 400
+
+
+#  Debug endpoints
+#  ----------------------------------------------------------------
+
+def test_debug_endpoints_are_off_by_default(client):
+  for path in ('/_debug/cache', '/_debug/fragments', '/_debug/pool', '/_debug/replicas'):
+    assert client.get(path).status_code == 404
@@ -0,0 +1,49 @@
+import html
+from datetime import datetime
+
+import pytest
+
+import app as fyyur
+
+
+def post_show(client, **data):
+  data.setdefault('start_time', '2035-06-01 20:00:00')
+  return client.post('/shows/create', data=data)
+
+
+def shows_in_2035():
+  return fyyur.Show.query.filter(fyyur.Show.start_time >= datetime(2035, 1, 1)).count()
+
+
+def test_show_with_existing_ids_is_listed(client, catalog):
+  response = post_show(client, venue_id=catalog['The Musical Hop'], artist_id=catalog['Guns N Petals'])
+  assert response.status_code == 302 and response.location.endswith('/shows')
+  assert 'Show was successfully listed!' in client.get('/shows').get_data(as_text=True)
+  assert shows_in_2035() == 1
+
+
+def test_unknown_ids_are_checked_in_one_statement(client, catalog, statements):
+  response = post_show(client, venue_id=999, artist_id=catalog['Guns N Petals'])
+  body = html.unescape(response.get_data(as_text=True))
+  assert response.status_code == 200
+  assert 'Show could not be listed: there is no venue 999.' in body
+  # the pickers show the name of the id that does exist
+  assert 'value="Guns N Petals"' in body
+  assert len([statement for statement in statements if 'EXISTS' in statement]) == 1
+  assert not any(statement.startswith('INSERT') for statement in statements)
+  assert shows_in_2035() == 0
+
+
+def test_unknown_venue_and_artist_are_both_named(client, catalog):
+  body = post_show(client, venue_id=998, artist_id=999).get_data(as_text=True)
+  assert 'there is no venue 998 or artist 999.' in body
+  assert shows_in_2035() == 0
+
+
+@pytest.mark.parametrize('venue_id, artist_id', [('', '1'), ('1', ''), ('abc', '1'), ('1', '2.5')])
+def test_missing_or_non_numeric_ids_fail_validation(client, catalog, statements, venue_id, artist_id):
+  response = post_show(client, venue_id=venue_id, artist_id=artist_id)
+  assert response.status_code == 200
+  assert 'An error occurred. Show could not be listed.' in response.get_data(as_text=True)
+  assert not any('EXISTS' in statement or statement.startswith('INSERT') for statement in statements)
+  assert shows_in_2035() == 0